@@ -4,6 +4,7 @@ import { DetectionsService } from './detections.service';
 import { CreatePlateDetectionDto } from './dto/create-plate-detection.dto';
 import { CreateAccessAttemptDto } from './dto/create-access-attempt.dto';
 import { RespondPendingDetectionDto } from './dto/respond-pending-detection.dto';
+import { UpdateDetectionImageDto } from './dto/update-detection-image.dto';
 import { AuthGuard } from '../auth/auth.guard';
 import { AuthorizationGuard } from '../auth/guards/authorization.guard';
 import { ServiceApiKeyGuard } from '../auth/guards/service-api-key.guard';
@@ -52,6 +53,34 @@ export class DetectionsController {
     return this.plates.createAttempt(dto);
   }
 
+  @Patch('plates/:id/image')
+  @UseGuards(ServiceApiKeyGuard)
+  @ApiOperation({
+    summary: 'Actualizar imagen de una detección',
+    description: 'El worker LPR envía la detección con la ruta local del frame y, cuando termina la subida en segundo plano, reemplaza `full_frame_path` por la URL remota. Requiere API key de servicio (header x-api-key).'
+  })
+  @ApiParam({ name: 'id', description: 'ID de la detección' })
+  @ApiBody({ type: UpdateDetectionImageDto })
+  @ApiResponse({ status: 200, description: 'Imagen actualizada' })
+  @ApiResponse({ status: 404, description: 'Detección no encontrada' })
+  @ApiUnauthorizedResponse({ description: 'API key de servicio inválida, expirada o ausente' })
+  updateDetectionImage(@Param('id') id: string, @Body() dto: UpdateDetectionImageDto) {
+    return this.plates.updateDetectionImage(id, dto);
+  }
+
+  @Get('access-snapshot')
+  @UseGuards(ServiceApiKeyGuard)
+  @ApiOperation({
+    summary: 'Snapshot de acceso para el worker LPR',
+    description: 'Patentes de vehículos y visitas vehiculares del condominio de la cámara, para la caché local de decisiones del worker. Con `since` (ISO 8601) devuelve solo lo modificado después. Requiere API key de servicio (header x-api-key).'
+  })
+  @ApiResponse({ status: 200, description: 'Snapshot (completo o delta) del condominio de la cámara' })
+  @ApiResponse({ status: 400, description: '`since` inválido' })
+  @ApiUnauthorizedResponse({ description: 'API key de servicio inválida, expirada o ausente' })
+  getAccessSnapshot(@Query('cameraId') cameraId: string, @Query('since') since?: string) {
+    return this.plates.getAccessSnapshot(cameraId, since);
+  }
+
   // ============================================
   // ENDPOINTS PARA FRONTEND (protegidos con permisos)
   // Estos endpoints requieren autenticación y permiso detections.read
@@ -7,6 +7,7 @@ import { Camera } from '../cameras/entities/camera.entity';
 import { CreatePlateDetectionDto } from './dto/create-plate-detection.dto';
 import { CreateAccessAttemptDto } from './dto/create-access-attempt.dto';
 import { RespondPendingDetectionDto } from './dto/respond-pending-detection.dto';
+import { UpdateDetectionImageDto } from './dto/update-detection-image.dto';
 import { VehiclesService } from '../vehicles/vehicles.service';
 import { VisitsService } from '../visits/visits.service';
 import { User } from '../users/entities/user.entity';
@@ -215,6 +216,15 @@ export class DetectionsService {
       return await this.createPendingDetectionForConcierge(saved, 'Vehículo inactivo - requiere aprobación');
     }
 
+    // El worker ya decidió con su caché local de acceso (meta.local_decision):
+    // si no coincide, su snapshot está desactualizado o la lógica divergió.
+    const localDecision = dto.meta?.local_decision?.decision;
+    if (localDecision && localDecision !== decision) {
+      this.logger.warn(
+        `Decisión local del worker (${localDecision}) distinta a la del backend (${decision}) para ${dto.plate}`,
+      );
+    }
+
     // Calcular tiempo de respuesta: T2 (ahora) - T1 (detectionTimestamp del LPR o createdAt como fallback)
     // Si el LPR envió detectionTimestamp, usar ese valor para mayor precisión
     // Sino, usar createdAt (timestamp de recepción en backend)
@@ -296,6 +306,71 @@ export class DetectionsService {
     return query.getMany();
   }
 
+  /**
+   * Reemplaza el frame de una detección ya registrada: el worker LPR la envía
+   * con la ruta local y parcha la URL remota cuando termina la subida.
+   */
+  async updateDetectionImage(id: string, dto: UpdateDetectionImageDto) {
+    const det = await this.detectionsRepo.findOne({ where: { id } });
+    if (!det) throw new NotFoundException('detection not found');
+    det.full_frame_path = dto.full_frame_path;
+    return this.detectionsRepo.save(det);
+  }
+
+  /**
+   * Snapshot de patentes autorizadas y visitas vehiculares del condominio de
+   * la cámara, para que el worker LPR decida localmente (en ms, y también con
+   * el backend caído) después de confirmar una patente. Con `since` (ISO) es
+   * un delta: solo lo modificado después, incluidos vehículos desactivados y
+   * visitas que pasaron a estado terminal. Los borrados físicos no aparecen
+   * en un delta: el worker pide un snapshot completo cada tanto.
+   *
+   * La decisión del backend en `createDetection` sigue siendo la que vale;
+   * esto solo replica los datos que usa. Cámara sin organizationId: vacío
+   * (mismo fail-closed que `createDetection`).
+   */
+  async getAccessSnapshot(cameraIdOrMount: string, since?: string) {
+    const serverTime = new Date().toISOString();
+    const organizationId = await this.resolveCameraOrganizationId(cameraIdOrMount);
+    let sinceDate: Date | undefined;
+    if (since) {
+      sinceDate = new Date(since);
+      if (Number.isNaN(sinceDate.getTime())) {
+        throw new BadRequestException('since debe ser una fecha ISO 8601');
+      }
+    }
+    if (!organizationId) {
+      return { serverTime, organizationId: null, full: !sinceDate, vehicles: [], visits: [] };
+    }
+    const [vehicles, visits] = await Promise.all([
+      this.vehiclesService.findForAccessSnapshot(organizationId, sinceDate),
+      this.visitsService.findForAccessSnapshot(organizationId, sinceDate),
+    ]);
+    return {
+      serverTime,
+      organizationId,
+      full: !sinceDate,
+      vehicles: vehicles.map((v) => ({
+        id: v.id,
+        plate: v.plate,
+        vehicleType: v.vehicleType,
+        accessLevel: v.accessLevel,
+        active: v.active,
+        updatedAt: v.updatedAt,
+      })),
+      visits: visits.map((v) => ({
+        id: v.id,
+        plate: v.vehicle?.plate ?? null,
+        status: v.status,
+        validFrom: v.validFrom,
+        validUntil: v.validUntil,
+        maxUses: v.maxUses,
+        usedCount: v.usedCount,
+        updatedAt: v.updatedAt,
+      })),
+    };
+  }
+
   async createAttempt(dto: CreateAccessAttemptDto) {
     const det = await this.detectionsRepo.findOne({ where: { id: dto.detectionId } });
     if (!det) throw new NotFoundException('detection not found');
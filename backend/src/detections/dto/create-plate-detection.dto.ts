@@ -34,6 +34,14 @@ class MetaPlateDto {
   @IsString()
   @ApiPropertyOptional({ description: 'Como se realizo la confirmación por frames o segundos en imagen', example: 'frames' })
   confirmed_by?: string;
+
+  @IsOptional()
+  @IsObject()
+  @ApiPropertyOptional({
+    description: 'Decisión tomada por el worker con su caché local de acceso (informativa: la del backend es la que vale)',
+    example: { decision: 'Permitido', reason: 'Vehículo residente', latency_ms: 0.4, snapshot_age_s: 12.5 },
+  })
+  local_decision?: Record<string, any>;
 }
 
 
@@ -0,0 +1,11 @@
+import { IsString } from 'class-validator';
+import { ApiProperty } from '@nestjs/swagger';
+
+export class UpdateDetectionImageDto {
+  @IsString()
+  @ApiProperty({
+    description: 'URL (o ruta) definitiva del frame anotado, p. ej. tras subirlo a Cloudinary',
+    example: 'https://res.cloudinary.com/demo/image/upload/cam-1_det_1733850000.jpg',
+  })
+  full_frame_path: string;
+}
@@ -1,6 +1,6 @@
 import { Injectable, NotFoundException, BadRequestException, Logger } from '@nestjs/common';
 import { InjectRepository } from '@nestjs/typeorm';
-import { Repository, FindOptionsWhere } from 'typeorm';
+import { Repository, FindOptionsWhere, MoreThan } from 'typeorm';
 import { Vehicle } from './entities/vehicle.entity';
 import { CreateVehicleDto } from './dto/create-vehicle.dto';
 import { User } from '../users/entities/user.entity';
@@ -259,6 +259,24 @@ export class VehiclesService {
     return this.repo.findOne({ where, relations: ['owner'] });
   }
 
+  /**
+   * Vehículos de un condominio para la caché local de acceso del worker LPR
+   * (`GET detections/access-snapshot`). Con `since` devuelve solo los
+   * modificados después (delta), incluidos los desactivados para que el
+   * worker los saque de su índice. Solo los campos que usa la decisión.
+   */
+  async findForAccessSnapshot(organizationId: string, since?: Date) {
+    const where: FindOptionsWhere<Vehicle> = { organizationId };
+    if (since) {
+      where.updatedAt = MoreThan(since);
+    }
+    return this.repo.find({
+      where,
+      select: ['id', 'plate', 'vehicleType', 'accessLevel', 'active', 'updatedAt'],
+      loadEagerRelations: false,
+    });
+  }
+
   async findByFamily(familyId: string) {
     this.logger.log(`🔍 Buscando vehículos de la familia: ${familyId}`);
     
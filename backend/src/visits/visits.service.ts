@@ -372,6 +372,34 @@ export class VisitsService {
     return visit;
   }
 
+  /**
+   * Visitas vehiculares de un condominio para la caché local de acceso del
+   * worker LPR (`GET detections/access-snapshot`). Sin `since` (snapshot
+   * completo) solo las no terminales y no vencidas, que son las únicas que
+   * `validateAccess` puede aceptar; con `since` todas las modificadas
+   * después, así el worker también se entera de las canceladas/completadas.
+   */
+  async findForAccessSnapshot(organizationId: string, since?: Date): Promise<Visit[]> {
+    const query = this.visitRepository
+      .createQueryBuilder('visit')
+      .innerJoin('visit.vehicle', 'vehicle')
+      .select([
+        'visit.id', 'visit.status', 'visit.validFrom', 'visit.validUntil',
+        'visit.maxUses', 'visit.usedCount', 'visit.updatedAt', 'vehicle.id', 'vehicle.plate',
+      ]);
+    applyTenantFilter(query, 'visit', { organizationId, isSuperAdmin: false });
+    if (since) {
+      query.andWhere('visit.updatedAt > :since', { since });
+    } else {
+      query
+        .andWhere('visit.status IN (:...statuses)', {
+          statuses: [VisitStatus.PENDING, VisitStatus.ACTIVE, VisitStatus.READY_FOR_REENTRY],
+        })
+        .andWhere('visit.validUntil >= :now', { now: new Date() });
+    }
+    return query.getMany();
+  }
+
   /**
    * Actualizar solo el estado de una visita
    * Método simplificado para cambios rápidos de estado
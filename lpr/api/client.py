@@ -1,14 +1,10 @@
 import requests
 import logging
 import time
+from typing import Optional
 from lpr.settings import settings
 
-def _post_request(url: str, dto: dict, dry_run: bool = True) -> int:
-    """Función base para envíos POST al backend con reintentos y auth."""
-    if dry_run:
-        logging.info('DRY RUN - evento (no enviado) a %s: %s', url, dto)
-        return 200
-
+def _auth_headers() -> dict:
     headers = {'Content-Type': 'application/json'}
     token = settings.LPR_WORKER_TOKEN or settings.WORKER_BACKEND_TOKEN
     if token:
@@ -28,28 +24,62 @@ def _post_request(url: str, dto: dict, dry_run: bool = True) -> int:
             'LPR_SERVICE_API_KEY no está configurada — el backend rechazará este request '
             'con 401 si el endpoint exige API key de servicio (ver docs/modulos/auth-multitenant.md).'
         )
+    return headers
+
+
+def _send_request(method: str, url: str, dto: dict, dry_run: bool = True, return_body: bool = False):
+    """Envío al backend con reintentos y auth.
 
+    Devuelve el status code, o `(status, body)` si `return_body` (body es el JSON
+    de la respuesta o None).
+    """
+    if dry_run:
+        logging.info('DRY RUN - evento (no enviado) a %s: %s', url, dto)
+        return (200, None) if return_body else 200
+
+    headers = _auth_headers()
     attempts = 3
     backoff = 1.0
     for attempt in range(1, attempts + 1):
         try:
-            resp = requests.post(url, json=dto, headers=headers, timeout=10)
-            logging.info('POST %s -> %s (attempt %d)', url, resp.status_code, attempt)
-            return resp.status_code
+            resp = requests.request(method, url, json=dto, headers=headers, timeout=10)
+            logging.info('%s %s -> %s (attempt %d)', method, url, resp.status_code, attempt)
+            if not return_body:
+                return resp.status_code
+            try:
+                body = resp.json()
+            except ValueError:
+                body = None
+            return resp.status_code, body
         except Exception:
-            logging.exception('Error POST hacia backend %s (attempt %d)', url, attempt)
+            logging.exception('Error %s hacia backend %s (attempt %d)', method, url, attempt)
             if attempt < attempts:
                 time.sleep(backoff)
                 backoff *= 2
             else:
-                return -1
+                return (-1, None) if return_body else -1
 
-def post_event(backend_url: str, payload: dict, dry_run: bool = True) -> int:
-    """Envía una detección de patente (LPR) al backend."""
-    # Asegurar endpoint de detecciones
+
+def _post_request(url: str, dto: dict, dry_run: bool = True) -> int:
+    """Función base para envíos POST al backend con reintentos y auth."""
+    return _send_request('POST', url, dto, dry_run)
+
+
+def _plates_url(backend_url: str) -> str:
     url = backend_url.rstrip('/')
     if not url.endswith('/detections/plates'):
         url += '/detections/plates'
+    return url
+
+
+def post_event(backend_url: str, payload: dict, dry_run: bool = True, return_body: bool = False):
+    """Envía una detección de patente (LPR) al backend.
+
+    Con `return_body=True` devuelve `(status, body)`; el body trae la detección
+    creada (`body['detection']['id']`), necesaria para parcharla después.
+    """
+    # Asegurar endpoint de detecciones
+    url = _plates_url(backend_url)
 
     # Build payload according to CreatePlateDetectionDto
     dto = {
@@ -64,7 +94,8 @@ def post_event(backend_url: str, payload: dict, dry_run: bool = True) -> int:
 
     # Meta de patente
     meta = {}
-    allowed_meta = ['bbox', 'snapshot_jpeg_b64', 'char_confidences', 'char_conf_min', 'char_conf_mean', 'confirmed_by']
+    allowed_meta = ['bbox', 'snapshot_jpeg_b64', 'char_confidences', 'char_conf_min', 'char_conf_mean', 'confirmed_by',
+                    'local_decision', 'best_shot_ts']
     for k in allowed_meta:
         if k in payload: meta[k] = payload.get(k)
     
@@ -75,7 +106,34 @@ def post_event(backend_url: str, payload: dict, dry_run: bool = True) -> int:
             
     if meta: dto['meta'] = meta
     
-    return _post_request(url, dto, dry_run)
+    return _send_request('POST', url, dto, dry_run, return_body=return_body)
+
+
+def patch_detection_image(backend_url: str, detection_id: str, image_url: str, dry_run: bool = True) -> int:
+    """Actualiza la imagen (`full_frame_path`) de una detección ya enviada,
+    p. ej. cuando termina la subida a Cloudinary."""
+    url = f'{_plates_url(backend_url)}/{detection_id}/image'
+    return _send_request('PATCH', url, {'full_frame_path': image_url}, dry_run)
+
+
+def fetch_access_snapshot(backend_url: str, camera_id: str, since: Optional[str] = None, timeout: float = 10.0) -> dict:
+    """Snapshot (o delta desde `since`, ISO) de patentes y visitas del condominio de la cámara.
+
+    Un solo intento: quien sincroniza reintenta en la próxima vuelta. Lanza
+    la excepción de `requests` si falla.
+    """
+    url = backend_url.rstrip('/')
+    if url.endswith('/detections/plates'):
+        url = url[:-len('/plates')]
+    elif not url.endswith('/detections'):
+        url += '/detections'
+    params = {'cameraId': camera_id}
+    if since:
+        params['since'] = since
+    resp = requests.get(f'{url}/access-snapshot', params=params, headers=_auth_headers(), timeout=timeout)
+    resp.raise_for_status()
+    return resp.json()
+
 
 def post_anomaly(backend_url: str, payload: dict, dry_run: bool = True) -> int:
     """Envía una anomalía visual (Guardia) al backend."""
@@ -0,0 +1,156 @@
+"""Dedupe de patentes entre cámaras.
+
+Cada `LprWorker` deduplica con su propio `emitted_cache`, así que dos cámaras
+del mismo portón (entrada y salida, o dos ángulos) emiten dos eventos por el
+mismo auto. El manager mantiene un `PlateDedup` para todo el nodo y los
+workers lo consultan (`DedupClient.claim`) al confirmar, antes de emitir:
+
+- la clave es (grupo de la cámara, patente normalizada);
+- la primera cámara del grupo que reclama la patente emite; las demás reciben
+  `emit=False` mientras no pase la ventana del grupo;
+- una cámara fuera de todo grupo siempre emite (queda su dedupe local);
+- si el backend no acepta el evento, la cámara libera la patente
+  (`DedupClient.release`) para que el grupo pueda volver a emitirla.
+
+Reclamar es una búsqueda en un dict dentro del event loop del manager (sin
+locks: asyncio atiende un request a la vez) y la consulta usa una conexión
+keep-alive con timeout corto. Si el manager no responde el worker emite
+igual: un duplicado es preferible a perder un evento.
+"""
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import requests
+
+from lpr.settings import settings
+
+
+def parse_groups(spec: Optional[str], default_window: float) -> Tuple[Dict[str, str], Dict[str, float]]:
+    """'porton=cam1,cam2@30; salida=cam3' -> ({cámara: grupo}, {grupo: ventana})."""
+    camera_group: Dict[str, str] = {}
+    windows: Dict[str, float] = {}
+    for part in (spec or '').split(';'):
+        name, sep, members = part.partition('=')
+        name, members = name.strip(), members.strip()
+        if not sep or not name or not members:
+            continue
+        members, _, window = members.partition('@')
+        try:
+            windows[name] = float(window) if window.strip() else float(default_window)
+        except ValueError:
+            logging.warning('Ventana inválida para el grupo de dedupe %s: %r', name, window)
+            windows[name] = float(default_window)
+        for camera in members.split(','):
+            if camera.strip():
+                camera_group[camera.strip()] = name
+    return camera_group, windows
+
+
+class PlateDedup:
+    """Primera emisión de cada patente por grupo de cámaras, dentro de una ventana."""
+
+    def __init__(self, camera_group: Dict[str, str], windows: Dict[str, float]):
+        self.camera_group = dict(camera_group)
+        self.windows = dict(windows)
+        self._emitted: Dict[Tuple[str, str], Tuple[float, str]] = {}  # (grupo, patente) -> (ts, cámara)
+        self._counters = {'claims': 0, 'duplicates': 0, 'ungrouped': 0, 'released': 0}
+        self._next_prune = 0.0
+
+    def claim(self, camera_id: str, plate: str, now: Optional[float] = None) -> Dict:
+        now = time.time() if now is None else now
+        self._counters['claims'] += 1
+        group = self.camera_group.get(camera_id.replace('_guardia', ''))
+        if group is None:
+            self._counters['ungrouped'] += 1
+            return {'emit': True}
+        window = self.windows[group]
+        key = (group, plate)
+        prev = self._emitted.get(key)
+        if prev is not None and now - prev[0] < window and prev[1] != camera_id:
+            self._counters['duplicates'] += 1
+            return {'emit': False, 'group': group, 'camera': prev[1], 'age': round(now - prev[0], 3)}
+        self._emitted[key] = (now, camera_id)
+        if now >= self._next_prune:
+            self._prune(now)
+        return {'emit': True, 'group': group}
+
+    def release(self, camera_id: str, plate: str) -> Dict:
+        """Deshace el reclamo de `camera_id` (su evento no llegó al backend)."""
+        group = self.camera_group.get(camera_id.replace('_guardia', ''))
+        key = (group, plate)
+        prev = self._emitted.get(key)
+        if group is None or prev is None or prev[1] != camera_id:
+            return {'released': False}
+        del self._emitted[key]
+        self._counters['released'] += 1
+        return {'released': True, 'group': group}
+
+    def _prune(self, now: float):
+        self._emitted = {k: v for k, v in self._emitted.items() if now - v[0] < self.windows.get(k[0], 0.0)}
+        self._next_prune = now + min(self.windows.values(), default=60.0)
+
+    def stats(self) -> Dict:
+        return dict(self._counters, groups=len(self.windows), tracked=len(self._emitted))
+
+
+class DedupClient:
+    """Lado worker: pregunta al manager si la patente ya la emitió otra cámara del grupo."""
+
+    def __init__(self, url: str, timeout: float = 0.25, secret: Optional[str] = None):
+        self.url = url
+        # `.../dedup/claim` -> `.../dedup/release`
+        self.release_url = url.rsplit('/', 1)[0] + '/release'
+        self.timeout = float(timeout)
+        self._headers = {'x-worker-secret': secret} if secret else {}
+        self._local = threading.local()  # una sesión keep-alive por hilo
+        self._failing = False
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def claim(self, camera_id: str, plate: str) -> Dict:
+        try:
+            resp = self._session().post(self.url, json={'cameraId': camera_id, 'plate': plate},
+                                        headers=self._headers, timeout=self.timeout)
+            resp.raise_for_status()
+            result = resp.json()
+        except Exception as e:
+            if not self._failing:
+                logging.warning('[DEDUP] Manager no disponible (%s): se emite sin dedupe entre cámaras', e)
+            self._failing = True
+            return {'emit': True, 'error': str(e)}
+        if self._failing:
+            logging.info('[DEDUP] Dedupe entre cámaras restablecido')
+        self._failing = False
+        return result
+
+    def release(self, camera_id: str, plate: str) -> bool:
+        try:
+            resp = self._session().post(self.release_url, json={'cameraId': camera_id, 'plate': plate},
+                                        headers=self._headers, timeout=self.timeout)
+            resp.raise_for_status()
+            return bool(resp.json().get('released'))
+        except Exception as e:
+            logging.warning('[DEDUP] No se pudo liberar %s en el manager (%s): el grupo no la emitirá hasta que venza la ventana',
+                            plate, e)
+            return False
+
+
+_CLIENT: Optional[DedupClient] = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_dedup_client() -> Optional[DedupClient]:
+    """Cliente del proceso (None si `LPR_DEDUP_URL` está vacío)."""
+    global _CLIENT
+    if not settings.LPR_DEDUP_URL:
+        return None
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = DedupClient(settings.LPR_DEDUP_URL, settings.LPR_DEDUP_TIMEOUT, settings.WORKER_MANAGER_SECRET)
+        return _CLIENT
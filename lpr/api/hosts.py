@@ -0,0 +1,276 @@
+"""Procesos host (`lpr.execute_host`) administrados por el manager.
+
+- `HostPool`: modo multi-cámara. En vez de un `lpr.execute_worker` por cámara,
+  el manager mantiene hasta `WORKER_HOST_PROCESSES` hosts y les reparte las
+  cámaras (la cámara nueva va al host con menos cámaras).
+- `IdlePool`: modo proceso-por-cámara. Reserva de hosts pre-calentados (modelos
+  ya cargados) que se entregan a una cámara al registrarla, así el primer frame
+  se procesa en milisegundos en vez de esperar el arranque en frío.
+
+Los comandos viajan como JSON por el stdin de cada host; ver `lpr/processor/host.py`.
+Todo es asyncio: el manager nunca bloquea su event loop esperando un proceso.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _kill(proc: asyncio.subprocess.Process):
+    if proc.returncode is None:
+        logger.warning(f"--- [KILL] PID {proc.pid} no terminó a tiempo ---")
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+
+
+async def stop_process(proc: asyncio.subprocess.Process, timeout: float = 10.0, terminate: bool = True):
+    """Termina un proceso sin bloquear el event loop: SIGTERM y, si sigue vivo
+    pasados `timeout` segundos, un timer le manda SIGKILL."""
+    if proc.returncode is not None:
+        return proc.returncode
+    if terminate:
+        try:
+            proc.terminate()
+        except ProcessLookupError:
+            pass
+    killer = asyncio.get_running_loop().call_later(timeout, _kill, proc)
+    try:
+        return await proc.wait()
+    finally:
+        killer.cancel()
+
+
+class HostProcess:
+    def __init__(self, name: str, proc: asyncio.subprocess.Process, log_path: Path, log_handle):
+        self.name = name
+        self.proc = proc
+        self.log_path = log_path
+        self.log_handle = log_handle
+        self.start_time = time.time()
+        # cameraId -> comando 'add' enviado (para re-enviarlo si el host se reinicia)
+        self.cameras: Dict[str, Dict] = {}
+
+    @property
+    def alive(self) -> bool:
+        return self.proc.returncode is None
+
+    async def send(self, cmd: Dict):
+        self.proc.stdin.write((json.dumps(cmd) + '\n').encode('utf-8'))
+        await self.proc.stdin.drain()
+
+    async def close(self, timeout: float = 10.0):
+        try:
+            await self.send({'op': 'shutdown'})
+            self.proc.stdin.close()
+        except Exception:
+            pass
+        # el host se detiene solo al recibir 'shutdown'; el timer lo mata si no
+        await stop_process(self.proc, timeout, terminate=False)
+        try:
+            self.log_handle.close()
+        except Exception:
+            pass
+
+
+async def spawn_host(name: str, log_path: Path, env: Dict[str, str], cwd: str, prewarm: str = '') -> HostProcess:
+    """Lanza un proceso `lpr.execute_host` con stdin conectado para recibir comandos."""
+    log_handle = open(log_path, 'ab')
+    py = sys.executable or 'python'
+    cmd = [py, '-m', 'lpr.execute_host', '--name', name]
+    if prewarm:
+        cmd += ['--prewarm', prewarm]
+    try:
+        proc = await asyncio.create_subprocess_exec(*cmd, stdin=asyncio.subprocess.PIPE, stdout=log_handle,
+                                                    stderr=asyncio.subprocess.STDOUT, env=env, cwd=cwd)
+    except Exception:
+        log_handle.close()
+        raise
+    logger.info(f"--- [STARTED] Host {name} (PID {proc.pid}) ---")
+    logger.info(f"--- [LOGS] {log_path} ---")
+    return HostProcess(name, proc, log_path, log_handle)
+
+
+class HostPool:
+    """Reparte cámaras entre un número fijo de procesos host."""
+
+    def __init__(self, size: int, log_dir: Path, env: Dict[str, str], cwd: str, cpu_allocator=None, prewarm: str = ''):
+        self.size = max(1, int(size))
+        self.log_dir = log_dir
+        self.env = env
+        self.cwd = cwd
+        self.prewarm_modes = prewarm
+        # CpuAllocator opcional: cada host recibe su presupuesto de hilos y CPUs
+        self.cpu_allocator = cpu_allocator
+        self.hosts: List[HostProcess] = []
+        self._seq = 0
+        self._lock = asyncio.Lock()
+
+    async def _spawn(self) -> HostProcess:
+        self._seq += 1
+        name = f'host-{self._seq}'
+        env = dict(self.env)
+        if self.cpu_allocator is not None:
+            env.update(self.cpu_allocator.env_for(name))
+        try:
+            host = await spawn_host(name, self.log_dir / f'worker_{name}.log', env, self.cwd, self.prewarm_modes)
+        except Exception:
+            if self.cpu_allocator is not None:
+                self.cpu_allocator.release(name)
+            raise
+        self.hosts.append(host)
+        return host
+
+    async def prewarm(self):
+        """Lanza de una vez todos los hosts para que carguen modelos antes de la primera cámara."""
+        async with self._lock:
+            while len(self.hosts) < self.size:
+                await self._spawn()
+
+    async def _revive(self, host: HostProcess) -> HostProcess:
+        """Reemplaza un host muerto por uno nuevo y le re-envía sus cámaras."""
+        logger.warning(f"--- [RESTART] Host {host.name} murió (code {host.proc.returncode}), re-lanzando ---")
+        self.hosts.remove(host)
+        try:
+            host.log_handle.close()
+        except Exception:
+            pass
+        if self.cpu_allocator is not None:
+            self.cpu_allocator.release(host.name)
+        new_host = await self._spawn()
+        # las cámaras quedan asignadas aunque falle el envío: si el host nuevo
+        # también murió, el próximo check() lo re-lanza y las vuelve a enviar
+        new_host.cameras.update(host.cameras)
+        for camera_id, add_cmd in host.cameras.items():
+            try:
+                await new_host.send(add_cmd)
+            except Exception as e:
+                logger.warning(f"No se pudo re-enviar {camera_id} a {new_host.name}: {e}")
+        return new_host
+
+    async def check(self):
+        """Re-lanza los hosts que hayan muerto."""
+        async with self._lock:
+            for host in list(self.hosts):
+                if not host.alive:
+                    await self._revive(host)
+
+    def host_of(self, camera_id: str) -> Optional[HostProcess]:
+        for host in self.hosts:
+            if camera_id in host.cameras:
+                return host
+        return None
+
+    async def assign(self, camera_id: str, rtsp_url: str, mode: str, backend_url: Optional[str], poll_interval: float) -> HostProcess:
+        await self.check()
+        async with self._lock:
+            if len(self.hosts) < self.size:
+                host = await self._spawn()
+            else:
+                host = min(self.hosts, key=lambda h: len(h.cameras))
+            add_cmd = {'op': 'add', 'cameraId': camera_id, 'rtspUrl': rtsp_url, 'mode': mode,
+                       'backendUrl': backend_url, 'pollInterval': poll_interval}
+            # se registra recién con el envío hecho: si falla, la cámara no queda
+            # asignada a un host que nunca la recibió
+            await host.send(add_cmd)
+            host.cameras[camera_id] = add_cmd
+            return host
+
+    async def release(self, camera_id: str) -> bool:
+        async with self._lock:
+            host = self.host_of(camera_id)
+            if host is None:
+                return False
+            del host.cameras[camera_id]
+            if host.alive:
+                try:
+                    await host.send({'op': 'remove', 'cameraId': camera_id})
+                except Exception:
+                    logger.exception(f"Error enviando remove de {camera_id} a {host.name}")
+            return True
+
+    async def close(self):
+        async with self._lock:
+            await asyncio.gather(*(host.close() for host in self.hosts), return_exceptions=True)
+            if self.cpu_allocator is not None:
+                for host in self.hosts:
+                    self.cpu_allocator.release(host.name)
+            self.hosts = []
+
+
+class IdlePool:
+    """Reserva de `size` hosts pre-calentados sin cámara (modo proceso-por-cámara).
+
+    `take()` entrega un host vivo (o None si la reserva está vacía) y repone la
+    reserva en segundo plano: el proceso nuevo carga los modelos mientras tanto.
+    """
+
+    def __init__(self, size: int, log_dir: Path, env: Dict[str, str], cwd: str, cpu_allocator=None, prewarm: str = 'patente'):
+        self.size = max(0, int(size))
+        self.log_dir = log_dir
+        self.env = env
+        self.cwd = cwd
+        self.cpu_allocator = cpu_allocator
+        self.prewarm_modes = prewarm
+        self.idle: List[HostProcess] = []
+        self._seq = 0
+        self._lock = asyncio.Lock()
+
+    async def _spawn(self) -> HostProcess:
+        self._seq += 1
+        name = f'idle-{self._seq}'
+        env = dict(self.env)
+        if self.cpu_allocator is not None:
+            env.update(self.cpu_allocator.env_for(name))
+        try:
+            host = await spawn_host(name, self.log_dir / f'worker_{name}.log', env, self.cwd, self.prewarm_modes)
+        except Exception:
+            if self.cpu_allocator is not None:
+                self.cpu_allocator.release(name)
+            raise
+        self.idle.append(host)
+        return host
+
+    async def fill(self):
+        async with self._lock:
+            # descartar reservas que hayan muerto (p. ej. fallo cargando modelos)
+            for host in [h for h in self.idle if not h.alive]:
+                logger.warning(f"--- [IDLE] {host.name} murió (code {host.proc.returncode}) ---")
+                self.idle.remove(host)
+                if self.cpu_allocator is not None:
+                    self.cpu_allocator.release(host.name)
+                try:
+                    host.log_handle.close()
+                except Exception:
+                    pass
+            while len(self.idle) < self.size:
+                try:
+                    await self._spawn()
+                except Exception:
+                    logger.exception('No se pudo lanzar host pre-calentado')
+                    break
+
+    async def take(self) -> Optional[HostProcess]:
+        async with self._lock:
+            live = [h for h in self.idle if h.alive]
+            host = live[0] if live else None
+            if host is not None:
+                self.idle.remove(host)
+        asyncio.get_running_loop().create_task(self.fill())
+        return host
+
+    async def close(self):
+        async with self._lock:
+            await asyncio.gather(*(host.close() for host in self.idle), return_exceptions=True)
+            if self.cpu_allocator is not None:
+                for host in self.idle:
+                    self.cpu_allocator.release(host.name)
+            self.idle = []
@@ -3,16 +3,21 @@ from __future__ import annotations
 import os
 import sys
 import time
-import threading
-import subprocess
+import asyncio
 import logging
+from collections import defaultdict
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 import requests
 
-from fastapi import FastAPI, HTTPException, Request, status, Depends
+from fastapi import FastAPI, HTTPException, Request, status, Depends, Query
 from pydantic import BaseModel
 from lpr.settings import settings
+from lpr.api.dedup import PlateDedup, parse_groups
+from lpr.api.hosts import HostPool, IdlePool, stop_process
+from lpr.storage.sightings import query_sightings
+from lpr.utils.cpu import CpuAllocator, available_cpus, parse_cpu_list
+from lpr.utils.stats import read_stats
 
 # Configurar logging
 logging.basicConfig(
@@ -35,17 +40,48 @@ class UnregisterPayload(BaseModel):
     cameraId: str
 
 
-_LOCK = threading.Lock()
-# cameraId -> { proc: Popen, start_time: float, cmd: list[str], log_path: Path }
+class BulkRegisterPayload(BaseModel):
+    cameras: List[RegisterPayload]
+
+
+class BulkUnregisterPayload(BaseModel):
+    cameraIds: List[str]
+
+
+class DedupClaimPayload(BaseModel):
+    cameraId: str
+    plate: str
+
+
+# El manager corre sobre asyncio: los handlers son `async def`, los procesos se
+# lanzan con asyncio.create_subprocess_exec y se detienen con timers, así que
+# ningún request espera a que otro proceso termine. Las operaciones sobre una
+# misma cámara se serializan con su propio lock; cámaras distintas avanzan en
+# paralelo (bulk register/unregister).
+_CAMERA_LOCKS: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+# cameraId -> { proc: asyncio Process, start_time: float, cmd: list[str], log_path: Path }
 _PROCS: Dict[str, Dict] = {}
+# procesos detenidos cuyo término todavía se está esperando
+_STOPPING: Dict[int, asyncio.Task] = {}
 
 LOG_DIR = Path(__file__).parent.parent / 'logs'
 LOG_DIR.mkdir(parents=True, exist_ok=True)
 
+PACKAGE_DIR = Path(__file__).parent.parent.resolve()
+PROJECT_ROOT = PACKAGE_DIR.parent
+
 SECRET = settings.WORKER_MANAGER_SECRET
 BACKEND_URL = settings.WORKER_BACKEND_URL or settings.WORKER_BACKEND_URL
 BACKEND_TOKEN = settings.WORKER_BACKEND_TOKEN
 
+# Dedupe de patentes entre cámaras del nodo (None si no hay WORKER_DEDUP_GROUPS).
+# Es estado en memoria de este proceso: con uvicorn --workers > 1 cada proceso
+# tendría el suyo y los claims de un mismo grupo no se verían entre sí
+# (`lpr.manager` se niega a arrancar en esa combinación).
+_DEDUP: Optional[PlateDedup] = None
+if settings.WORKER_DEDUP_GROUPS:
+    _DEDUP = PlateDedup(*parse_groups(settings.WORKER_DEDUP_GROUPS, settings.WORKER_DEDUP_WINDOW))
+
 
 def _check_secret(request: Request):
     if not SECRET:
@@ -63,6 +99,52 @@ def _check_secret(request: Request):
     return True
 
 
+def _worker_env() -> Dict[str, str]:
+    """Entorno para los subprocesos: antepone la raíz del repo a PYTHONPATH
+    para que `-m lpr.execute_worker` / `-m lpr.execute_host` encuentren el paquete."""
+    env = os.environ.copy()
+    proj_str = str(PROJECT_ROOT)
+    old_pp = env.get('PYTHONPATH', '')
+    if proj_str not in [p for p in old_pp.split(os.pathsep) if p]:
+        env['PYTHONPATH'] = proj_str + (os.pathsep + old_pp if old_pp else '')
+    if _DEDUP is not None and not env.get('LPR_DEDUP_URL'):
+        # los workers consultan el dedupe entre cámaras a este manager, en el
+        # host/puerto donde escucha (`lpr.manager` los fija desde --host/--port)
+        host = settings.WORKER_MANAGER_HOST
+        if host in ('', '0.0.0.0', '::'):
+            host = '127.0.0.1'
+        elif ':' in host:
+            host = f'[{host}]'
+        env['LPR_DEDUP_URL'] = f'http://{host}:{settings.WORKER_MANAGER_PORT}/dedup/claim'
+    return env
+
+
+def _build_cpu_allocator() -> CpuAllocator:
+    cpus = parse_cpu_list(settings.WORKER_CPU_SET) or available_cpus()
+    threads = settings.WORKER_THREADS_PER_PROCESS
+    if not threads:
+        # auto: en modo multi-cámara cada host se queda con su grupo de cores;
+        # en modo proceso-por-cámara un hilo por proceso evita N×N hilos peleando
+        threads = max(1, len(cpus) // settings.WORKER_HOST_PROCESSES) if settings.WORKER_HOST_PROCESSES > 0 else 1
+    return CpuAllocator(cpus, threads, pin=settings.WORKER_PIN_CPUS)
+
+
+_CPU = _build_cpu_allocator()
+
+# Modo multi-cámara: si WORKER_HOST_PROCESSES > 0 las cámaras se reparten entre
+# ese número de procesos host en vez de lanzar un proceso por cámara.
+_HOSTS: Optional[HostPool] = None
+# Modo proceso-por-cámara: reserva de procesos con modelos ya cargados que se
+# entregan a la cámara al registrarla (sin arranque en frío del intérprete).
+_IDLE: Optional[IdlePool] = None
+if settings.WORKER_HOST_PROCESSES > 0:
+    _HOSTS = HostPool(settings.WORKER_HOST_PROCESSES, LOG_DIR, _worker_env(), str(PROJECT_ROOT),
+                      cpu_allocator=_CPU, prewarm=settings.WORKER_PREWARM_MODES)
+elif settings.WORKER_PREWARM_POOL > 0:
+    _IDLE = IdlePool(settings.WORKER_PREWARM_POOL, LOG_DIR, _worker_env(), str(PROJECT_ROOT),
+                     cpu_allocator=_CPU, prewarm=settings.WORKER_PREWARM_MODES)
+
+
 def _sanitize_fname(s: str) -> str:
     # keep alnum and -_. otherwise replace with '_'
     out = []
@@ -74,186 +156,440 @@ def _sanitize_fname(s: str) -> str:
     return ''.join(out)
 
 
-@APP.post('/register-camera')
-def register_camera(payload: RegisterPayload, auth: bool = Depends(_check_secret)):
+async def _start_camera(camera_id: str, payload: RegisterPayload) -> Dict:
+    """Arranca el pipeline de una cámara y registra su entrada en `_PROCS`."""
+    if _HOSTS is not None:
+        try:
+            host = await _HOSTS.assign(camera_id, payload.rtspUrl, payload.mode, BACKEND_URL, 1.0)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f'failed to assign camera to host: {e}')
+        logger.info(f"--- [ASSIGNED] {camera_id} -> {host.name} (PID {host.proc.pid}) ---")
+        _PROCS[camera_id] = {'proc': host.proc, 'host': host.name, 'start_time': time.time(), 'cmd': ['host', host.name, payload.mode], 'log_path': str(host.log_path),
+                             'rtsp_url': payload.rtspUrl, 'mode': payload.mode}
+        return {'status': 'started', 'pid': host.proc.pid, 'host': host.name, 'log': str(host.log_path)}
+
+    if _IDLE is not None:
+        idle = await _IDLE.take()
+        if idle is not None:
+            try:
+                await idle.send({'op': 'add', 'cameraId': camera_id, 'rtspUrl': payload.rtspUrl, 'mode': payload.mode,
+                                 'backendUrl': BACKEND_URL, 'pollInterval': 1.0})
+            except Exception:
+                logger.exception(f"Host pre-calentado {idle.name} no respondió, arrancando en frío")
+                _CPU.release(idle.name)
+                asyncio.get_running_loop().create_task(idle.close(timeout=1))
+            else:
+                _CPU.rename(idle.name, camera_id)
+                logger.info(f"--- [STARTED] Worker for {camera_id} (pre-calentado {idle.name}, PID {idle.proc.pid}) ---")
+                _PROCS[camera_id] = {'proc': idle.proc, 'start_time': time.time(), 'cmd': ['prewarmed', idle.name, payload.mode],
+                                     'log_path': str(idle.log_path), 'log_handle': idle.log_handle,
+                                     'rtsp_url': payload.rtspUrl, 'mode': payload.mode}
+                return {'status': 'started', 'pid': idle.proc.pid, 'log': str(idle.log_path), 'prewarmed': True}
+
+    # build command: use same python executable
+    py = sys.executable or 'python'
+    backend_arg = BACKEND_URL or ''
+    cmd = [py, '-m', 'lpr.execute_worker', payload.rtspUrl, camera_id, backend_arg, '1.0', payload.mode]
+
+    fname = f"worker_{_sanitize_fname(camera_id)}.log"
+    log_path = LOG_DIR / fname
+    # ensure log dir exists (race-free-ish)
+    try:
+        LOG_DIR.mkdir(parents=True, exist_ok=True)
+    except Exception:
+        # if mkdir fails, we'll let open() raise below with a clear error
+        pass
+
+    # open log file in append-binary and keep handle so we can close it on stop
+    try:
+        log_file = open(log_path, 'ab')
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f'failed to open log file {log_path}: {e}')
+
+    env = _worker_env()
+    env.update(_CPU.env_for(camera_id))
+    try:
+        proc = await asyncio.create_subprocess_exec(*cmd, stdout=log_file, stderr=asyncio.subprocess.STDOUT, env=env, cwd=str(PROJECT_ROOT))
+        logger.info(f"--- [STARTED] Worker for {camera_id} (PID {proc.pid}, CPUs {env.get('LPR_CPU_SET', '*')}) ---")
+        logger.info(f"--- [LOGS] {log_path} ---")
+    except Exception as e:
+        _CPU.release(camera_id)
+        try:
+            log_file.close()
+        except Exception:
+            pass
+        raise HTTPException(status_code=500, detail=f'failed to start worker: {e}')
+
+    _PROCS[camera_id] = {'proc': proc, 'start_time': time.time(), 'cmd': cmd, 'log_path': str(log_path), 'log_handle': log_file,
+                         'rtsp_url': payload.rtspUrl, 'mode': payload.mode}
+    return {'status': 'started', 'pid': proc.pid, 'log': str(log_path)}
+
+
+async def _register(payload: RegisterPayload) -> Dict:
     if not payload.rtspUrl:
         raise HTTPException(status_code=400, detail='rtspUrl required')
     camera_id = payload.cameraId
-    with _LOCK:
+    async with _CAMERA_LOCKS[camera_id]:
         if camera_id in _PROCS:
             proc_info = _PROCS[camera_id]
             return {'status': 'already_running', 'pid': proc_info['proc'].pid}
+        return await _start_camera(camera_id, payload)
 
-        # build command: use same python executable
-        py = sys.executable or 'python'
-        backend_arg = BACKEND_URL or ''
-        cmd = [py, '-m', 'lpr.execute_worker', payload.rtspUrl, camera_id, backend_arg, '1.0', payload.mode]
 
-        fname = f"worker_{_sanitize_fname(camera_id)}.log"
-        log_path = LOG_DIR / fname
-        # ensure log dir exists (race-free-ish)
+async def _reap(camera_id: str, info: Dict):
+    """Espera (con timer de SIGKILL) a que termine un worker detenido y cierra su log."""
+    proc = info['proc']
+    try:
+        code = await stop_process(proc, timeout=settings.WORKER_STOP_TIMEOUT)
+        logger.info(f"--- [STOPPED] Worker for {camera_id} (PID {proc.pid}, code {code}) ---")
+    finally:
         try:
-            LOG_DIR.mkdir(parents=True, exist_ok=True)
+            info['log_handle'].close()
         except Exception:
-            # if mkdir fails, we'll let open() raise below with a clear error
             pass
+        _STOPPING.pop(proc.pid, None)
 
-        # open log file in append-binary and keep handle so we can close it on stop
-        try:
-            log_file = open(log_path, 'ab')
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f'failed to open log file {log_path}: {e}')
 
-        try:
-            # ensure the subprocess can import the `lpr` package:
-            # package_dir = <repo>/lpr, project_root = parent of lpr (repo root)
-            package_dir = Path(__file__).parent.parent.resolve()
-            project_root = package_dir.parent
-            env = os.environ.copy()
-            # prepend project_root (repo root) to PYTHONPATH so `-m lpr.execute_worker` can find the package
-            proj_str = str(project_root)
-            old_pp = env.get('PYTHONPATH', '')
-            if proj_str not in [p for p in old_pp.split(os.pathsep) if p]:
-                env['PYTHONPATH'] = proj_str + (os.pathsep + old_pp if old_pp else '')
-
-            proc = subprocess.Popen(cmd, stdout=log_file, stderr=subprocess.STDOUT, env=env, cwd=proj_str)
-            logger.info(f"--- [STARTED] Worker for {camera_id} (PID {proc.pid}) ---")
-            logger.info(f"--- [LOGS] {log_path} ---")
-        except Exception as e:
-            try:
-                log_file.close()
-            except Exception:
-                pass
-            raise HTTPException(status_code=500, detail=f'failed to start worker: {e}')
+async def _unregister(camera_id: str) -> Dict:
+    async with _CAMERA_LOCKS[camera_id]:
+        info = _PROCS.pop(camera_id, None)
+        if info is None:
+            return {'status': 'not_found'}
+        if 'host' in info:
+            # la cámara vive en un host compartido: solo detener su pipeline
+            await _HOSTS.release(camera_id)
+            logger.info(f"--- [STOPPING] {camera_id} en {info['host']} ---")
+            return {'status': 'stopped'}
+        proc = info['proc']
+        logger.info(f"--- [STOPPING] Worker for {camera_id} (PID {proc.pid}) ---")
+        # la asignación de CPU se libera ya: el proceso viejo muere en segundos
+        _CPU.release(camera_id)
+        # no esperar al proceso: SIGTERM ahora y un timer lo mata si no termina
+        _STOPPING[proc.pid] = asyncio.get_running_loop().create_task(_reap(camera_id, info))
+        return {'status': 'stopping', 'pid': proc.pid}
+
 
-        _PROCS[camera_id] = {'proc': proc, 'start_time': time.time(), 'cmd': cmd, 'log_path': str(log_path), 'log_handle': log_file}
-        return {'status': 'started', 'pid': proc.pid, 'log': str(log_path)}
+@APP.post('/register-camera')
+async def register_camera(payload: RegisterPayload, auth: bool = Depends(_check_secret)):
+    return await _register(payload)
 
 
 @APP.post('/unregister-camera')
-def unregister_camera(payload: UnregisterPayload, auth: bool = Depends(_check_secret)):
-    camera_id = payload.cameraId
-    with _LOCK:
-        if camera_id not in _PROCS:
-            return {'status': 'not_found'}
-        info = _PROCS[camera_id]
-        proc = info['proc']
-        logger.info(f"--- [STOPPING] Worker for {camera_id} (PID {proc.pid}) ---")
-        # try graceful termination
-        try:
-            proc.terminate()
-        except Exception:
-            pass
+async def unregister_camera(payload: UnregisterPayload, auth: bool = Depends(_check_secret)):
+    return await _unregister(payload.cameraId)
 
-    # wait outside lock
-    try:
-        proc.wait(timeout=10)
-    except Exception:
-        try:
-            proc.kill()
-        except Exception:
-            pass
 
-    with _LOCK:
-        try:
-            info['log_handle'].close()
-        except Exception:
-            pass
-        del _PROCS[camera_id]
+def _bulk_result(result) -> Dict:
+    if isinstance(result, HTTPException):
+        return {'status': 'error', 'detail': result.detail}
+    if isinstance(result, BaseException):
+        return {'status': 'error', 'detail': str(result)}
+    return result
+
+
+@APP.post('/register-cameras')
+async def register_cameras(payload: BulkRegisterPayload, auth: bool = Depends(_check_secret)):
+    """Registra varias cámaras en paralelo. Devuelve el resultado por cameraId."""
+    results = await asyncio.gather(*(_register(p) for p in payload.cameras), return_exceptions=True)
+    return {p.cameraId: _bulk_result(r) for p, r in zip(payload.cameras, results)}
+
+
+@APP.post('/unregister-cameras')
+async def unregister_cameras(payload: BulkUnregisterPayload, auth: bool = Depends(_check_secret)):
+    """Detiene varias cámaras en paralelo. Devuelve el resultado por cameraId."""
+    results = await asyncio.gather(*(_unregister(c) for c in payload.cameraIds), return_exceptions=True)
+    return {c: _bulk_result(r) for c, r in zip(payload.cameraIds, results)}
+
 
-    return {'status': 'stopped'}
+def _refresh_host_procs():
+    """El host de una cámara pudo haber sido re-lanzado: refrescar pid/log en `_PROCS`."""
+    for k, v in _PROCS.items():
+        host = _HOSTS.host_of(k)
+        if host is not None:
+            v.update({'proc': host.proc, 'host': host.name, 'log_path': str(host.log_path)})
 
 
 @APP.get('/status')
-def get_status(auth: bool = Depends(_check_secret)):
-    with _LOCK:
-        out = {}
-        for k, v in _PROCS.items():
-            out[k] = {'pid': v['proc'].pid, 'start_time': v['start_time'], 'cmd': v['cmd'], 'log': v['log_path']}
-        return out
+async def get_status(auth: bool = Depends(_check_secret)):
+    if _HOSTS is not None:
+        _refresh_host_procs()
+    out = {}
+    for k, v in _PROCS.items():
+        out[k] = {'pid': v['proc'].pid, 'start_time': v['start_time'], 'cmd': v['cmd'], 'log': v['log_path']}
+        if 'host' in v:
+            out[k]['host'] = v['host']
+        cpus = _CPU.allocations.get(v.get('host', k))
+        if cpus:
+            out[k]['cpus'] = cpus
+    return out
+
+
+@APP.get('/stats')
+async def get_stats(auth: bool = Depends(_check_secret)):
+    """Métricas por cámara: captura (reconexiones, FPS, errores, edad del frame),
+    latencia captura→ack, profundidad y descartes de cada etapa del pipeline y
+    aciertos de la caché de OCR, ver `lpr.utils.stats`.
+
+    A los hosts multi-cámara se les pide una foto al momento y se la espera hasta
+    1 s; los procesos por cámara escriben la suya cada `LPR_STATS_INTERVAL` s.
+    """
+    requested = time.time()
+    hosts = [h for h in _HOSTS.hosts if h.alive] if _HOSTS is not None else []
+    for host in hosts:
+        try:
+            await host.send({'op': 'stats'})
+        except Exception as e:
+            logger.warning(f"No se pudieron pedir métricas a {host.name}: {e}")
+    pids = {v['proc'].pid for v in _PROCS.values()} | {h.proc.pid for h in hosts}
+    deadline = requested + 1.0
+    while True:
+        reports = await asyncio.to_thread(read_stats, settings.LPR_STATS_DIR, pids)
+        fresh = {r.get('pid') for r in reports.values() if r.get('ts', 0) >= requested}
+        if all(h.proc.pid in fresh for h in hosts) or time.time() >= deadline:
+            break
+        await asyncio.sleep(0.05)
+    out = {}
+    for name, report in reports.items():
+        for camera_id, stats in (report.get('cameras') or {}).items():
+            out[camera_id] = dict(stats, process=name, pid=report.get('pid'), ts=report.get('ts'))
+    return out
+
+
+@APP.get('/sightings')
+async def get_sightings(plate: Optional[str] = None, camera: Optional[str] = None, hours: float = 24.0,
+                        read_status: Optional[str] = Query(None, alias='status'), limit: int = 100, auth: bool = Depends(_check_secret)):
+    """Lecturas del índice local de patentes (el mismo SQLite que escriben los workers)."""
+    since = time.time() - hours * 3600 if hours > 0 else None
+    plate = plate.upper().replace('-', '').replace(' ', '') if plate else None
+    rows = await asyncio.to_thread(query_sightings, settings.LPR_SIGHTINGS_DB, plate, camera, since, None,
+                                   read_status, min(max(1, limit), 1000))
+    return {'count': len(rows), 'sightings': rows}
+
+
+@APP.post('/dedup/claim')
+async def dedup_claim(payload: DedupClaimPayload, auth: bool = Depends(_check_secret)):
+    """¿Emite esta cámara la patente? False si otra cámara de su grupo ya la emitió dentro de la ventana."""
+    if _DEDUP is None:
+        return {'emit': True}
+    return _DEDUP.claim(payload.cameraId, payload.plate)
+
+
+@APP.post('/dedup/release')
+async def dedup_release(payload: DedupClaimPayload, auth: bool = Depends(_check_secret)):
+    """Libera la patente reclamada por la cámara: su evento no llegó al backend."""
+    if _DEDUP is None:
+        return {'released': False}
+    return _DEDUP.release(payload.cameraId, payload.plate)
 
 
 @APP.get('/')
-def index():
+async def index():
     return {'ok': True}
 
 
 @APP.get('/health')
-def health():
+async def health():
     """Health endpoint for external callers. Returns ok and number of running workers."""
-    with _LOCK:
-        running = len(_PROCS)
-    return {'ok': True, 'running_workers': running}
+    out = {'ok': True, 'running_workers': len(_PROCS), 'stopping_workers': len(_STOPPING), 'cpu': _CPU.report()}
+    if _DEDUP is not None:
+        out['dedup'] = _DEDUP.stats()
+    return out
+
+
+@APP.on_event('startup')
+async def prewarm_workers():
+    """Lanza los procesos pre-calentados para que carguen modelos antes de la primera cámara."""
+    if _HOSTS is not None:
+        await _HOSTS.prewarm()
+    if _IDLE is not None:
+        await _IDLE.fill()
+
+
+_WATCHDOG_TASK: Optional[asyncio.Task] = None
+
+
+async def _host_watchdog():
+    """Re-lanza los hosts que murieron (con sus cámaras) sin esperar a un request."""
+    while True:
+        await asyncio.sleep(settings.WORKER_HOST_CHECK_INTERVAL)
+        try:
+            await _HOSTS.check()
+            _refresh_host_procs()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error revisando procesos host: {e}")
 
 
 @APP.on_event('startup')
-def reconcile_with_backend():
+async def start_host_watchdog():
+    global _WATCHDOG_TASK
+    if _HOSTS is not None:
+        _WATCHDOG_TASK = asyncio.get_running_loop().create_task(_host_watchdog())
+
+
+@APP.on_event('shutdown')
+async def stop_hosts():
+    if _WATCHDOG_TASK is not None:
+        _WATCHDOG_TASK.cancel()
+    if _HOSTS is not None:
+        await _HOSTS.close()
+    if _IDLE is not None:
+        await _IDLE.close()
+
+
+def _backend_session() -> requests.Session:
+    """Sesión HTTP con pool de conexiones (keep-alive) hacia el backend."""
+    session = requests.Session()
+    pool = max(1, settings.WORKER_RECONCILE_CONCURRENCY)
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if BACKEND_TOKEN:
+        session.headers['Authorization'] = f'Bearer {BACKEND_TOKEN}'
+    return session
+
+
+async def _fetch_desired_cameras(session: requests.Session) -> Optional[Dict[str, RegisterPayload]]:
+    """Cámaras que deberían estar corriendo según el backend.
+
+    Devuelve None si no se pudo obtener la lista (no se debe detener nada). Las
+    fuentes (`GET /cameras/{id}/source`) se piden en paralelo sobre la sesión
+    compartida; las cámaras cuya fuente falla quedan fuera del resultado y se
+    listan en `_UNKNOWN` para no detenerlas por un error transitorio.
+    """
+    url_base = BACKEND_URL.rstrip('/')
+    resp = await asyncio.to_thread(session.get, f'{url_base}/cameras', timeout=5)
+    if resp.status_code != 200:
+        logger.warning(f"Reconciliación: GET /cameras -> {resp.status_code}")
+        return None
+    cams = resp.json()
+    if not isinstance(cams, list):
+        return None
+
+    wanted = []
+    for cam in cams:
+        cam_id = cam.get('id') or cam.get('mountPath')
+        if not cam_id:
+            continue
+        # Decidir qué modos arrancar
+        enable_lpr = cam.get('enableLpr', False)
+        enable_guardian = cam.get('enableGuardian', False)
+        if enable_lpr or enable_guardian:
+            wanted.append((cam_id, cam, enable_lpr, enable_guardian))
+
+    sem = asyncio.Semaphore(max(1, settings.WORKER_RECONCILE_CONCURRENCY))
+
+    async def fetch_source(cam_id):
+        # Intentar obtener source desencriptada
+        async with sem:
+            sresp = await asyncio.to_thread(session.get, f"{url_base}/cameras/{cam_id}/source", timeout=5)
+        if sresp.status_code != 200:
+            return None
+        return sresp.json().get('sourceUrl')
+
+    sources = await asyncio.gather(*(fetch_source(w[0]) for w in wanted), return_exceptions=True)
+
+    desired: Dict[str, RegisterPayload] = {}
+    _UNKNOWN.clear()
+    for (cam_id, cam, enable_lpr, enable_guardian), src in zip(wanted, sources):
+        if isinstance(src, BaseException):
+            logger.error(f"Error obteniendo source de {cam_id}: {src}")
+            src = None
+        if not src:
+            _UNKNOWN.update({cam_id, f"{cam_id}_guardia"})
+            continue
+        # Arrancar LPR si aplica
+        if enable_lpr:
+            desired[cam_id] = RegisterPayload(cameraId=cam_id, rtspUrl=src, mountPath=cam.get('mountPath'))
+        # Arrancar Guardián si aplica; ID con sufijo para no colisionar con LPR en el manager
+        if enable_guardian:
+            desired[f"{cam_id}_guardia"] = RegisterPayload(cameraId=f"{cam_id}_guardia", rtspUrl=src,
+                                                           mountPath=cam.get('mountPath'), mode='guardia')
+    return desired
+
+
+# cámaras cuya fuente no se pudo obtener en la última reconciliación
+_UNKNOWN: set = set()
+_RECONCILE_TASK: Optional[asyncio.Task] = None
+
+
+async def reconcile_once(session: Optional[requests.Session] = None):
+    """Alinea los workers con las cámaras habilitadas en el backend.
+
+    Arranca las que faltan (espaciadas `WORKER_RECONCILE_STAGGER` segundos para
+    no cargar modelos todas a la vez), reinicia las que cambiaron de fuente y
+    detiene las que ya no están habilitadas.
+    """
+    if not BACKEND_URL:
+        return
+    session = session or _backend_session()
+    desired = await _fetch_desired_cameras(session)
+    if desired is None:
+        return
+
+    running = {k: (v.get('rtsp_url'), v.get('mode')) for k, v in _PROCS.items()}
+    to_stop = [k for k in running if k not in desired and k not in _UNKNOWN]
+    to_start = []
+    for cam_id, payload in desired.items():
+        if cam_id not in running:
+            to_start.append(payload)
+        elif running[cam_id] != (payload.rtspUrl, payload.mode):
+            logger.info(f"Reconciliación: {cam_id} cambió de fuente, reiniciando")
+            to_stop.append(cam_id)
+            to_start.append(payload)
+
+    for cam_id in to_stop:
+        logger.info(f"Reconciliación: deteniendo {cam_id}")
+    for cam_id, result in zip(to_stop, await asyncio.gather(*(_unregister(c) for c in to_stop), return_exceptions=True)):
+        if isinstance(result, BaseException):
+            logger.error(f"Error deteniendo {cam_id} en reconciliación: {result}")
+
+    for i, payload in enumerate(to_start):
+        if i > 0 and settings.WORKER_RECONCILE_STAGGER > 0:
+            await asyncio.sleep(settings.WORKER_RECONCILE_STAGGER)
+        try:
+            await _register(payload)
+        except Exception as e:
+            logger.error(f"Error arrancando {payload.mode} para {payload.cameraId} en reconciliación: {e}")
+    if to_start or to_stop:
+        logger.info(f"Reconciliación: {len(to_start)} arrancadas, {len(to_stop)} detenidas")
+
+
+async def _reconcile_loop():
+    session = _backend_session()
+    while True:
+        try:
+            await reconcile_once(session)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error en reconciliación con backend: {e}")
+        interval = settings.WORKER_RECONCILE_INTERVAL
+        if interval <= 0:
+            return
+        await asyncio.sleep(interval)
+
+
+@APP.on_event('startup')
+async def reconcile_with_backend():
     """Al iniciar, consulta el backend (si está configurado) y registra cámaras con enableLpr=true.
     Requiere que el backend exponga `GET /cameras` y `GET /cameras/{id}/source`.
     Si el backend requiere autenticación, poner token en WORKER_BACKEND_TOKEN (Bearer).
+
+    Corre como tarea de fondo para que el manager atienda requests de inmediato,
+    y se repite cada `WORKER_RECONCILE_INTERVAL` segundos (0 = solo al inicio).
     """
+    global _RECONCILE_TASK
     if not BACKEND_URL:
         return
-    try:
-        url_base = BACKEND_URL.rstrip('/')
-        headers = {}
-        if BACKEND_TOKEN:
-            headers['Authorization'] = f'Bearer {BACKEND_TOKEN}'
+    _RECONCILE_TASK = asyncio.get_running_loop().create_task(_reconcile_loop())
 
-        resp = requests.get(f'{url_base}/cameras', timeout=5, headers=headers)
-        if resp.status_code != 200:
-            return
-        cams = resp.json()
-        if not isinstance(cams, list):
-            return
-        for cam in cams:
-            try:
-                cam_id = cam.get('id') or cam.get('mountPath')
-                if not cam_id:
-                    continue
-
-                # Decidir qué modos arrancar
-                enable_lpr = cam.get('enableLpr', False)
-                enable_guardian = cam.get('enableGuardian', False)
-
-                if not (enable_lpr or enable_guardian):
-                    continue
-
-                # Intentar obtener source desencriptada
-                sresp = requests.get(f"{url_base}/cameras/{cam_id}/source", timeout=5, headers=headers)
-                if sresp.status_code != 200:
-                    continue
-                src = sresp.json().get('sourceUrl')
-                if not src:
-                    continue
-
-                # Arrancar LPR si aplica
-                if enable_lpr:
-                    try:
-                        payload = RegisterPayload(cameraId=cam_id, rtspUrl=src, mountPath=cam.get('mountPath'))
-                        register_camera(payload, True)
-                    except Exception as e:
-                        logger.error(f"Error arrancando LPR para {cam_id} en startup: {e}")
-
-                # Arrancar Guardián si aplica
-                if enable_guardian:
-                    try:
-                        # Usar ID con sufijo para no colisionar con LPR en el manager
-                        payload = RegisterPayload(
-                            cameraId=f"{cam_id}_guardia", 
-                            rtspUrl=src, 
-                            mountPath=cam.get('mountPath'),
-                            mode='guardia'
-                        )
-                        register_camera(payload, True)
-                    except Exception as e:
-                        logger.error(f"Error arrancando Guardián para {cam_id} en startup: {e}")
-
-            except Exception as e:
-                logger.error(f"Error procesando cámara {cam.get('id')} en startup: {e}")
-                continue
-    except Exception:
-        return
+
+@APP.on_event('shutdown')
+async def stop_reconcile():
+    if _RECONCILE_TASK is not None:
+        _RECONCILE_TASK.cancel()
 
 
 if __name__ == '__main__':
@@ -0,0 +1 @@
+"""Capa de captura de video (buffers de frames, clips de eventos)."""
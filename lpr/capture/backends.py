@@ -0,0 +1,147 @@
+"""Backends de captura: OpenCV (por defecto) y PyAV con decodificación muestreada.
+
+`cv2.VideoCapture` decodifica y convierte a BGR todos los frames del stream
+aunque el worker solo analice uno por `poll_interval`. `PyAVCapture` expone la
+misma interfaz mínima (`read`, `isOpened`, `release`) pero:
+
+- solo convierte a BGR (y escala con swscale a `max_width`) los frames que
+  tocan según `sample_interval`; el resto se decodifica sin convertir,
+- descarta en el decoder los frames no-referencia (nunca hacen falta para
+  decodificar otros),
+- con `keyframes_only` el decoder solo procesa keyframes: el costo de
+  decodificar baja en proporción al GOP (útil si el GOP <= `poll_interval`).
+
+PyAV (`pip install av`) es opcional: si no está instalado se usa OpenCV.
+"""
+import logging
+import time
+from typing import Optional
+
+from lpr.settings import settings
+
+
+class PtsClock:
+    """Lleva el tiempo del stream (pts en segundos) a epoch, anclado al primer frame recibido."""
+
+    def __init__(self):
+        # (pts, reloj) de referencia
+        self._anchor: Optional[tuple] = None
+
+    def epoch(self, pts_time: Optional[float]) -> float:
+        now = time.time()
+        if pts_time is None:
+            return now
+        if self._anchor is None:
+            self._anchor = (pts_time, now)
+        ts = self._anchor[1] + (pts_time - self._anchor[0])
+        # salto de pts (reinicio de la cámara, archivo más rápido que tiempo real): re-anclar
+        if ts > now + 1.0 or now - ts > 60.0:
+            self._anchor = (pts_time, now)
+            ts = now
+        return ts
+
+
+class PyAVCapture:
+    def __init__(self, url: str, sample_interval: float = 0.0, keyframes_only: bool = False, max_width: int = 0,
+                 open_timeout: float = 10.0):
+        import av
+        self.url = url
+        self.sample_interval = max(0.0, float(sample_interval))
+        self.max_width = int(max_width or 0)
+        self._next_sample: Optional[float] = None
+        self._clock = PtsClock()
+        # momento de captura (epoch, derivado del pts) del último frame devuelto
+        self.last_timestamp: Optional[float] = None
+        self._counters = {'packets': 0, 'decoded': 0, 'returned': 0}
+        options = {}
+        if url.startswith('rtsp'):
+            options = {'rtsp_transport': 'tcp', 'stimeout': str(int(open_timeout * 1e6))}
+        try:
+            self._container = av.open(url, options=options, timeout=open_timeout)
+            self._stream = self._container.streams.video[0]
+        except Exception as e:
+            logging.error('PyAV: no se pudo abrir %s: %s', url, e)
+            self._container = None
+            return
+        self._stream.thread_type = 'AUTO'
+        if keyframes_only:
+            self._stream.codec_context.skip_frame = 'NONKEY'
+        elif self.sample_interval > 0:
+            self._stream.codec_context.skip_frame = 'NONREF'
+        self._packets = self._container.demux(self._stream)
+
+    def isOpened(self) -> bool:
+        return self._container is not None
+
+    def _due(self, frame) -> bool:
+        # tiempo del stream (pts) si existe: en archivos avanza más rápido que el reloj
+        t = frame.time if frame.time is not None else time.time()
+        if self._next_sample is not None and t < self._next_sample:
+            return False
+        self._next_sample = t + self.sample_interval
+        return True
+
+    def _timestamp(self, frame) -> float:
+        return self._clock.epoch(frame.time)
+
+    def _to_bgr(self, frame):
+        width, height = frame.width, frame.height
+        if self.max_width and width > self.max_width:
+            height = int(height * self.max_width / width) // 2 * 2
+            width = self.max_width
+        return frame.reformat(width=width, height=height, format='bgr24').to_ndarray()
+
+    def read(self):
+        if self._container is None:
+            return False, None
+        try:
+            for packet in self._packets:
+                if packet.size == 0:
+                    continue
+                self._counters['packets'] += 1
+                for frame in packet.decode():
+                    self._counters['decoded'] += 1
+                    if not self._due(frame):
+                        continue
+                    self._counters['returned'] += 1
+                    self.last_timestamp = self._timestamp(frame)
+                    return True, self._to_bgr(frame)
+        except Exception as e:
+            logging.warning('PyAV: error leyendo %s: %s', self.url, e)
+        # fin del stream o error: como cv2, read() devuelve False de ahí en más
+        self.release()
+        return False, None
+
+    def stats(self):
+        return dict(self._counters)
+
+    def release(self):
+        if self._container is not None:
+            try:
+                self._container.close()
+            except Exception:
+                pass
+            self._container = None
+
+
+def open_capture(url: str, sample_interval: float = 0.0, backend: Optional[str] = None, timeout: float = 10.0):
+    """Abre la fuente de video con el backend configurado (`LPR_CAPTURE_BACKEND`).
+
+    `timeout` (segundos) acota la apertura y cada lectura, para que un stream
+    caído no bloquee `read()` indefinidamente.
+    """
+    backend = (backend or settings.LPR_CAPTURE_BACKEND or 'opencv').lower()
+    if settings.LPR_CLIPS_ENABLED:
+        # el buffer de clips necesita sus LPR_CLIP_FPS aunque el análisis sea más lento
+        sample_interval = min(sample_interval, 1.0 / settings.LPR_CLIP_FPS)
+    if backend == 'pyav':
+        try:
+            import av  # noqa: F401
+        except ImportError:
+            logging.warning('LPR_CAPTURE_BACKEND=pyav pero PyAV no está instalado (pip install av); usando OpenCV')
+        else:
+            return PyAVCapture(url, sample_interval, keyframes_only=settings.LPR_CAPTURE_KEYFRAMES_ONLY,
+                               max_width=settings.LPR_CAPTURE_MAX_WIDTH, open_timeout=timeout)
+    import cv2
+    ms = int(timeout * 1000)
+    return cv2.VideoCapture(url, cv2.CAP_FFMPEG, [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, ms, cv2.CAP_PROP_READ_TIMEOUT_MSEC, ms])
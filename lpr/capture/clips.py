@@ -0,0 +1,166 @@
+"""Clips pre/post evento a partir de un buffer circular de frames en memoria.
+
+`ClipRecorder` guarda (por cámara) los últimos segundos de video como JPEGs
+comprimidos, muestreados a `fps` y reducidos a `max_width`, con un tope de
+memoria `max_bytes`. Ante un evento (`trigger`) se reserva la ruta del clip y,
+cuando ya pasaron los `post_seconds`, los frames de la ventana
+[evento - pre, evento + post] se escriben como MP4 en un hilo aparte, sin
+bloquear la captura ni la inferencia.
+"""
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from lpr.settings import settings
+
+_WRITER: Optional[concurrent.futures.ThreadPoolExecutor] = None
+_WRITER_LOCK = threading.Lock()
+
+
+def _clip_writer() -> concurrent.futures.ThreadPoolExecutor:
+    """Hilo (único por proceso) que decodifica los JPEG y escribe los clips."""
+    global _WRITER
+    with _WRITER_LOCK:
+        if _WRITER is None:
+            _WRITER = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='lpr-clips')
+        return _WRITER
+
+
+def write_clip(path: str, frames: List[Tuple[float, bytes]], fps: float) -> Optional[str]:
+    """Escribe los frames (ts, jpeg) como MP4; devuelve la ruta o None si no hay frames."""
+    if not frames:
+        return None
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    first = cv2.imdecode(np.frombuffer(frames[0][1], dtype=np.uint8), cv2.IMREAD_COLOR)
+    h, w = first.shape[:2]
+    # el contenedor se deduce de la extensión: escribir a un temporal .mp4 y renombrar
+    # (la retención ignora los `.partial.`: un clip a medio escribir no se cuenta ni se borra)
+    tmp = path[:-4] + '.partial.mp4'
+    writer = cv2.VideoWriter(tmp, cv2.VideoWriter_fourcc(*'mp4v'), float(fps), (w, h))
+    try:
+        try:
+            for i, (_, data) in enumerate(frames):
+                img = first if i == 0 else cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+                if img is None:
+                    continue
+                if img.shape[:2] != (h, w):
+                    img = cv2.resize(img, (w, h))
+                writer.write(img)
+        finally:
+            writer.release()
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    try:
+        from lpr.storage.retention import get_retention_manager
+        retention = get_retention_manager()
+        if retention is not None:
+            retention.record(path, os.path.getsize(path))
+    except Exception:
+        logging.exception('Error aplicando retención tras escribir clip %s', path)
+    return path
+
+
+class ClipRecorder:
+    def __init__(self, camera_id: str, out_dir: str, pre_seconds: float = 5.0, post_seconds: float = 5.0,
+                 fps: float = 5.0, max_width: int = 1280, quality: int = 70, max_bytes: int = 32 * 1024 * 1024):
+        self.camera_id = camera_id
+        self.out_dir = out_dir
+        self.pre_seconds = float(pre_seconds)
+        self.post_seconds = float(post_seconds)
+        self.fps = float(fps)
+        self.max_width = int(max_width)
+        self.quality = int(quality)
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._ring = deque()  # (ts, jpeg bytes)
+        self._bytes = 0
+        self._last_push = 0.0
+        self._pending: List[Tuple[float, str]] = []  # (ts del evento, ruta del clip)
+        self._counters = {'frames': 0, 'clips': 0, 'errors': 0}
+
+    def push(self, frame: np.ndarray, ts: Optional[float] = None):
+        """Agrega un frame de la captura (se muestrea a `fps`, el resto se ignora)."""
+        ts = ts if ts is not None else time.time()
+        if ts - self._last_push < 1.0 / self.fps:
+            return
+        self._last_push = ts
+        img = frame
+        if self.max_width and frame.shape[1] > self.max_width:
+            scale = self.max_width / frame.shape[1]
+            img = cv2.resize(frame, (self.max_width, int(frame.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+        ok, buf = cv2.imencode('.jpg', img, [int(cv2.IMWRITE_JPEG_QUALITY), self.quality])
+        if not ok:
+            return
+        data = buf.tobytes()
+        with self._lock:
+            self._ring.append((ts, data))
+            self._bytes += len(data)
+            self._counters['frames'] += 1
+            # conservar pre + post segundos (los clips pendientes necesitan el "pre")
+            horizon = ts - (self.pre_seconds + self.post_seconds)
+            while self._ring and (self._ring[0][0] < horizon or self._bytes > self.max_bytes):
+                self._bytes -= len(self._ring.popleft()[1])
+            due = [p for p in self._pending if ts >= p[0] + self.post_seconds]
+            if due:
+                self._pending = [p for p in self._pending if p not in due]
+        for event_ts, path in due:
+            self._submit(event_ts, path)
+
+    def trigger(self, label: str, ts: Optional[float] = None) -> str:
+        """Pide un clip alrededor de `ts`; devuelve la ruta donde quedará escrito."""
+        ts = ts if ts is not None else time.time()
+        path = os.path.join(self.out_dir, f'{self.camera_id}_clip_{label}_{int(ts * 1000)}.mp4')
+        with self._lock:
+            self._pending.append((ts, path))
+        return path
+
+    def _window(self, event_ts: float) -> List[Tuple[float, bytes]]:
+        with self._lock:
+            return [f for f in self._ring if event_ts - self.pre_seconds <= f[0] <= event_ts + self.post_seconds]
+
+    def _submit(self, event_ts: float, path: str):
+        frames = self._window(event_ts)
+        future = _clip_writer().submit(write_clip, path, frames, self.fps)
+        future.add_done_callback(self._done)
+
+    def _done(self, future: concurrent.futures.Future):
+        with self._lock:
+            if future.exception() is not None:
+                self._counters['errors'] += 1
+            elif future.result():
+                self._counters['clips'] += 1
+        if future.exception() is not None:
+            logging.error('No se pudo escribir clip de %s: %s', self.camera_id, future.exception())
+
+    def close(self):
+        """Escribe los clips pendientes con los frames que haya (la captura terminó)."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for event_ts, path in pending:
+            self._submit(event_ts, path)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, buffered_frames=len(self._ring), buffered_bytes=self._bytes,
+                        pending=len(self._pending))
+
+
+def build_clip_recorder(camera_id: str) -> Optional[ClipRecorder]:
+    """ClipRecorder de la cámara según settings (None si `LPR_CLIPS_ENABLED` está apagado)."""
+    if not settings.LPR_CLIPS_ENABLED:
+        return None
+    return ClipRecorder(camera_id, settings.LPR_CLIPS_DIR, settings.LPR_CLIP_PRE_SECONDS, settings.LPR_CLIP_POST_SECONDS,
+                        settings.LPR_CLIP_FPS, settings.LPR_CLIP_MAX_WIDTH, settings.LPR_CLIP_JPEG_QUALITY,
+                        int(settings.LPR_CLIP_BUFFER_MB * 1024 * 1024))
@@ -0,0 +1,330 @@
+"""Captura en dos streams: análisis sobre el sub-stream, píxeles del stream principal.
+
+Con `LPR_SUBSTREAM_URL` (plantilla, p. ej. '{url}_sub' para el path del
+sub-stream en MediaMTX) el worker lee y analiza el sub-stream de baja
+resolución (decodificación, detección y movimiento baratos) y, solo cuando
+encuentra una patente o una persona, pide al stream principal el frame
+alineado en tiempo (`frame_at(ts)`) para el OCR y las imágenes del evento.
+
+Del stream principal se guarda una ventana corta (`LPR_MAIN_WINDOW_SECONDS`):
+
+- con PyAV (`PacketWindow`) se guardan los paquetes comprimidos sin decodificar
+  (unos pocos MB por cámara) y solo se decodifica el GOP que contiene el
+  instante pedido, así el costo de decodificación sigue al sub-stream;
+- sin PyAV (`FrameWindow`) se decodifica con OpenCV y se guardan frames
+  muestreados: la ventana funciona igual, pero sin el ahorro de decodificación.
+
+Cada stream lleva su propio reloj (pts anclado al primer paquete, o la hora
+de `read()` con OpenCV), así que entre ambos queda un desfase fijo del orden
+de la latencia de cada uno. `DualStreamCapture` lo estima: en los primeros
+`calibration_hits` hallazgos el worker re-detecta la patente en los frames del
+principal cercanos (`frames_near`) y reporta con `observe_offset` cuál calza
+con la caja del sub-stream; `frame_at` aplica la mediana de esas muestras. Al
+reconectar cualquiera de los streams los relojes cambian y se vuelve a medir.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from lpr.capture.backends import PtsClock
+from lpr.capture.session import open_session
+from lpr.settings import settings
+
+
+class PacketWindow:
+    """Últimos `window_seconds` del stream principal como paquetes (GOPs completos)."""
+
+    def __init__(self, url: str, window_seconds: float = 3.0, name: Optional[str] = None, open_timeout: float = 10.0,
+                 base_backoff: float = 1.0, max_backoff: float = 60.0):
+        self.url = url
+        self.name = name or url
+        self.window_seconds = float(window_seconds)
+        self.open_timeout = float(open_timeout)
+        self.base_backoff = float(base_backoff)
+        self.max_backoff = float(max_backoff)
+        self._cond = threading.Condition()
+        self._gops = deque()  # [t_keyframe, [(t, packet), ...]]
+        self._pts_epoch: Dict[int, float] = {}
+        self._codec = None  # (nombre, extradata)
+        self._latest = 0.0
+        self.generation = 0  # cambia en cada conexión (reloj de pts nuevo)
+        self._closed = threading.Event()
+        self._counters = {'packets': 0, 'decodes': 0, 'decoded_frames': 0, 'misses': 0, 'reconnects': 0}
+        self._thread = threading.Thread(target=self._run, name=f'main-{self.name}', daemon=True)
+        self._thread.start()
+
+    # --- demux continuo (sin decodificar) -----------------------------------
+
+    def _run(self):
+        import av
+        attempts = 0
+        while not self._closed.is_set():
+            container = None
+            try:
+                options = {'rtsp_transport': 'tcp', 'stimeout': str(int(self.open_timeout * 1e6))} if self.url.startswith('rtsp') else {}
+                container = av.open(self.url, options=options, timeout=self.open_timeout)
+                stream = container.streams.video[0]
+                with self._cond:
+                    self._codec = (stream.codec_context.name, stream.codec_context.extradata)
+                    self._gops.clear()
+                    self._pts_epoch.clear()
+                    self.generation += 1
+                clock = PtsClock()
+                for packet in container.demux(stream):
+                    if self._closed.is_set():
+                        break
+                    if packet.size == 0 or packet.pts is None:
+                        continue
+                    attempts = 0
+                    self._add(packet, clock.epoch(float(packet.pts * stream.time_base)))
+            except Exception as e:
+                if not self._closed.is_set():
+                    logging.warning('[CAPTURE] %s (principal): %s', self.name, e)
+            finally:
+                if container is not None:
+                    try:
+                        container.close()
+                    except Exception:
+                        pass
+            if self._closed.is_set():
+                break
+            attempts += 1
+            self._counters['reconnects'] += 1
+            self._closed.wait(min(self.max_backoff, self.base_backoff * (2 ** (attempts - 1))))
+
+    def _add(self, packet, t: float):
+        with self._cond:
+            self._counters['packets'] += 1
+            if packet.is_keyframe:
+                self._gops.append([t, []])
+            elif not self._gops:
+                return  # sin keyframe todavía: no se puede decodificar
+            self._gops[-1][1].append((t, packet))
+            self._pts_epoch[packet.pts] = t
+            self._latest = max(self._latest, t)
+            # conservar desde el último keyframe anterior al inicio de la ventana
+            while len(self._gops) > 1 and self._gops[1][0] <= self._latest - self.window_seconds:
+                for _, old in self._gops.popleft()[1]:
+                    self._pts_epoch.pop(old.pts, None)
+            self._cond.notify_all()
+
+    # --- decodificación bajo demanda --------------------------------------------
+
+    def _wait_for(self, ts: float, timeout: float):
+        # el stream principal puede venir unos ms atrasado respecto del sub-stream
+        deadline = time.time() + timeout
+        while self._latest < ts and not self._closed.is_set():
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            self._cond.wait(remaining)
+
+    def _decode(self, gop, codec, pts_epoch):
+        """(t, frame PyAV) de un GOP, en orden de presentación."""
+        import av
+        ctx = av.CodecContext.create(codec[0], 'r')
+        if codec[1]:
+            ctx.extradata = codec[1]
+        self._counters['decodes'] += 1
+        try:
+            for _, packet in gop + [(None, None)]:
+                for frame in ctx.decode(packet):
+                    self._counters['decoded_frames'] += 1
+                    t = pts_epoch.get(frame.pts)
+                    if t is not None:
+                        yield t, frame
+        except Exception as e:
+            logging.warning('[CAPTURE] %s: error decodificando el stream principal: %s', self.name, e)
+
+    def frame_at(self, ts: float, max_skew: float = 0.5) -> Optional[np.ndarray]:
+        """Frame BGR del stream principal más cercano a `ts` (None si no hay uno a menos de `max_skew`)."""
+        with self._cond:
+            self._wait_for(ts, max_skew)
+            gop = None
+            # fuera de la ventana (más `max_skew`) no hay frame que sirva: no se decodifica nada
+            if self._gops and self._gops[0][0] - max_skew <= ts <= self._latest + max_skew:
+                for start, packets in self._gops:
+                    if start <= ts:
+                        gop = list(packets)
+                if gop is None:
+                    gop = list(self._gops[0][1])
+            pts_epoch = dict(self._pts_epoch)
+            codec = self._codec
+        if not gop or codec is None:
+            self._counters['misses'] += 1
+            return None
+        best = None  # (|dt|, frame)
+        for t, frame in self._decode(gop, codec, pts_epoch):
+            if best is None or abs(t - ts) < best[0]:
+                best = (abs(t - ts), frame)
+            if t >= ts:
+                break  # salida en orden de presentación: los siguientes quedan más lejos
+        if best is None or best[0] > max_skew:
+            self._counters['misses'] += 1
+            return None
+        return best[1].to_ndarray(format='bgr24')
+
+    def frames_near(self, ts: float, span: float) -> List[Tuple[float, np.ndarray]]:
+        """Todos los frames BGR del principal en [ts - span, ts + span] (para calibrar el desfase)."""
+        with self._cond:
+            self._wait_for(ts + span, span)
+            gops = [list(packets) for i, (start, packets) in enumerate(self._gops)
+                    if start <= ts + span and (i + 1 == len(self._gops) or self._gops[i + 1][0] >= ts - span)]
+            pts_epoch = dict(self._pts_epoch)
+            codec = self._codec
+        if codec is None:
+            return []
+        out = []
+        for gop in gops:
+            for t, frame in self._decode(gop, codec, pts_epoch):
+                if t > ts + span:
+                    break
+                if t >= ts - span:
+                    out.append((t, frame.to_ndarray(format='bgr24')))
+        return out
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return dict(self._counters, gops=len(self._gops),
+                        buffered_bytes=sum(p.size for _, packets in self._gops for _, p in packets))
+
+    def close(self):
+        self._closed.set()
+        with self._cond:
+            self._cond.notify_all()
+
+
+class FrameWindow:
+    """Últimos `window_seconds` del stream principal como frames decodificados (sin PyAV)."""
+
+    def __init__(self, url: str, window_seconds: float = 3.0, name: Optional[str] = None, fps: float = 10.0):
+        self.window_seconds = float(window_seconds)
+        self.name = name or url
+        self._session = open_session(url, 1.0 / fps, name=f'{self.name}-main')
+        self._lock = threading.Lock()
+        self._frames = deque()  # (ts, frame)
+        self._min_interval = 1.0 / fps
+        self._counters = {'frames': 0, 'misses': 0}
+        self._thread = threading.Thread(target=self._run, name=f'main-{self.name}', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while self._session.isOpened():
+            ok, frame = self._session.read()
+            if not ok:
+                continue
+            ts = self._session.last_timestamp or time.time()
+            with self._lock:
+                if self._frames and ts - self._frames[-1][0] < self._min_interval:
+                    continue
+                self._frames.append((ts, frame))
+                self._counters['frames'] += 1
+                while self._frames and self._frames[0][0] < ts - self.window_seconds:
+                    self._frames.popleft()
+
+    def frame_at(self, ts: float, max_skew: float = 0.5) -> Optional[np.ndarray]:
+        with self._lock:
+            best = min(self._frames, key=lambda f: abs(f[0] - ts), default=None)
+            if best is None or abs(best[0] - ts) > max_skew:
+                self._counters['misses'] += 1
+                return None
+            return best[1]
+
+    def frames_near(self, ts: float, span: float) -> List[Tuple[float, np.ndarray]]:
+        with self._lock:
+            return [(t, frame) for t, frame in self._frames if abs(t - ts) <= span]
+
+    @property
+    def generation(self) -> int:
+        return self._session.stats().get('reconnects', 0)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._counters, buffered_frames=len(self._frames))
+
+    def close(self):
+        self._session.release()
+
+
+class DualStreamCapture:
+    """Interfaz de captura del sub-stream + `frame_at(ts)` sobre el stream principal."""
+
+    def __init__(self, sub, main, max_skew: float = 0.5, calibration_hits: int = 5):
+        self._sub = sub
+        self._main = main
+        self.max_skew = float(max_skew)
+        self.calibration_hits = max(0, int(calibration_hits))
+        # desfase (s) a sumar al reloj del sub-stream para llegar al del principal
+        self.offset = 0.0
+        self._offsets = deque(maxlen=max(1, self.calibration_hits))
+        self._generations = None  # (reconexiones del sub, conexión del principal) de las muestras
+
+    def _check_generation(self):
+        generations = (self._sub.stats().get('reconnects', 0), self._main.generation)
+        if generations != self._generations:
+            if self._generations is not None:
+                logging.info('[CAPTURE] Stream reconectado: se vuelve a medir el desfase sub/principal')
+            self._generations = generations
+            self._offsets.clear()
+            self.offset = 0.0
+
+    @property
+    def calibrating(self) -> bool:
+        """True mientras falten muestras del desfase entre streams."""
+        self._check_generation()
+        return len(self._offsets) < self.calibration_hits
+
+    def observe_offset(self, offset: float):
+        """Muestra del desfase: t del frame del principal que calza con un frame del sub-stream, menos el del sub."""
+        self._offsets.append(float(offset))
+        self.offset = float(np.median(self._offsets))
+        if len(self._offsets) == self.calibration_hits:
+            logging.info('[CAPTURE] Desfase sub-stream -> principal: %+.3fs', self.offset)
+
+    @property
+    def last_timestamp(self) -> Optional[float]:
+        return self._sub.last_timestamp
+
+    def isOpened(self) -> bool:
+        return self._sub.isOpened()
+
+    def read(self):
+        return self._sub.read()
+
+    def frame_at(self, ts: float) -> Optional[np.ndarray]:
+        self._check_generation()
+        return self._main.frame_at(ts + self.offset, self.max_skew)
+
+    def frames_near(self, ts: float) -> List[Tuple[float, np.ndarray]]:
+        """Frames del principal (t en su propio reloj) a menos de `max_skew` de `ts` + desfase actual."""
+        return self._main.frames_near(ts + self.offset, self.max_skew)
+
+    def release(self):
+        self._sub.release()
+        self._main.close()
+
+    close = release
+
+    def stats(self) -> Dict:
+        return dict(self._sub.stats(), main=self._main.stats(), offset=round(self.offset, 3))
+
+
+def open_camera(url: str, sample_interval: float = 0.0, name: Optional[str] = None):
+    """Sesión de captura de la cámara: dual si `LPR_SUBSTREAM_URL` está configurado, si no la del único stream."""
+    template = settings.LPR_SUBSTREAM_URL
+    if not template:
+        return open_session(url, sample_interval, name=name)
+    name = name or url
+    sub = open_session(template.format(url=url), sample_interval, name=f'{name}-sub')
+    try:
+        import av  # noqa: F401
+        main = PacketWindow(url, settings.LPR_MAIN_WINDOW_SECONDS, name=name, open_timeout=settings.LPR_CAPTURE_STALL_TIMEOUT,
+                            base_backoff=settings.LPR_CAPTURE_BACKOFF, max_backoff=settings.LPR_CAPTURE_MAX_BACKOFF)
+    except ImportError:
+        logging.warning('PyAV no está instalado: el stream principal de %s se decodifica completo (pip install av)', name)
+        main = FrameWindow(url, settings.LPR_MAIN_WINDOW_SECONDS, name=name)
+    return DualStreamCapture(sub, main, settings.LPR_MAIN_MAX_SKEW, settings.LPR_MAIN_CALIBRATION_HITS)
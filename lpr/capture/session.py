@@ -0,0 +1,172 @@
+"""Sesión de captura con reconexión automática y métricas de salud del stream.
+
+`CaptureSession` envuelve el backend de captura (`open_capture`) con la misma
+interfaz (`read`, `isOpened`, `release`): si no llegan frames durante
+`stall_timeout` segundos (cámara reiniciada, red caída, fin de archivo) libera
+el stream y lo vuelve a abrir con backoff exponencial con jitter, en vez de
+seguir leyendo de un `VideoCapture` muerto.
+
+Expone el momento de captura del último frame (`last_timestamp`) y lleva la
+cuenta de reconexiones, FPS de entrada, errores de lectura y la edad
+del último frame (`stats()`) y la loguea cada `stats_interval` segundos.
+"""
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from lpr.capture.backends import open_capture
+from lpr.settings import settings
+
+
+class CaptureSession:
+    def __init__(self, url: str, sample_interval: float = 0.0, name: Optional[str] = None,
+                 stall_timeout: float = 10.0, base_backoff: float = 1.0, max_backoff: float = 60.0,
+                 stats_interval: float = 60.0, opener: Callable = open_capture):
+        self.url = url
+        self.name = name or url
+        self.sample_interval = sample_interval
+        self.stall_timeout = float(stall_timeout)
+        self.base_backoff = float(base_backoff)
+        self.max_backoff = float(max_backoff)
+        self.stats_interval = float(stats_interval)
+        self._opener = opener
+        self._cap = None
+        self._closed = threading.Event()
+        self._lock = threading.Lock()
+        self._attempts = 0           # aperturas fallidas/reconexiones seguidas (para el backoff)
+        self._next_open = 0.0
+        self._opened_at = 0.0
+        self._last_frame: Optional[float] = None
+        self._frame_dt: Optional[float] = None  # intervalo entre frames (EWMA)
+        self._counters = {'frames': 0, 'read_errors': 0, 'open_failures': 0, 'reconnects': 0}
+        self._last_report = time.time()
+        # momento de captura (epoch) del último frame: pts del stream si el
+        # backend lo da (PyAV), si no el momento en que read() lo entregó
+        self.last_timestamp: Optional[float] = None
+
+    # --- interfaz tipo VideoCapture ------------------------------------------
+
+    def isOpened(self) -> bool:
+        return not self._closed.is_set()
+
+    def read(self):
+        """Lee un frame; ante fallas espera el backoff y reabre el stream."""
+        if self._closed.is_set():
+            return False, None
+        if self._cap is None:
+            delay = self._next_open - time.time()
+            if delay > 0 and self._closed.wait(delay):
+                return False, None
+            self._open()
+            if self._cap is None:
+                return False, None
+        try:
+            ok, frame = self._cap.read()
+        except Exception as e:
+            logging.warning('[CAPTURE] %s: error de lectura: %s', self.name, e)
+            ok, frame = False, None
+        now = time.time()
+        self._maybe_report(now)
+        if ok and frame is not None:
+            self._on_frame(now)
+            self.last_timestamp = getattr(self._cap, 'last_timestamp', None) or now
+            return True, frame
+        with self._lock:
+            self._counters['read_errors'] += 1
+        since = now - (self._last_frame if self._last_frame and self._last_frame > self._opened_at else self._opened_at)
+        if since >= self.stall_timeout:
+            logging.warning('[CAPTURE] %s: sin frames hace %.1fs, reconectando', self.name, since)
+            self._reconnect()
+        else:
+            # no girar en vacío mientras el backend se recupera solo
+            self._closed.wait(0.05)
+        return False, None
+
+    def release(self):
+        """Cierra la sesión (también interrumpe una espera de backoff en curso)."""
+        self._closed.set()
+        self._release_cap()
+
+    close = release
+
+    # --- apertura y reconexión -------------------------------------------------
+
+    def _open(self):
+        try:
+            cap = self._opener(self.url, self.sample_interval, timeout=self.stall_timeout)
+        except Exception as e:
+            logging.warning('[CAPTURE] %s: error abriendo stream: %s', self.name, e)
+            cap = None
+        if cap is None or not cap.isOpened():
+            if cap is not None:
+                try:
+                    cap.release()
+                except Exception:
+                    pass
+            with self._lock:
+                self._counters['open_failures'] += 1
+            delay = self._schedule_retry()
+            logging.warning('[CAPTURE] %s: no se pudo abrir el stream (reintento en %.1fs)', self.name, delay)
+            return
+        self._cap = cap
+        self._opened_at = time.time()
+        if self._attempts:
+            logging.info('[CAPTURE] %s: stream abierto tras %d intentos', self.name, self._attempts)
+
+    def _schedule_retry(self) -> float:
+        self._attempts += 1
+        delay = min(self.max_backoff, self.base_backoff * (2 ** (self._attempts - 1)))
+        # jitter: las cámaras de un mismo NVR reiniciado no reconectan todas juntas
+        delay *= random.uniform(0.5, 1.0)
+        self._next_open = time.time() + delay
+        return delay
+
+    def _reconnect(self):
+        self._release_cap()
+        with self._lock:
+            self._counters['reconnects'] += 1
+        self._schedule_retry()
+
+    def _release_cap(self):
+        cap, self._cap = self._cap, None
+        if cap is not None:
+            try:
+                cap.release()
+            except Exception:
+                pass
+
+    # --- métricas --------------------------------------------------------------
+
+    def _on_frame(self, now: float):
+        with self._lock:
+            if self._last_frame is not None and self._last_frame > self._opened_at:
+                dt = now - self._last_frame
+                self._frame_dt = dt if self._frame_dt is None else 0.9 * self._frame_dt + 0.1 * dt
+            self._last_frame = now
+            self._counters['frames'] += 1
+        # el stream entregó frames: el próximo corte arranca el backoff desde cero
+        self._attempts = 0
+
+    def stats(self) -> Dict:
+        now = time.time()
+        with self._lock:
+            out = dict(self._counters)
+            out['connected'] = self._cap is not None
+            out['input_fps'] = round(1.0 / self._frame_dt, 2) if self._frame_dt else None
+            out['frame_age'] = round(now - self._last_frame, 2) if self._last_frame else None
+        return out
+
+    def _maybe_report(self, now: float):
+        if self.stats_interval <= 0 or now - self._last_report < self.stats_interval:
+            return
+        self._last_report = now
+        logging.info('[CAPTURE] %s: %s', self.name, self.stats())
+
+
+def open_session(url: str, sample_interval: float = 0.0, name: Optional[str] = None) -> CaptureSession:
+    """CaptureSession con los parámetros de `settings` (LPR_CAPTURE_*)."""
+    return CaptureSession(url, sample_interval, name=name, stall_timeout=settings.LPR_CAPTURE_STALL_TIMEOUT,
+                          base_backoff=settings.LPR_CAPTURE_BACKOFF, max_backoff=settings.LPR_CAPTURE_MAX_BACKOFF,
+                          stats_interval=settings.LPR_CAPTURE_STATS_INTERVAL)
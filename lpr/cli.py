@@ -1,33 +1,51 @@
 import logging
-import cv2
 from .settings import build_worker_config as load_from_env_or_args, settings
-from .detector.yolo_detector import load_detector, detect
-from .ocr.fast_ocr_adapter import FastPlateOCR
-from .processor.worker import LprWorker
-from .processor.guardian_worker import GuardianWorker
+from .utils.cpu import apply_thread_budget
+from .capture.dual import open_camera
+from .utils.stats import StatsReporter, camera_stats
 from . import __name__ as pkgname
 
+# cv2, ultralytics/torch y el OCR se importan dentro de main(): importar `lpr`
+# o `lpr.cli` (p. ej. desde el manager o un host pre-calentado) no debe pagar
+# varios segundos de imports pesados.
+
 
 def main(rtsp_url=None, camera_id=None, backend_url=None, poll_interval=None, mode=None):
     logging.basicConfig(
         level=getattr(logging, settings.LOG_LEVEL.upper(), logging.INFO),
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     )
+    apply_thread_budget(settings.LPR_NUM_THREADS, settings.LPR_CPU_SET)
     # Por defecto 'patente', si mode viene por parámetro, usarlo.
     cfg_mode = mode if mode else 'patente'
     cfg = load_from_env_or_args(rtsp_url, camera_id, backend_url, poll_interval, mode=cfg_mode)
     
     if cfg.mode == 'guardia':
+        from .processor.guardian_worker import GuardianWorker
         worker = GuardianWorker(cfg=cfg)
     else:
-        detector_inst = load_detector(cfg.detector_model)
-        fast_ocr = FastPlateOCR()
-        # detector_callable(frame, min_conf) -> List[Detection]
-        detector_callable = lambda frame, min_conf=cfg.min_det_conf: detect(detector_inst, frame, min_conf)
+        from .detector.yolo_detector import load_detector, detect
+        from .ocr.fast_ocr_adapter import FastPlateOCR
+        from .processor.procpool import PooledDetector, PooledOCR, get_inference_pool
+        from .processor.worker import LprWorker
+        pool = get_inference_pool()
+        if pool is not None:
+            # detección y OCR en procesos hijos (LPR_PROC_POOL_WORKERS)
+            pool.warmup()
+            detector_callable, fast_ocr = PooledDetector(pool), PooledOCR(pool)
+        else:
+            detector_inst = load_detector(cfg.detector_model)
+            fast_ocr = FastPlateOCR()
+            # detector_callable(frame, min_conf) -> Detections
+            detector_callable = lambda frame, min_conf=cfg.min_det_conf: detect(detector_inst, frame, min_conf)
         worker = LprWorker(cfg=cfg, detector=detector_callable, fast_ocr=fast_ocr)
         
-    cap = cv2.VideoCapture(cfg.rtsp_url, cv2.CAP_FFMPEG)
+    cap = open_camera(cfg.rtsp_url, cfg.poll_interval, name=cfg.camera_id)
+    # métricas de la cámara para `GET /stats` del manager (proceso-por-cámara)
+    reporter = StatsReporter(cfg.camera_id, lambda: {cfg.camera_id: camera_stats(worker, cap)}, settings.LPR_STATS_DIR,
+                             settings.LPR_STATS_INTERVAL, settings.LPR_LATENCY_REPORT_INTERVAL)
     try:
         worker.start_capture_loop(cap)
     finally:
+        reporter.close()
         cap.release()
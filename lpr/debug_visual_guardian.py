@@ -52,7 +52,7 @@ def debug_guardian(camera_id, video_path=None):
 
     # 2. Inicializar YOLO y Detector de Movimiento
     print("Cargando modelo YOLO (v11n)...")
-    model = YOLO('yolo11n.pt')
+    model = YOLO(settings.LPR_PERSON_MODEL, task='detect')
     back_sub = cv2.createBackgroundSubtractorMOG2(history=500, varThreshold=25, detectShadows=False)
     motion_pixel_threshold = 150 # Mismo que en worker
 
@@ -1,21 +1,115 @@
-from ultralytics import YOLO
-from huggingface_hub import hf_hub_download
-from typing import List, Tuple
+import os
+from typing import Iterator
 import numpy as np
 import logging
 
 
 class Detection:
-    def __init__(self, x1: int, y1: int, x2: int, y2: int, confidence: float):
+    def __init__(self, x1: int, y1: int, x2: int, y2: int, confidence: float, class_id: int = -1, track_id: int = -1):
         self.x1 = int(x1)
         self.y1 = int(y1)
         self.x2 = int(x2)
         self.y2 = int(y2)
         self.confidence = float(confidence)
+        self.class_id = int(class_id)
+        self.track_id = int(track_id)  # -1 si el tracker no asignó id
+
+
+class Detections:
+    """Detecciones de un frame en arrays contiguos (N×4 cajas, confianzas, clases, track ids).
+
+    Los tensores del modelo se pasan a NumPy una sola vez por frame y los
+    filtros son máscaras vectorizadas; iterar entrega `Detection` (la API
+    que ya consumen los workers) solo para las cajas que quedan.
+    """
+
+    def __init__(self, xyxy=None, confidence=None, class_id=None, track_id=None):
+        self.xyxy = np.asarray(xyxy if xyxy is not None else np.empty((0, 4)), dtype=np.float32).reshape(-1, 4)
+        n = len(self.xyxy)
+        self.confidence = np.asarray(confidence if confidence is not None else np.zeros(n), dtype=np.float32).reshape(-1)
+        self.class_id = np.asarray(class_id if class_id is not None else np.full(n, -1), dtype=np.int32).reshape(-1)
+        self.track_id = np.asarray(track_id if track_id is not None else np.full(n, -1), dtype=np.int64).reshape(-1)
+
+    @staticmethod
+    def _numpy(t):
+        return t.cpu().numpy() if hasattr(t, 'cpu') else np.asarray(t)
+
+    @classmethod
+    def from_results(cls, results) -> 'Detections':
+        """Convierte los `Results` de ultralytics (uno o varios) en un solo `Detections`."""
+        parts = []
+        for res in results or []:
+            boxes = getattr(res, 'boxes', None)
+            if boxes is None or len(boxes) == 0:
+                continue
+            n = len(boxes)
+            ids = boxes.id
+            parts.append((cls._numpy(boxes.xyxy).reshape(n, 4),
+                          cls._numpy(boxes.conf).reshape(n),
+                          cls._numpy(boxes.cls).reshape(n) if boxes.cls is not None else np.full(n, -1),
+                          cls._numpy(ids).reshape(n) if ids is not None else np.full(n, -1)))
+        if not parts:
+            return cls()
+        if len(parts) == 1:
+            return cls(*parts[0])
+        return cls(*(np.concatenate(cols) for cols in zip(*parts)))
+
+    def __len__(self) -> int:
+        return len(self.xyxy)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            x1, y1, x2, y2 = self.xyxy[index]
+            return Detection(x1, y1, x2, y2, self.confidence[index], self.class_id[index], self.track_id[index])
+        return Detections(self.xyxy[index], self.confidence[index], self.class_id[index], self.track_id[index])
+
+    def __iter__(self) -> Iterator[Detection]:
+        boxes = self.xyxy.astype(np.int64).tolist()
+        for (x1, y1, x2, y2), conf, cls_id, tid in zip(boxes, self.confidence.tolist(),
+                                                       self.class_id.tolist(), self.track_id.tolist()):
+            yield Detection(x1, y1, x2, y2, conf, cls_id, tid)
+
+    def clipped(self, width: int, height: int) -> 'Detections':
+        """Cajas recortadas al frame (x2/y2 <= ancho/alto - 1), sin las que quedan vacías."""
+        xyxy = self.xyxy.copy()
+        xyxy[:, 0] = np.maximum(xyxy[:, 0], 0)
+        xyxy[:, 1] = np.maximum(xyxy[:, 1], 0)
+        xyxy[:, 2] = np.minimum(xyxy[:, 2], width - 1)
+        xyxy[:, 3] = np.minimum(xyxy[:, 3], height - 1)
+        ints = xyxy.astype(np.int64)
+        keep = (ints[:, 2] > ints[:, 0]) & (ints[:, 3] > ints[:, 1])
+        return Detections(xyxy[keep], self.confidence[keep], self.class_id[keep], self.track_id[keep])
+
+    def scaled(self, sx: float, sy: float) -> 'Detections':
+        """Cajas escaladas (p. ej. del sub-stream a la resolución del stream principal)."""
+        xyxy = self.xyxy * np.array([sx, sy, sx, sy], dtype=np.float32)
+        return Detections(xyxy, self.confidence, self.class_id, self.track_id)
+
+    def tracked(self) -> 'Detections':
+        """Solo las detecciones con id de tracker."""
+        return self[self.track_id >= 0]
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """IoU de cada caja de `a` (N×4 xyxy) contra cada caja de `b` (M×4): matriz N×M."""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
 
 
 def load_detector(model_ref: str):
+    # imports pesados (torch vía ultralytics) solo al cargar el modelo
+    from ultralytics import YOLO
+    from huggingface_hub import hf_hub_download
     path = model_ref
+    if model_ref.endswith('.onnx') or model_ref.endswith('_openvino_model') or os.path.exists(model_ref):
+        # modelo exportado/cuantizado (`python -m lpr.quantize`): la tarea no viene en el archivo
+        return YOLO(model_ref, task='detect')
     if '/' in model_ref:
         # intentar descargar checkpoint conocido
         candidates = [
@@ -33,16 +127,6 @@ def load_detector(model_ref: str):
     return detector
 
 
-def detect(detector, frame: np.ndarray, min_conf: float = 0.3) -> List[Detection]:
-    results = detector(frame)
-    boxes: List[Detection] = []
-    for res in results:
-        if hasattr(res, 'boxes'):
-            for box in res.boxes:
-                conf = float(box.conf) if hasattr(box, 'conf') else 0.0
-                if conf < min_conf:
-                    continue
-                xyxy = box.xyxy.cpu().numpy().astype(int)[0] if hasattr(box.xyxy, 'cpu') else np.array(box.xyxy).astype(int)
-                x1, y1, x2, y2 = map(int, xyxy[:4])
-                boxes.append(Detection(x1, y1, x2, y2, conf))
-    return boxes
+def detect(detector, frame: np.ndarray, min_conf: float = 0.3) -> Detections:
+    dets = Detections.from_results(detector(frame))
+    return dets[dets.confidence >= min_conf]
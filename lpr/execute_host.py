@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Arranca un host multi-cámara (`lpr.processor.host.WorkerHost`).
+
+    python -m lpr.execute_host [--name NOMBRE] [--prewarm patente,guardia]
+
+El proceso queda esperando comandos JSON por stdin (ver `lpr/processor/host.py`);
+normalmente lo lanza el manager cuando `WORKER_HOST_PROCESSES > 0`.
+"""
+import argparse
+import logging
+import sys
+
+
+def main(argv=None):
+    argv = argv if argv is not None else sys.argv[1:]
+    parser = argparse.ArgumentParser(prog='lpr.execute_host')
+    parser.add_argument('--name', default='host')
+    parser.add_argument('--prewarm', default='', help="modelos a cargar antes de recibir cámaras, ej. 'patente,guardia'")
+    args = parser.parse_args(argv)
+
+    from lpr.settings import settings
+    from lpr.utils.cpu import apply_thread_budget
+
+    logging.basicConfig(
+        level=getattr(logging, settings.LOG_LEVEL.upper(), logging.INFO),
+        format=f'%(asctime)s - {args.name} - %(name)s - %(levelname)s - %(message)s'
+    )
+    # antes de importar los modelos: torch lee OMP_NUM_THREADS al importarse
+    apply_thread_budget(settings.LPR_NUM_THREADS, settings.LPR_CPU_SET)
+    from lpr.processor.host import WorkerHost
+    host = WorkerHost(name=args.name)
+    modes = [m.strip() for m in args.prewarm.split(',') if m.strip()]
+    if modes:
+        host.prewarm(modes)
+    logging.info('--- [HOST %s] esperando cámaras ---', args.name)
+    host.run_commands(sys.stdin)
+
+
+if __name__ == '__main__':
+    main()
@@ -61,6 +61,16 @@ def main(argv=None):
   parser.add_argument('--reload', action='store_true', default=bool(settings.WORKER_MANAGER_RELOAD))
   parser.add_argument('--workers', type=int, default=int(settings.WORKER_MANAGER_WORKERS))
   args = parser.parse_args(argv)
+  if settings.WORKER_DEDUP_GROUPS and args.workers > 1:
+    # el dedupe entre cámaras es estado en memoria de un solo proceso
+    parser.error('WORKER_DEDUP_GROUPS requiere --workers 1')
+
+  # `lpr.api.manager` arma el entorno de los workers (LPR_DEDUP_URL) al importarse:
+  # fijar antes el host/puerto reales; el entorno cubre los procesos de --reload
+  settings.WORKER_MANAGER_HOST = args.host
+  settings.WORKER_MANAGER_PORT = args.port
+  os.environ['WORKER_MANAGER_HOST'] = args.host
+  os.environ['WORKER_MANAGER_PORT'] = str(args.port)
 
   app = load_app()
 
@@ -0,0 +1,97 @@
+"""Caché de resultados OCR por hash perceptual del crop de la patente.
+
+Un auto detenido en la barrera entrega en cada poll un crop casi idéntico.
+`OcrCache` guarda, por caja, un dHash del crop (gris reducido a 33×8 px: 256
+bits de gradiente horizontal con una zona muerta relativa al contraste, así el
+ruido de sensor/compresión y los cambios de brillo no cambian bits) junto con
+el `OCRResult`.
+
+Para buscar se usan las entradas cuya caja se superpone con la nueva
+(IoU >= `min_iou`) y se hashea el frame nuevo en la caja *guardada*: se
+comparan los mismos píxeles de la escena, así el jitter de ±1 px del detector
+no cuenta como cambio, mientras que un auto que avanzó o una patente distinta
+sí (Hamming > `max_distance`).
+
+Es un LRU chico con TTL: las entradas vencen a los `ttl` segundos aunque el
+crop siga igual, así un auto estacionado igual se re-lee de vez en cuando.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+import cv2
+import numpy as np
+
+_HASH_W, _HASH_H = 32, 8
+# diferencias menores a esta fracción del rango del crop no cuentan como gradiente
+_DEADBAND = 0.05
+
+
+def dhash(crop: np.ndarray) -> int:
+    """dHash de 256 bits del crop (gradiente horizontal en 33×8, con zona muerta)."""
+    gray = crop if crop.ndim == 2 else cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (_HASH_W + 1, _HASH_H), interpolation=cv2.INTER_AREA).astype(np.int16)
+    margin = _DEADBAND * max(1, int(small.max()) - int(small.min()))
+    bits = ((small[:, 1:] - small[:, :-1]) > margin).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def _iou(a: Tuple, b: Tuple) -> float:
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class OcrCache:
+    def __init__(self, max_entries: int = 32, ttl: float = 10.0, max_distance: int = 3, min_iou: float = 0.8):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl)
+        self.max_distance = int(max_distance)
+        self.min_iou = float(min_iou)
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()  # id -> (bbox, hash, result, ts)
+        self._next_id = 0
+        self._counters = {'hits': 0, 'misses': 0}
+
+    def lookup(self, frame: np.ndarray, bbox: Tuple):
+        """`OCRResult` cacheado si la región de `bbox` no cambió, o None."""
+        now = time.time()
+        with self._lock:
+            candidates = []
+            for entry_id, (box, h, result, ts) in list(self._entries.items()):
+                if now - ts > self.ttl:
+                    del self._entries[entry_id]
+                elif _iou(box, bbox) >= self.min_iou:
+                    candidates.append((entry_id, box, h, result))
+        best = None
+        for entry_id, box, h, result in candidates:
+            region = frame[box[1]:box[3], box[0]:box[2]]
+            dist = bin(h ^ dhash(region)).count('1') if region.size else self.max_distance + 1
+            if dist <= self.max_distance and (best is None or dist < best[0]):
+                best = (dist, entry_id, result)
+        with self._lock:
+            if best is None:
+                self._counters['misses'] += 1
+                return None
+            if best[1] in self._entries:
+                self._entries.move_to_end(best[1])
+            self._counters['hits'] += 1
+            return best[2]
+
+    def store(self, frame: np.ndarray, bbox: Tuple, result):
+        box = tuple(int(v) for v in bbox)
+        h = dhash(frame[box[1]:box[3], box[0]:box[2]])
+        with self._lock:
+            self._entries[self._next_id] = (box, h, result, time.time())
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self._counters['hits'] + self._counters['misses']
+            return dict(self._counters, entries=len(self._entries),
+                        hit_rate=round(self._counters['hits'] / total, 3) if total else None)
@@ -1,8 +1,10 @@
 from dataclasses import dataclass
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 import numpy as np
 import logging
 
+from lpr.ocr.plate_format import constrained_decode, parse_formats
+
 
 @dataclass
 class OCRResult:
@@ -13,26 +15,75 @@ class OCRResult:
 
 class FastPlateOCR:
     def __init__(self, model_name: str = 'cct-s-v1-global-model', device: str = 'cpu'):
+        from lpr.settings import settings
+        # formatos de patente válidos para la decodificación restringida (vacío = top-1)
+        self._formats = parse_formats(settings.LPR_PLATE_FORMATS)
+        self._probs_supported = True
         try:
             import importlib
             mod = importlib.import_module('fast_plate_ocr')
             LicensePlateRecognizer = getattr(mod, 'LicensePlateRecognizer', None)
             if LicensePlateRecognizer is None:
                 raise ImportError('LicensePlateRecognizer no encontrada en fast_plate_ocr')
-            self._inst = LicensePlateRecognizer(model_name, device=device)
+            from lpr.utils.cpu import ort_session_options
+            sess_options = ort_session_options(settings.LPR_NUM_THREADS)
+            kwargs = {}
+            if settings.LPR_OCR_ONNX_PATH:
+                # modelo propio (p. ej. INT8 de `python -m lpr.quantize ocr`) con el config del original
+                kwargs = {'onnx_model_path': settings.LPR_OCR_ONNX_PATH, 'plate_config_path': settings.LPR_OCR_CONFIG_PATH}
+                model_name = None
+            if sess_options is not None:
+                try:
+                    self._inst = LicensePlateRecognizer(model_name, device=device, sess_options=sess_options, **kwargs)
+                except TypeError:
+                    # versiones antiguas de fast-plate-ocr no aceptan sess_options
+                    self._inst = LicensePlateRecognizer(model_name, device=device, **kwargs)
+            else:
+                self._inst = LicensePlateRecognizer(model_name, device=device, **kwargs)
         except Exception as e:
             logging.exception('No se pudo inicializar fast-plate-ocr: %s', e)
             self._inst = None
 
+    def char_probabilities(self, pil_arr) -> Optional[Tuple[np.ndarray, str, Optional[str]]]:
+        """Probabilidades por posición (slots × alfabeto), alfabeto y carácter de relleno del modelo.
+
+        Usa la sesión ONNX y el preproceso de fast-plate-ocr (>= 1.0); con otras
+        versiones devuelve None y `recognize` usa el top-1 de la librería.
+        """
+        if self._inst is None or not self._probs_supported:
+            return None
+        try:
+            from fast_plate_ocr.inference import plate_recognizer as fpo
+            cfg = self._inst.config
+            x = fpo.preprocess_image(fpo._load_image_from_source(pil_arr, cfg))
+            out = self._inst.model.run([self._inst.plate_output_name], {'input': x})[0]
+            probs = np.asarray(out).reshape(-1, cfg.max_plate_slots, len(cfg.alphabet))[0]
+            return probs, cfg.alphabet, cfg.pad_char
+        except Exception as e:
+            logging.info('fast-plate-ocr no expone probabilidades por posición (%s); decodificación sin formatos', e)
+            self._probs_supported = False
+            return None
+
     def recognize(self, pil_arr) -> OCRResult:
         if self._inst is None:
             return OCRResult('', 0.0, [])
+        if self._formats:
+            out = self.char_probabilities(pil_arr)
+            decoded = constrained_decode(out[0], out[1], out[2], self._formats) if out is not None else None
+            if decoded is not None:
+                return OCRResult(*decoded)
         try:
             res = self._inst.run(pil_arr, return_confidence=True)
             text = ''
             conf = 0.0
             char_conf = []
-            if isinstance(res, tuple) and len(res) == 2:
+            if isinstance(res, list) and res and hasattr(res[0], 'plate'):
+                # fast-plate-ocr >= 1.0: lista de PlatePrediction
+                text = res[0].plate or ''
+                probs = getattr(res[0], 'char_probs', None)
+                char_conf = [max(0.0, min(1.0, float(v))) for v in (probs if probs is not None else [])][:len(text)]
+                conf = float(np.mean(char_conf)) if char_conf else 0.0
+            elif isinstance(res, tuple) and len(res) == 2:
                 plates, conf_arr = res
                 text = plates[0] if plates else ''
                 try:
@@ -0,0 +1,74 @@
+"""Decodificación del OCR restringida a los formatos de patente chilenos.
+
+El modelo entrega, por cada posición (slot), una distribución sobre su
+alfabeto. En vez de quedarse con el top-1 de cada slot (que puede dar una
+cadena imposible, p. ej. "BB0D12"), se busca para cada formato permitido la
+cadena más probable que lo cumple y se elige la de mayor log-verosimilitud,
+contando también que los slots sobrantes sean relleno.
+
+Formatos (`LPR_PLATE_FORMATS`): 'B' = letra del alfabeto chileno actual
+(BCDFGHJKLPRSTVWXYZ, sin vocales ni letras confundibles), 'A' = cualquier
+letra A-Z (patentes antiguas), '9' = dígito. Por defecto:
+BBBB99 (autos desde 2007), AA9999 (autos antiguos), BBB99 y AA999 (motos).
+
+Como las posiciones son independientes, el óptimo de cada formato es el
+máximo por posición dentro de la clase permitida: la búsqueda es lineal en
+slots × formatos. La confianza por carácter es la probabilidad del carácter
+elegido, así una corrección dudosa sigue pesando en `LPR_MIN_CHAR_CONF`.
+"""
+import string
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+CHILE_LETTERS = 'BCDFGHJKLPRSTVWXYZ'
+CHAR_CLASSES = {
+    'B': CHILE_LETTERS,
+    'A': string.ascii_uppercase,
+    '9': string.digits,
+}
+DEFAULT_FORMATS = ('BBBB99', 'AA9999', 'BBB99', 'AA999')
+
+
+def parse_formats(spec: Optional[str]) -> Tuple[str, ...]:
+    """'BBBB99, AA9999' -> ('BBBB99', 'AA9999'); descarta formatos con clases desconocidas."""
+    formats = []
+    for fmt in (spec or '').split(','):
+        fmt = fmt.strip().upper()
+        if fmt and all(c in CHAR_CLASSES for c in fmt):
+            formats.append(fmt)
+    return tuple(formats)
+
+
+def constrained_decode(probs: np.ndarray, alphabet: str, pad_char: Optional[str] = '_',
+                       formats: Sequence[str] = DEFAULT_FORMATS) -> Optional[Tuple[str, float, List[float]]]:
+    """Mejor patente válida según `probs` (slots × alfabeto) -> (texto, confianza media, confianzas).
+
+    None si ningún formato entra en los slots o el alfabeto no tiene sus caracteres.
+    """
+    probs = np.asarray(probs, dtype=np.float64)
+    slots = probs.shape[0]
+    logp = np.log(np.clip(probs, 1e-12, 1.0))
+    index = {c: i for i, c in enumerate(alphabet)}
+    pad = index.get(pad_char) if pad_char else None
+    # log-prob de que cada slot sea relleno (0 si el modelo no tiene carácter de relleno)
+    pad_logp = logp[:, pad] if pad is not None else np.zeros(slots)
+    # por clase: índices del alfabeto del modelo permitidos
+    class_idx = {k: np.array([index[c] for c in chars if c in index], dtype=np.int64) for k, chars in CHAR_CLASSES.items()}
+    best = None
+    for fmt in formats:
+        if len(fmt) > slots or any(class_idx[k].size == 0 for k in fmt):
+            continue
+        picks, score = [], float(pad_logp[len(fmt):].sum())
+        for pos, k in enumerate(fmt):
+            allowed = class_idx[k]
+            j = int(allowed[np.argmax(logp[pos, allowed])])
+            picks.append(j)
+            score += float(logp[pos, j])
+        if best is None or score > best[0]:
+            best = (score, picks)
+    if best is None:
+        return None
+    picks = best[1]
+    char_conf = [float(probs[pos, j]) for pos, j in enumerate(picks)]
+    return ''.join(alphabet[j] for j in picks), float(np.mean(char_conf)), char_conf
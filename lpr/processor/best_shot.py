@@ -0,0 +1,108 @@
+"""Mejor imagen por patente / persona seguida antes de emitir el evento.
+
+En vez de mandar el crop del frame que justo cruzó el umbral de confirmación
+(o el que disparó la regla del guardia), cada lectura que pasa los filtros se
+ofrece al `BestShotBuffer` con un puntaje y este guarda solo la mejor de cada
+clave (patente normalizada en el LPR, track id en el guardia). Al confirmar se
+toma esa y se codifica una sola imagen por evento: los candidatos descartados
+nunca llegan a JPEG (`EncodedImage` codifica recién cuando alguien la pide).
+
+El puntaje (`shot_score`) combina confianza del detector, confianza del OCR
+(si hay), nitidez del crop (varianza del Laplaciano a altura fija) y tamaño
+(alto en px respecto de `ref_height`), cada término llevado a [0, 1].
+
+Un candidato más viejo que `max_age` pierde contra cualquiera nuevo, así la
+imagen del evento sigue siendo reciente (y dentro de la ventana del stream
+principal con captura doble); una clave sin lecturas durante `ttl` segundos
+se da por terminada y se descarta con `expire()`.
+"""
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import cv2
+import numpy as np
+
+# pesos de cada término del puntaje (suman 1)
+W_DET, W_OCR, W_SHARP, W_SIZE = 0.3, 0.4, 0.2, 0.1
+_SHARP_HEIGHT = 64
+# varianza del Laplaciano con la que la nitidez vale 0.5
+_SHARP_REF = 200.0
+
+
+def sharpness(crop: np.ndarray) -> float:
+    """Varianza del Laplaciano del crop en gris, llevado a 64 px de alto (comparable entre tamaños)."""
+    if crop is None or crop.size == 0:
+        return 0.0
+    gray = crop if crop.ndim == 2 else cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    h, w = gray.shape[:2]
+    gray = cv2.resize(gray, (max(1, round(w * _SHARP_HEIGHT / h)), _SHARP_HEIGHT), interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def shot_score(det_conf: float, crop: np.ndarray, ocr_conf: Optional[float] = None, ref_height: int = 40) -> float:
+    """Puntaje en [0, 1] de un candidato; sin OCR (guardia) su peso se reparte entre los demás."""
+    sharp = sharpness(crop)
+    terms = [(W_DET, float(det_conf)),
+             (W_SHARP, sharp / (sharp + _SHARP_REF)),
+             (W_SIZE, min(1.0, (crop.shape[0] if crop is not None else 0) / float(ref_height)))]
+    if ocr_conf is not None:
+        terms.append((W_OCR, float(ocr_conf)))
+    return sum(w * v for w, v in terms) / sum(w for w, _ in terms)
+
+
+class BestShotBuffer:
+    def __init__(self, ttl: float = 10.0, max_age: float = 3.0):
+        self.ttl = float(ttl)
+        self.max_age = float(max_age)
+        self._lock = threading.Lock()
+        self._entries: Dict[Any, list] = {}  # clave -> [puntaje, candidato, ts del candidato, última lectura]
+        self._counters = {'offered': 0, 'replaced': 0, 'taken': 0, 'discarded': 0, 'expired': 0}
+
+    def offer(self, key, score: float, shot, now: Optional[float] = None) -> bool:
+        """Ofrece un candidato para `key`; True si quedó como el mejor."""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._counters['offered'] += 1
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = [score, shot, now, now]
+                return True
+            entry[3] = now
+            if score > entry[0] or now - entry[2] > self.max_age:
+                entry[:3] = [score, shot, now]
+                self._counters['replaced'] += 1
+                return True
+            return False
+
+    def pop(self, key):
+        """Mejor candidato de `key` (o None) y lo saca del buffer: el próximo evento empieza de cero."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            self._counters['taken'] += 1
+            return entry[1]
+
+    def discard(self, key):
+        """Olvida los candidatos de `key` (dejaron de servir para el evento, p. ej. eran de fuera de la zona)."""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._counters['discarded'] += 1
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Descarta las claves sin lecturas hace más de `ttl` (patente que se fue, track terminado)."""
+        now = time.time() if now is None else now
+        with self._lock:
+            gone = [key for key, entry in self._entries.items() if now - entry[3] > self.ttl]
+            for key in gone:
+                del self._entries[key]
+            self._counters['expired'] += len(gone)
+            return len(gone)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._counters, entries=len(self._entries))
@@ -4,28 +4,58 @@ import os
 import json
 import cv2
 import numpy as np
+import threading
 import concurrent.futures
 from pathlib import Path
-from ultralytics import YOLO
 
-from lpr.utils.images import frame_to_pil, pil_to_base64
+from lpr.utils.images import EncodedImage
 from lpr.api.client import post_event, post_anomaly
+from lpr.storage.fs_storage import PRIORITY_HIGH, get_persistence_queue
+from lpr.storage.event_log import get_event_log
+from lpr.capture.clips import build_clip_recorder
+from lpr.storage.calibration import get_calibration_sampler
+from lpr.utils.latency import LatencyTracker
+from lpr.detector.yolo_detector import Detections
+from lpr.processor.best_shot import BestShotBuffer, shot_score
 from lpr.settings import settings
 import requests
 
 class GuardianWorker:
-    def __init__(self, cfg):
+    def __init__(self, cfg, executor=None, model=None):
         self.cfg = cfg
-        # Usamos YOLOv11 nano con alta resolución para detectar a lo lejos sin perder velocidad
-        self.model = YOLO('yolo11n.pt') 
+        # Usamos YOLOv11 nano con alta resolución para detectar a lo lejos sin perder velocidad.
+        # El modelo NO se comparte entre cámaras: `track(persist=True)` guarda el estado
+        # de ByteTrack dentro del predictor, así que cada cámara necesita su instancia
+        # (un host pre-calentado puede entregar una ya cargada vía `model`).
+        if model is None:
+            from lpr.detector.yolo_detector import load_detector
+            model = load_detector(settings.LPR_PERSON_MODEL)
+        self.model = model
         self.sightings = {} # track_id -> {'first_seen': float, 'last_seen': float}
         
-        max_workers = int(os.environ.get('LPR_MAX_WORKERS', '1'))
-        try:
-            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
-        except Exception:
-            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        # Executor compartido si viene del WorkerHost multi-cámara (no lo cerramos)
+        self._owns_executor = executor is None
+        if executor is not None:
+            self.executor = executor
+        else:
+            max_workers = int(os.environ.get('LPR_MAX_WORKERS', '1'))
+            try:
+                self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+            except Exception:
+                self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
         self.processing_future = None
+        self._stop_event = threading.Event()
+        # el frame anotado se escribe a disco en segundo plano
+        self.persistence = get_persistence_queue()
+        self.event_log = get_event_log()
+        self.clips = build_clip_recorder(self.cfg.camera_id)
+        self.calibration = get_calibration_sampler()
+        # mejor imagen de cada persona seguida desde su última alerta; None si está apagado
+        self.best_shots = (BestShotBuffer(settings.LPR_BEST_SHOT_TTL, settings.LPR_BEST_SHOT_MAX_AGE)
+                           if settings.LPR_BEST_SHOT_ENABLED else None)
+        self.latency = LatencyTracker(self.cfg.camera_id, settings.LPR_LATENCY_REPORT_INTERVAL)
+        # `frame_at(ts)` del stream principal cuando la captura es doble (LPR_SUBSTREAM_URL)
+        self.hires = None
         self.detections_dir = getattr(self.cfg, 'detections_dir', 'detecciones')
 
         try:
@@ -82,16 +112,23 @@ class GuardianWorker:
         except Exception as e:
             logging.error('Error obteniendo zonas del Guardián: %s', e)
 
+    def stop(self):
+        """Pide al loop de captura que termine (usado por WorkerHost)."""
+        self._stop_event.set()
+
     def start_capture_loop(self, cap):
         last_frame_ts = 0
+        self.hires = getattr(cap, 'frame_at', None)
         try:
-            while True:
+            while not self._stop_event.is_set():
                 ret, frame = cap.read()
                 if not ret:
-                    logging.warning('Frame no recibido - reconectando...')
-                    time.sleep(1)
+                    # CaptureSession ya esperó el backoff y reabre el stream si se cortó
                     continue
                 now = time.time()
+                captured_at = getattr(cap, 'last_timestamp', None) or now
+                if self.clips is not None:
+                    self.clips.push(frame, captured_at)
                 # Un FPS bajo es suficiente para tracking de personas/merodeo (ej: 2 a 5 FPS)
                 if now - last_frame_ts < self.cfg.poll_interval:
                     time.sleep(0.005)
@@ -106,25 +143,36 @@ class GuardianWorker:
                     self.last_heartbeat = now
                     self.frame_count = 0
 
-                self.submit_frame(frame)
+                self.submit_frame(frame, captured_at)
                 if self.processing_future is not None and self.processing_future.done():
                     try:
                         self.processing_future.result()
                     except Exception:
                         logging.exception('Error worker')
         finally:
-            try:
-                self.executor.shutdown(wait=False)
-            except Exception:
-                pass
+            if self.clips is not None:
+                self.clips.close()
+            if self._owns_executor:
+                try:
+                    self.executor.shutdown(wait=False)
+                except Exception:
+                    pass
 
-    def submit_frame(self, frame: np.ndarray):
+    def submit_frame(self, frame: np.ndarray, captured_at=None):
         self.latest_frame = frame.copy()
         if self.processing_future is None or self.processing_future.done():
-            self.processing_future = self.executor.submit(self._process_frame, self.latest_frame)
+            self.processing_future = self.executor.submit(self._process_frame, self.latest_frame, captured_at or time.time())
 
-    def _process_frame(self, frame: np.ndarray):
+    def _process_frame(self, frame: np.ndarray, captured_at=None):
         now_ts = time.time()
+        captured_at = captured_at or now_ts
+
+        # --- FRAMES VIEJOS ---
+        # Si el executor o el stream vienen atrasados, el frame ya no representa la escena
+        max_age = float(settings.LPR_MAX_FRAME_AGE)
+        if max_age > 0 and now_ts - captured_at > max_age:
+            self.latency.drop_stale()
+            return
         
         # --- CONTROL DE FPS (IA) ---
         # No procesamos IA más rápido de lo necesario (5 FPS es suficiente para seguridad)
@@ -174,26 +222,30 @@ class GuardianWorker:
 
         # classes=0 (sólo personas), persist=True (mantener IDs entre frames)
         # imgsz=960 es un buen balance entre velocidad y detección a lo lejos
+        self.latency.observe('capture_to_start', time.time() - captured_at)
+        if self.calibration is not None:
+            # frames con movimiento: los que de verdad ve el modelo de personas
+            self.calibration.maybe_sample(self.cfg.camera_id, frame)
+        t0 = time.time()
         results = self.model.track(frame, classes=[0], persist=True, tracker="bytetrack.yaml", verbose=True, imgsz=960)
+        self.latency.observe('detect', time.time() - t0)
         
-        if not results or not results[0].boxes:
+        # una sola conversión tensor -> NumPy por frame (cajas, confianzas, track ids)
+        dets = Detections.from_results(results)
+        if not len(dets):
             logging.info(f"[VIGILIA-DEBUG] [TRACK-DEBUG] No se detectaron personas en este frame.")
             # Limpiar track_hits para IDs que ya no se ven
             self.track_hits = {tid: hits for tid, hits in self.track_hits.items() if now_ts - self.sightings.get(tid, {}).get('last_seen', 0) < 5}
             return
             
-        boxes = results[0].boxes
-        logging.info(f"[VIGILIA-DEBUG] [TRACK-DEBUG] Detectadas {len(boxes)} personas.")
+        logging.info(f"[VIGILIA-DEBUG] [TRACK-DEBUG] Detectadas {len(dets)} personas.")
+
+        # Limpiar sightins antiguos para no llenar RAM
+        self._cleanup_sightings(now_ts)
         
-        # Iterar sobre las detecciones en este frame
-        for i, box in enumerate(boxes):
-            if box.id is None: continue
-            
-            track_id = int(box.id.item())
-            conf = float(box.conf.item())
-            
-            # Limpiar sightins antiguos para no llenar RAM
-            self._cleanup_sightings(now_ts)
+        # Iterar sobre las detecciones con id de tracker en este frame
+        for det in dets.tracked():
+            track_id = det.track_id
             
             # Actualizar sightings y contador de frames (estabilidad)
             if track_id not in self.sightings:
@@ -206,10 +258,11 @@ class GuardianWorker:
             
             # REGLA 1: Intrusión de Zona
             intrusion_detected = False
+            in_zone = False
             is_stable = self.track_hits[track_id] >= self.min_hits_threshold
             
             if self.guardian_zones:
-                x1, y1, x2, y2 = box.xyxy[0].tolist()
+                x1, y1, x2, y2 = det.x1, det.y1, det.x2, det.y2
                 h, w = frame.shape[:2]
                 
                 points_to_check = [
@@ -226,38 +279,62 @@ class GuardianWorker:
                         inside = dist >= 0
                         
                         if inside:
+                            in_zone = True
                             p_name = ["Cabeza", "Centro", "Pies"][p_idx]
                             logging.info(f"[VIGILIA-DEBUG-INTRUSION] Track:{track_id} Hits:{self.track_hits[track_id]} Pos:{p_name} Inside:True Stable:{is_stable}")
                             if is_stable:
                                 intrusion_detected = True
                                 break
                     if intrusion_detected: break
+
+            if self.best_shots is not None:
+                # la imagen de una intrusión tiene que mostrar a la persona dentro de la zona:
+                # al entrar se descartan los candidatos de afuera, así mientras está dentro
+                # solo compiten frames dentro de la zona
+                was_in_zone = self.sightings[track_id].get('in_zone', False)
+                self.sightings[track_id]['in_zone'] = in_zone
+                if in_zone and not was_in_zone:
+                    self.best_shots.discard(track_id)
+                score = shot_score(det.confidence, frame[max(0, det.y1):det.y2, max(0, det.x1):det.x2], ref_height=200)
+                self.best_shots.offer(track_id, score, (frame, det, captured_at), now_ts)
             
             # Decidir qué anomalía lanzar
             if intrusion_detected:
                 logging.info(f"[VIGILIA-IA] 🚩 INTRUSION CONFIRMADA - Track:{track_id} (Hits:{self.track_hits[track_id]})")
                 last_emitted = self.emitted_cache.get(f"intrusion_{track_id}", 0)
                 if now_ts - last_emitted > 10: 
-                    self._trigger_anomaly(frame, track_id, box, "intrusion", elapsed_seconds)
+                    self._trigger_anomaly(frame, track_id, det, "intrusion", elapsed_seconds, captured_at)
                     self.emitted_cache[f"intrusion_{track_id}"] = now_ts
                     
             elif elapsed_seconds > self.loitering_seconds_threshold and is_stable:
                 last_emitted = self.emitted_cache.get(f"loitering_{track_id}", 0)
                 if now_ts - last_emitted > 60: 
-                    self._trigger_anomaly(frame, track_id, box, "loitering", elapsed_seconds)
+                    self._trigger_anomaly(frame, track_id, det, "loitering", elapsed_seconds, captured_at)
                     self.emitted_cache[f"loitering_{track_id}"] = now_ts
                     
-    def _trigger_anomaly(self, frame, track_id, box, anomaly_type, elapsed_seconds):
-        x1, y1, x2, y2 = box.xyxy[0].tolist()
+    def _trigger_anomaly(self, frame, track_id, det, anomaly_type, elapsed_seconds, captured_at=None):
+        captured_at = captured_at or time.time()
+        # la imagen de la alerta es la mejor de la persona desde la alerta anterior, no la del disparo
+        shot_at = captured_at
+        shot = self.best_shots.pop(track_id) if self.best_shots is not None else None
+        if shot is not None:
+            frame, det, shot_at = shot
+        x1, y1, x2, y2 = det.x1, det.y1, det.x2, det.y2
+        # captura doble: el tracking corre en el sub-stream, la evidencia sale del stream principal
+        main = self.hires(shot_at) if self.hires is not None else None
+        if main is not None:
+            sx, sy = main.shape[1] / frame.shape[1], main.shape[0] / frame.shape[0]
+            x1, y1, x2, y2 = x1 * sx, y1 * sy, x2 * sx, y2 * sy
+            frame = main
         h, w = frame.shape[:2]
         x1c, y1c, x2c, y2c = max(0, int(x1)), max(0, int(y1)), min(w-1, int(x2)), min(h-1, int(y2))
         
         crop = frame[y1c:y2c, x1c:x2c]
-        pil_crop = frame_to_pil(crop)
         
-        conf = float(box.conf.item())
+        conf = det.confidence
         
         now_ts = time.time()
+        captured_at = captured_at or now_ts
         
         # Guardar disco
         det_fname = f'{self.cfg.camera_id}_anomaly_{anomaly_type}_{int(now_ts)}.jpg'
@@ -268,26 +345,29 @@ class GuardianWorker:
             cv2.rectangle(frame_det, (int(x1c), int(y1c)), (int(x2c), int(y2c)), (0, 0, 255), 3)
             label = f'P-{track_id} {anomaly_type} ({int(elapsed_seconds)}s)'
             cv2.putText(frame_det, label, (int(x1c), max(20, int(y1c) - 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
-            cv2.imwrite(det_path, frame_det)
         except Exception:
             logging.exception('Error anotando frame de anomalia')
+        # un solo JPEG del frame anotado: se escribe a disco y se embebe en el payload
+        frame_img = EncodedImage(frame_det, settings.LPR_JPEG_QUALITY)
+        self.persistence.save_image(det_path, frame_img, PRIORITY_HIGH)
             
         # Contexto Visual Enriquecido: Enviamos el frame completo con la anotación para que la IA vea el entorno
         snapshot_b64 = None
         if getattr(self.cfg, 'include_snapshot', True):
             try:
                 # Usamos frame_det que ya tiene el recuadro dibujado
-                snapshot_b64 = pil_to_base64(frame_to_pil(frame_det), quality=70)
+                snapshot_b64 = frame_img.base64()
             except Exception:
                 logging.exception('Error convirtiendo full-frame anotado a B64')
-                snapshot_b64 = pil_to_base64(pil_crop)
+                snapshot_b64 = EncodedImage(crop, settings.LPR_JPEG_QUALITY).base64()
 
         meta = {
             'bbox': [int(x1c), int(y1c), int(x2c), int(y2c)],
             'snapshot_jpeg_b64': snapshot_b64,
             'anomaly_type': anomaly_type,
             'duration_seconds': int(elapsed_seconds),
-            'track_id': track_id
+            'track_id': track_id,
+            'best_shot_ts': int(shot_at * 1000),
         }
         
         # El ID puede venir con sufijo '_guardia' si es administrado por el manager. 
@@ -300,12 +380,17 @@ class GuardianWorker:
             'confidence': conf,
             'meta': meta,
             'mountPath': self.cfg.rtsp_url,
-            'detectionTimestamp': int(now_ts * 1000),
+            'detectionTimestamp': int(captured_at * 1000),  # captura del frame que disparó la anomalía (como el clip)
             'detection_path': det_path,
         }
         
+        clip_path = self.clips.trigger(f'anomaly_{anomaly_type}', captured_at) if self.clips is not None else None
+        record = dict(payload, meta=dict(meta), kind='anomaly', ts=now_ts, clip_path=clip_path)
+        self.persistence.submit(lambda: self.event_log.append(record), PRIORITY_HIGH)
+
         logging.info('[VIGILIA-IA] 🚨 REPORTANDO ANOMALIA: %s en %s (Real: %s). Tracker ID: %s', anomaly_type, self.cfg.camera_id, clean_camera_id, track_id)
         post_anomaly(self.cfg.backend_url, payload, dry_run=self.cfg.dry_run)
+        self.latency.observe('capture_to_ack', time.time() - captured_at)
         
     def _cleanup_sightings(self, now_ts):
         # Eliminar items que no hemos visto en más de 30 segundos
@@ -315,3 +400,5 @@ class GuardianWorker:
                 to_delete.append(tid)
         for tid in to_delete:
             del self.sightings[tid]
+        if self.best_shots is not None:
+            self.best_shots.expire(now_ts)
@@ -0,0 +1,222 @@
+"""Host multi-cámara: un solo proceso Python que atiende N pipelines de cámara.
+
+Cada cámara corre su propio hilo de captura (`start_capture_loop`), pero el
+detector de patentes, el OCR y el executor de procesamiento se cargan una sola
+vez por proceso y se comparten. Así una cámara adicional cuesta unos pocos MB y
+milisegundos en vez de un intérprete completo con torch/ultralytics/opencv.
+
+El manager controla el host escribiendo comandos JSON (uno por línea) en su
+stdin:
+
+    {"op": "add", "cameraId": "...", "rtspUrl": "...", "mode": "patente"}
+    {"op": "remove", "cameraId": "..."}
+    {"op": "stats"}          (escribe ya las métricas de cada cámara en LPR_STATS_DIR, ver lpr.utils.stats)
+    {"op": "shutdown"}
+
+Si stdin se cierra (el manager murió) el host detiene todas sus cámaras y sale.
+
+Con `prewarm()` el host carga los modelos (y hace una inferencia en vacío)
+antes de recibir cámaras: el manager mantiene procesos así en reserva para que
+registrar una cámara no pague el arranque en frío del intérprete.
+"""
+import json
+import logging
+import sys
+import threading
+import time
+import concurrent.futures
+from typing import Dict, Optional
+
+from lpr.settings import build_worker_config, settings
+from lpr.utils.stats import StatsReporter, camera_stats
+
+
+class _LockedCallable:
+    """Serializa llamadas a un modelo compartido que no es thread-safe (YOLO)."""
+
+    def __init__(self, fn):
+        self._fn = fn
+        self._lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self._lock:
+            return self._fn(*args, **kwargs)
+
+
+class WorkerHost:
+    def __init__(self, executor_threads: Optional[int] = None, name: str = 'host'):
+        threads = int(executor_threads or settings.LPR_HOST_EXECUTOR_THREADS)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix='lpr-host')
+        self._lock = threading.Lock()
+        # cameraId -> {'worker', 'thread', 'cap', 'mode', 'cfg'}
+        self._pipelines: Dict[str, Dict] = {}
+        self._detector = None
+        self._ocr = None
+        # modelo de personas ya cargado para la próxima cámara 'guardia' (prewarm)
+        self._spare_person_model = None
+        # métricas de las cámaras del host, para `GET /stats` del manager
+        self.reporter = StatsReporter(name, self.stats, settings.LPR_STATS_DIR, settings.LPR_STATS_INTERVAL,
+                                      settings.LPR_LATENCY_REPORT_INTERVAL)
+
+    def _shared_lpr_models(self):
+        """Carga (una sola vez) el detector de patentes y el OCR compartidos."""
+        with self._lock:
+            if self._detector is None:
+                from lpr.processor.procpool import PooledDetector, PooledOCR, get_inference_pool
+                pool = get_inference_pool()
+                if pool is not None:
+                    # modelos en procesos hijos (LPR_PROC_POOL_WORKERS): el pool ya es thread-safe
+                    pool.warmup()
+                    self._detector, self._ocr = PooledDetector(pool), PooledOCR(pool)
+                    logging.info('[HOST] Modelos LPR cargados en %d procesos', pool.processes)
+                    return self._detector, self._ocr
+                from lpr.detector.yolo_detector import load_detector, detect
+                from lpr.ocr.fast_ocr_adapter import FastPlateOCR
+                detector_inst = load_detector(settings.LPR_DETECTOR_MODEL)
+                self._detector = _LockedCallable(lambda frame, min_conf: detect(detector_inst, frame, min_conf))
+                self._ocr = FastPlateOCR(settings.LPR_OCR_MODEL)
+                logging.info('[HOST] Modelos LPR compartidos cargados')
+            return self._detector, self._ocr
+
+    def prewarm(self, modes):
+        """Carga por adelantado los modelos de los modos indicados ('patente', 'guardia')."""
+        import numpy as np
+        t0 = time.time()
+        blank = np.zeros((640, 640, 3), dtype=np.uint8)
+        if 'patente' in modes:
+            detector, ocr = self._shared_lpr_models()
+            try:
+                # la primera inferencia inicializa el predictor de ultralytics y la sesión ORT
+                detector(blank, 1.0)
+                ocr.recognize(blank[:64, :128])
+            except Exception:
+                logging.exception('[HOST] Error en inferencia de calentamiento')
+        if 'guardia' in modes:
+            with self._lock:
+                if self._spare_person_model is None:
+                    from lpr.detector.yolo_detector import load_detector
+                    self._spare_person_model = load_detector(settings.LPR_PERSON_MODEL)
+        logging.info('[HOST] Pre-calentado (%s) en %.1fs', ','.join(modes), time.time() - t0)
+
+    def _build_worker(self, cfg):
+        if cfg.mode == 'guardia':
+            from lpr.processor.guardian_worker import GuardianWorker
+            with self._lock:
+                model, self._spare_person_model = self._spare_person_model, None
+            return GuardianWorker(cfg=cfg, executor=self.executor, model=model)
+        from lpr.processor.worker import LprWorker
+        detector, ocr = self._shared_lpr_models()
+        min_conf = cfg.min_det_conf
+        return LprWorker(cfg=cfg, detector=lambda frame, mc=min_conf: detector(frame, mc), fast_ocr=ocr, executor=self.executor)
+
+    def add_camera(self, camera_id: str, rtsp_url: str, backend_url: Optional[str] = None,
+                   mode: str = 'patente', poll_interval: Optional[float] = None) -> bool:
+        with self._lock:
+            if camera_id in self._pipelines:
+                logging.info('[HOST] Cámara %s ya estaba activa', camera_id)
+                return False
+        cfg = build_worker_config(rtsp_url, camera_id, backend_url, poll_interval, mode=mode)
+        worker = self._build_worker(cfg)
+        entry = {'worker': worker, 'cap': None, 'mode': mode, 'cfg': cfg}
+        thread = threading.Thread(target=self._run_pipeline, args=(camera_id, entry), name=f'capture-{camera_id}', daemon=True)
+        entry['thread'] = thread
+        with self._lock:
+            self._pipelines[camera_id] = entry
+        thread.start()
+        logging.info('[HOST] Cámara %s agregada (modo %s)', camera_id, mode)
+        return True
+
+    def _run_pipeline(self, camera_id: str, entry: Dict):
+        from lpr.capture.dual import open_camera
+        cap = open_camera(entry['cfg'].rtsp_url, entry['cfg'].poll_interval, name=camera_id)
+        entry['cap'] = cap
+        try:
+            entry['worker'].start_capture_loop(cap)
+        except Exception:
+            logging.exception('[HOST] Pipeline de %s terminó con error', camera_id)
+        finally:
+            try:
+                cap.release()
+            except Exception:
+                pass
+            with self._lock:
+                if self._pipelines.get(camera_id) is entry:
+                    del self._pipelines[camera_id]
+
+    @staticmethod
+    def _stop_entry(entry: Dict):
+        entry['worker'].stop()
+        # cerrar la sesión interrumpe una espera de reconexión en curso
+        if entry.get('cap') is not None:
+            entry['cap'].release()
+
+    def stats(self) -> Dict[str, Dict]:
+        """Métricas de captura, latencia, etapas y caché de OCR de cada cámara."""
+        with self._lock:
+            entries = list(self._pipelines.items())
+        return {camera_id: camera_stats(entry['worker'], entry.get('cap')) for camera_id, entry in entries}
+
+    def remove_camera(self, camera_id: str, timeout: float = 5.0) -> bool:
+        with self._lock:
+            entry = self._pipelines.pop(camera_id, None)
+        if entry is None:
+            return False
+        self._stop_entry(entry)
+        entry['thread'].join(timeout=timeout)
+        logging.info('[HOST] Cámara %s detenida', camera_id)
+        return True
+
+    def cameras(self):
+        with self._lock:
+            return list(self._pipelines.keys())
+
+    def shutdown(self, timeout: float = 5.0):
+        # señalizar a todas las cámaras primero y luego esperar: el apagado
+        # dura lo que la cámara más lenta, no la suma de todas
+        with self._lock:
+            entries = list(self._pipelines.items())
+            self._pipelines.clear()
+        for _, entry in entries:
+            self._stop_entry(entry)
+        deadline = time.time() + timeout
+        for camera_id, entry in entries:
+            entry['thread'].join(timeout=max(0.0, deadline - time.time()))
+            logging.info('[HOST] Cámara %s detenida', camera_id)
+        self.reporter.close()
+        self.executor.shutdown(wait=False)
+
+    def handle_command(self, cmd: Dict) -> bool:
+        """Ejecuta un comando del manager. Devuelve False si el host debe terminar."""
+        op = cmd.get('op')
+        if op == 'add':
+            self.add_camera(cmd['cameraId'], cmd['rtspUrl'], cmd.get('backendUrl'),
+                            cmd.get('mode') or 'patente', cmd.get('pollInterval'))
+        elif op == 'remove':
+            self.remove_camera(cmd['cameraId'])
+        elif op == 'stats':
+            self.reporter.write()
+        elif op == 'shutdown':
+            return False
+        else:
+            logging.warning('[HOST] Comando desconocido: %s', cmd)
+        return True
+
+    def run_commands(self, stream=None):
+        stream = stream if stream is not None else sys.stdin
+        try:
+            for line in stream:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    cmd = json.loads(line)
+                except ValueError:
+                    logging.warning('[HOST] Comando inválido: %s', line[:200])
+                    continue
+                try:
+                    if not self.handle_command(cmd):
+                        break
+                except Exception:
+                    logging.exception('[HOST] Error ejecutando comando %s', cmd.get('op'))
+        finally:
+            self.shutdown()
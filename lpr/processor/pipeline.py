@@ -0,0 +1,134 @@
+"""Pipeline por etapas sobre un executor: detección -> OCR -> reglas -> envío.
+
+Cada etapa tiene una cola acotada y un máximo de tareas simultáneas
+(`workers`); las tareas corren en el executor del worker (o en el compartido
+del host multi-cámara), así que mientras el OCR o el envío al backend de un
+frame avanzan, la detección del frame siguiente ya está corriendo y el
+rendimiento queda limitado por la etapa más lenta, no por la suma de todas.
+
+Contrapresión sin bloquear hilos del executor: una etapa solo toma un ítem si
+la cola de la siguiente tiene lugar. Cuando todo está lleno, la que descarta es
+la cola de entrada (se descarta el frame más viejo: el más nuevo sirve más);
+lo que ya pasó la detección no se pierde.
+
+Cada etapa es `fn(item, emit)`: llama a `emit(x)` por cada resultado que pasa
+a la etapa siguiente (cero, uno o varios, p. ej. una patente por caja).
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+
+class Stage:
+    def __init__(self, name: str, fn: Callable, workers: int = 1, queue_size: int = 4):
+        self.name = name
+        self.fn = fn
+        # etapas con estado (reglas, envío) deben usar workers=1
+        self.workers = max(1, int(workers))
+        self.queue_size = max(1, int(queue_size))
+        self.queue = deque()
+        self.active = 0
+        self.counters = {'processed': 0, 'dropped': 0, 'errors': 0, 'busy_s': 0.0}
+
+
+class StagedPipeline:
+    def __init__(self, name: str, executor, stages: List[Stage]):
+        self.name = name
+        self.executor = executor
+        self.stages = stages
+        self._lock = threading.Lock()
+        self._closed = False
+        self._paused_until = 0.0
+        self._idle = threading.Condition(self._lock)
+
+    def submit(self, item) -> bool:
+        """Encola un ítem en la primera etapa; devuelve False si se descartó (pausa o cierre)."""
+        head = self.stages[0]
+        with self._lock:
+            if self._closed:
+                return False
+            if time.time() < self._paused_until:
+                head.counters['dropped'] += 1
+                return False
+            head.queue.append(item)
+            while len(head.queue) > head.queue_size:
+                head.queue.popleft()
+                head.counters['dropped'] += 1
+            self._schedule()
+        return True
+
+    def pause(self, seconds: float):
+        """Descarta las entradas nuevas durante `seconds` (los ítems en curso siguen)."""
+        if seconds > 0:
+            with self._lock:
+                self._paused_until = max(self._paused_until, time.time() + seconds)
+
+    def _has_room(self, index: int) -> bool:
+        if index + 1 >= len(self.stages):
+            return True
+        nxt = self.stages[index + 1]
+        # lo que está procesando esta etapa también va a terminar en la siguiente
+        return len(nxt.queue) + self.stages[index].active < nxt.queue_size
+
+    def _schedule(self):
+        # con el lock tomado; de atrás hacia adelante para liberar lugar primero
+        for index in range(len(self.stages) - 1, -1, -1):
+            stage = self.stages[index]
+            while stage.queue and stage.active < stage.workers and self._has_room(index):
+                item = stage.queue.popleft()
+                stage.active += 1
+                try:
+                    self.executor.submit(self._run, index, item)
+                except RuntimeError:
+                    # executor apagado (el host se está cerrando)
+                    stage.active -= 1
+                    stage.counters['dropped'] += 1 + len(stage.queue)
+                    stage.queue.clear()
+                    return
+
+    def _run(self, index: int, item):
+        stage = self.stages[index]
+        out = []
+        t0 = time.time()
+        try:
+            stage.fn(item, out.append)
+        except Exception:
+            logging.exception('[PIPELINE] %s: error en la etapa %s', self.name, stage.name)
+            out = []
+            with self._lock:
+                stage.counters['errors'] += 1
+        with self._lock:
+            stage.active -= 1
+            stage.counters['processed'] += 1
+            stage.counters['busy_s'] += time.time() - t0
+            if index + 1 < len(self.stages) and not self._closed:
+                self.stages[index + 1].queue.extend(out)
+            if not self._closed:
+                self._schedule()
+            self._idle.notify_all()
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que no queden ítems en cola ni en proceso (True si terminó a tiempo)."""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._lock:
+            while any(s.queue or s.active for s in self.stages):
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def close(self):
+        """Descarta lo encolado; los ítems en proceso terminan pero no avanzan."""
+        with self._lock:
+            self._closed = True
+            for stage in self.stages:
+                stage.counters['dropped'] += len(stage.queue)
+                stage.queue.clear()
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {s.name: dict(s.counters, busy_s=round(s.counters['busy_s'], 2), queued=len(s.queue), active=s.active)
+                    for s in self.stages}
@@ -0,0 +1,246 @@
+"""Pool de procesos para detección y OCR con frames en memoria compartida.
+
+Con `LPR_PROC_POOL_WORKERS > 0` el detector de patentes y el OCR corren en
+procesos hijos (cada uno con su copia de los modelos), así que el
+preprocesamiento/NMS en NumPy y la conversión PIL de varias cámaras ya no
+compiten por el GIL del proceso worker.
+
+Los frames no se serializan: el proceso padre los copia a un slot de
+`multiprocessing.shared_memory` y al hijo solo le llega un descriptor
+(nombre del segmento, shape, dtype); el hijo arma un `ndarray` sobre el mismo
+buffer. De vuelta viajan solo las cajas/confianzas o el texto del OCR.
+
+`PooledDetector` y `PooledOCR` tienen la misma interfaz que el detector
+(`fn(frame, min_conf) -> Detections`) y `FastPlateOCR.recognize`, así que el
+pipeline del worker no cambia. El guardia no usa el pool: el estado de
+ByteTrack vive dentro de su modelo y no se puede repartir entre procesos.
+"""
+import atexit
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+import numpy as np
+
+from lpr.settings import settings
+
+# --- lado hijo ----------------------------------------------------------------
+
+_CHILD = {}  # modelos y segmentos adjuntos del proceso hijo
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Adjunta un segmento sin que el hijo lo registre como propio (solo el padre lo borra)."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python >= 3.13
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except Exception:
+            pass
+        return shm
+
+
+def _child_init(detector_model: str, ocr_model: str, num_threads: int):
+    from lpr.utils.cpu import apply_thread_budget
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'NUMEXPR_NUM_THREADS'):
+        os.environ[var] = str(num_threads)
+    settings.LPR_NUM_THREADS = num_threads
+    apply_thread_budget(num_threads)
+    from lpr.detector.yolo_detector import load_detector
+    from lpr.ocr.fast_ocr_adapter import FastPlateOCR
+    _CHILD['detector'] = load_detector(detector_model)
+    _CHILD['ocr'] = FastPlateOCR(ocr_model)
+    logging.info('[PROC-POOL] Proceso %d listo (%d hilos)', os.getpid(), num_threads)
+
+
+def _child_view(desc) -> np.ndarray:
+    name, shape, dtype = desc
+    segments = _CHILD.setdefault('segments', {})
+    shm = segments.get(name)
+    if shm is None:
+        shm = segments[name] = _attach(name)
+    return np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+def _child_ping() -> int:
+    return os.getpid()
+
+
+def _child_detect(desc, min_conf: float):
+    from lpr.detector.yolo_detector import detect
+    frame = desc if isinstance(desc, np.ndarray) else _child_view(desc)
+    dets = detect(_CHILD['detector'], frame, min_conf)
+    return dets.xyxy, dets.confidence, dets.class_id
+
+
+def _child_ocr(desc):
+    crop = desc if isinstance(desc, np.ndarray) else _child_view(desc)
+    res = _CHILD['ocr'].recognize(crop)
+    return res.text, res.confidence, list(res.char_confidences)
+
+
+# --- lado padre -----------------------------------------------------------------
+
+class SharedFrameSlots:
+    """Slots fijos de memoria compartida; cada llamada toma uno mientras el hijo lo usa."""
+
+    def __init__(self, count: int, slot_bytes: int):
+        self.slot_bytes = int(slot_bytes)
+        self._segments = [shared_memory.SharedMemory(create=True, size=self.slot_bytes) for _ in range(max(1, count))]
+        self._free: queue.Queue = queue.Queue()
+        for shm in self._segments:
+            self._free.put(shm)
+
+    def put(self, arr: np.ndarray, timeout: Optional[float] = None) -> Tuple[shared_memory.SharedMemory, Tuple]:
+        """Copia `arr` a un slot libre (espera si están todos ocupados); devuelve (slot, descriptor)."""
+        shm = self._free.get(timeout=timeout)
+        arr = np.ascontiguousarray(arr)
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+        return shm, (shm.name, arr.shape, arr.dtype.str)
+
+    def release(self, shm: shared_memory.SharedMemory):
+        self._free.put(shm)
+
+    def close(self):
+        for shm in self._segments:
+            try:
+                shm.close()
+                shm.unlink()
+            except Exception:
+                pass
+        self._segments = []
+
+
+class InferencePool:
+    def __init__(self, processes: int, slot_bytes: int, detector_model: str, ocr_model: str,
+                 num_threads: Optional[int] = None):
+        self.processes = max(1, int(processes))
+        from lpr.utils.cpu import available_cpus
+        # el presupuesto de hilos del worker se reparte entre los hijos
+        child_threads = max(1, int(num_threads or len(available_cpus())) // self.processes)
+        self._initargs = (detector_model, ocr_model, child_threads)
+        self._executor = self._new_executor()
+        # dos slots por proceso: mientras uno infiere, el padre ya copia el siguiente frame
+        self._frames = SharedFrameSlots(2 * self.processes, slot_bytes)
+        # los crops de patente son chicos: slots aparte para no ocupar uno de frame
+        self._crops = SharedFrameSlots(4 * self.processes, 1024 * 1024)
+        self._warned = False
+        self._lock = threading.Lock()
+        self._counters = {'detect': 0, 'ocr': 0, 'pickled': 0, 'rebuilds': 0}
+
+    def _new_executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        # spawn: hacer fork de un proceso con hilos (captura, torch) no es seguro
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.processes, mp_context=multiprocessing.get_context('spawn'),
+            initializer=_child_init, initargs=self._initargs)
+
+    def _run(self, fn, *args):
+        executor = self._executor
+        try:
+            return executor.submit(fn, *args).result()
+        except BrokenProcessPool:
+            # un hijo murió (OOM, segfault del runtime): el executor queda inutilizable
+            # para siempre; se reemplaza y esta llamada falla (frame/crop perdido)
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = self._new_executor()
+                    self._counters['rebuilds'] += 1
+                    logging.warning('[PROC-POOL] Un proceso hijo terminó abruptamente; se re-crea el pool')
+            executor.shutdown(wait=False)
+            raise
+
+    def _call(self, slots: SharedFrameSlots, fn, arr: np.ndarray, *args):
+        if arr.nbytes > slots.slot_bytes:
+            # frame más grande que el slot: se serializa (más lento pero correcto)
+            with self._lock:
+                self._counters['pickled'] += 1
+                warn, self._warned = not self._warned, True
+            if warn:
+                logging.warning('[PROC-POOL] Frame de %.1f MB no entra en el slot (LPR_PROC_POOL_SLOT_MB); se serializa',
+                                arr.nbytes / 1e6)
+            return self._run(fn, arr, *args)
+        shm, desc = slots.put(arr)
+        try:
+            return self._run(fn, desc, *args)
+        finally:
+            slots.release(shm)
+
+    def detect(self, frame: np.ndarray, min_conf: float):
+        from lpr.detector.yolo_detector import Detections
+        xyxy, conf, cls = self._call(self._frames, _child_detect, frame, min_conf)
+        with self._lock:
+            self._counters['detect'] += 1
+        return Detections(xyxy, conf, cls)
+
+    def recognize(self, crop: np.ndarray):
+        from lpr.ocr.fast_ocr_adapter import OCRResult
+        text, conf, chars = self._call(self._crops, _child_ocr, np.asarray(crop))
+        with self._lock:
+            self._counters['ocr'] += 1
+        return OCRResult(text, conf, chars)
+
+    def warmup(self):
+        """Espera a que todos los procesos hijos carguen sus modelos."""
+        # tareas simultáneas: el executor arranca un hijo por cada una que no tiene quién la tome
+        pids = {f.result() for f in [self._executor.submit(_child_ping) for _ in range(self.processes)]}
+        logging.info('[PROC-POOL] %d procesos listos', len(pids))
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, processes=self.processes)
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._frames.close()
+        self._crops.close()
+
+
+class PooledOCR:
+    """Adaptador con la interfaz de `FastPlateOCR` que delega en el pool."""
+
+    def __init__(self, pool: InferencePool):
+        self._pool = pool
+
+    def recognize(self, pil_arr):
+        try:
+            return self._pool.recognize(pil_arr)
+        except Exception as e:
+            logging.exception('Error en OCR (pool de procesos): %s', e)
+            from lpr.ocr.fast_ocr_adapter import OCRResult
+            return OCRResult('', 0.0, [])
+
+
+class PooledDetector:
+    """Callable `(frame, min_conf) -> Detections` que delega en el pool."""
+
+    def __init__(self, pool: InferencePool):
+        self._pool = pool
+
+    def __call__(self, frame: np.ndarray, min_conf: float = 0.3):
+        return self._pool.detect(frame, min_conf)
+
+
+_POOL: Optional[InferencePool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_inference_pool() -> Optional[InferencePool]:
+    """Pool del proceso (None si `LPR_PROC_POOL_WORKERS` es 0)."""
+    global _POOL
+    if settings.LPR_PROC_POOL_WORKERS <= 0:
+        return None
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = InferencePool(settings.LPR_PROC_POOL_WORKERS, int(settings.LPR_PROC_POOL_SLOT_MB * 1024 * 1024),
+                                  settings.LPR_DETECTOR_MODEL, settings.LPR_OCR_MODEL, settings.LPR_NUM_THREADS)
+            atexit.register(_POOL.close)
+        return _POOL
@@ -1,19 +1,29 @@
 import logging
 import time
 import os
-import re
 import json
 import cv2
 from typing import Optional
+import threading
 import concurrent.futures
 import numpy as np
-from pathlib import Path
 
-from lpr.detector.yolo_detector import Detection
-from lpr.utils.images import frame_to_pil, pil_to_base64
+from lpr.detector.yolo_detector import Detections, iou_matrix
+from lpr.utils.images import EncodedImage, frame_to_pil
 from lpr.ocr.fast_ocr_adapter import FastPlateOCR
-from lpr.storage.fs_storage import save_image_pil, save_json
+from lpr.ocr.cache import OcrCache
+from lpr.storage.fs_storage import PRIORITY_HIGH, PRIORITY_LOW, get_persistence_queue
+from lpr.storage.uploader import get_uploader
+from lpr.storage.event_log import get_event_log
+from lpr.storage.sightings import get_sighting_index
+from lpr.storage.access_cache import get_access_cache
+from lpr.storage.calibration import get_calibration_sampler
+from lpr.capture.clips import build_clip_recorder
+from lpr.utils.latency import LatencyTracker
 from lpr.api.client import post_event
+from lpr.api.dedup import get_dedup_client
+from lpr.processor.best_shot import BestShotBuffer, shot_score
+from lpr.processor.pipeline import Stage, StagedPipeline
 from lpr.processor.rules import (
     normalize_plate,
     plausible_plate,
@@ -25,20 +35,66 @@ from lpr.settings import settings
 
 
 class LprWorker:
-    def __init__(self, cfg, detector, fast_ocr: Optional[FastPlateOCR]):
+    def __init__(self, cfg, detector, fast_ocr: Optional[FastPlateOCR], executor: Optional[concurrent.futures.Executor] = None):
         self.cfg = cfg
         self.detector = detector
         self.fast_ocr = fast_ocr
         self.plate_sightings = {}
         self.emitted_cache = {}
-        # executor para procesar frames asincrónicamente y future de control
-        max_workers = int(os.environ.get('LPR_MAX_WORKERS', '1'))
-        try:
-            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
-        except Exception:
-            # fallback a un executor simple si ocurre algo
-            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
-        self.processing_future = None
+        # executor donde corren las etapas del pipeline.
+        # Si viene de afuera (WorkerHost multi-cámara) es compartido y no lo cerramos.
+        detect_workers = settings.LPR_PIPELINE_DETECT_WORKERS
+        ocr_workers = settings.LPR_PIPELINE_OCR_WORKERS
+        self._owns_executor = executor is None
+        if executor is not None:
+            self.executor = executor
+        else:
+            # hilos suficientes para que todas las etapas corran a la vez
+            max_workers = max(int(os.environ.get('LPR_MAX_WORKERS', '1')), detect_workers + ocr_workers + 2)
+            try:
+                self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+            except Exception:
+                # fallback a un executor simple si ocurre algo
+                self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        # captura -> detección -> OCR -> reglas -> envío, con colas acotadas entre etapas
+        queue_size = settings.LPR_PIPELINE_QUEUE_SIZE
+        self.pipeline = StagedPipeline(self.cfg.camera_id, self.executor, [
+            Stage('detect', self._detect_stage, detect_workers, queue_size),
+            Stage('ocr', self._ocr_stage, ocr_workers, queue_size),
+            Stage('rules', self._rules_stage, 1, queue_size),
+            Stage('sink', self._sink_stage, 1, queue_size),
+        ])
+        self._stop_event = threading.Event()
+        # imágenes y metadata se escriben en segundo plano (no en el hilo de inferencia)
+        self.persistence = get_persistence_queue()
+        # metadata de cada detección: una línea en el log de eventos (no un .json por imagen)
+        self.event_log = get_event_log()
+        # índice local (SQLite) de todas las lecturas OCR y emisiones; None si está apagado
+        self.sighting_index = get_sighting_index()
+        # patentes autorizadas/visitas del condominio para decidir al confirmar; None si está
+        # apagado o en dry run (sin backend del que sincronizar)
+        self.access = get_access_cache() if not self.cfg.dry_run else None
+        # dedupe entre cámaras del mismo portón (en el manager); None si no está configurado
+        self.dedup = get_dedup_client()
+        if self.access is not None:
+            self.access.register(self.cfg.camera_id, self.cfg.backend_url)
+        # buffer de los últimos segundos para clips pre/post evento; None si está apagado
+        self.clips = build_clip_recorder(self.cfg.camera_id)
+        # caché de OCR por hash perceptual del crop; None si está apagado
+        self.ocr_cache = (OcrCache(settings.LPR_OCR_CACHE_SIZE, settings.LPR_OCR_CACHE_TTL,
+                                   settings.LPR_OCR_CACHE_MAX_DISTANCE, settings.LPR_OCR_CACHE_MIN_IOU)
+                          if settings.LPR_OCR_CACHE_SIZE > 0 else None)
+        # mejor lectura de cada patente hasta confirmarla; None si está apagado
+        self.best_shots = (BestShotBuffer(settings.LPR_BEST_SHOT_TTL, settings.LPR_BEST_SHOT_MAX_AGE)
+                           if settings.LPR_BEST_SHOT_ENABLED else None)
+        # imágenes de calibración para la cuantización INT8; None si está apagado
+        self.calibration = get_calibration_sampler()
+        # latencias captura -> detección/OCR -> ack del backend, por cámara
+        self.latency = LatencyTracker(self.cfg.camera_id, settings.LPR_LATENCY_REPORT_INTERVAL)
+        # `frame_at(ts)` del stream principal cuando la captura es doble (LPR_SUBSTREAM_URL)
+        self.hires = None
+        # la captura doble, si expone la calibración del desfase entre streams
+        self.dual = None
         # directorio donde se guardan las detecciones completas (frames anotados)
         # usar la ruta ya normalizada por cfg (config.py se encarga de resolver relativas)
         self.detections_dir = getattr(self.cfg, 'detections_dir', 'detecciones')
@@ -49,204 +105,416 @@ class LprWorker:
             logging.exception('No se pudo crear detections_dir %s', self.detections_dir)
         logging.info('LPR detections_dir set to %s', self.detections_dir)
 
+    def stop(self):
+        """Pide al loop de captura que termine (usado por WorkerHost)."""
+        self._stop_event.set()
+        if self.access is not None:
+            self.access.unregister(self.cfg.camera_id)
+
     def start_capture_loop(self, cap):
         last_frame_ts = 0
+        self.hires = getattr(cap, 'frame_at', None)
+        self.dual = cap if hasattr(cap, 'observe_offset') else None
         try:
-            while True:
+            while not self._stop_event.is_set():
                 ret, frame = cap.read()
                 if not ret:
-                    logging.warning('Frame no recibido - reconectando...')
-                    time.sleep(1)
+                    # CaptureSession ya esperó el backoff y reabre el stream si se cortó
                     continue
                 now = time.time()
+                captured_at = getattr(cap, 'last_timestamp', None) or now
+                if self.clips is not None:
+                    self.clips.push(frame, captured_at)
                 if now - last_frame_ts < self.cfg.poll_interval:
                     time.sleep(0.005)
                     continue
                 last_frame_ts = now
-                self.submit_frame(frame)
-                if self.processing_future is not None and self.processing_future.done():
-                    try:
-                        self.processing_future.result()
-                    except Exception:
-                        logging.exception('Error worker')
+                self.submit_frame(frame, captured_at)
         finally:
-            try:
-                self.executor.shutdown(wait=False)
-            except Exception:
-                pass
+            self.pipeline.close()
+            if self.clips is not None:
+                self.clips.close()
+            if self._owns_executor:
+                try:
+                    self.executor.shutdown(wait=False)
+                except Exception:
+                    pass
 
-    def submit_frame(self, frame: np.ndarray):
-        self.latest_frame = frame.copy()
-        if self.processing_future is None or self.processing_future.done():
-            self.processing_future = self.executor.submit(self._process_frame, self.latest_frame)
+    def submit_frame(self, frame: np.ndarray, captured_at: Optional[float] = None):
+        # copia: el backend de captura puede reutilizar el buffer del frame
+        self.pipeline.submit((frame.copy(), captured_at or time.time()))
 
-    def _process_frame(self, frame: np.ndarray):
-        # Esta función implementa la lógica de detección/OCR/confirmación
+    def _record_sighting(self, status, plate, plate_raw, det_conf, ocr_conf, bbox, image=None, ts=None):
+        if self.sighting_index is None:
+            return
+        try:
+            # ts: momento de captura del frame leído, no el de llegada a esta etapa
+            self.sighting_index.record(self.cfg.camera_id, plate, status, plate_raw=plate_raw, det_conf=det_conf,
+                                       ocr_conf=ocr_conf, bbox=bbox, image=image, ts=ts)
+        except Exception:
+            logging.exception('No se pudo registrar la lectura en el índice de patentes')
+
+    def _process_frame(self, frame: np.ndarray, captured_at: Optional[float] = None):
+        """Procesa un frame de punta a punta en el hilo actual, sin pasar por las colas."""
+        items = [(frame, captured_at or time.time())]
+        for stage in self.pipeline.stages:
+            out = []
+            for item in items:
+                stage.fn(item, out.append)
+            items = out
+
+    # --- etapas del pipeline -------------------------------------------------
+
+    def _detect_stage(self, item, emit):
+        frame, captured_at = item
+        # un frame viejo (executor saturado, stream atrasado) ya no sirve para abrir
+        # una barrera a tiempo: se descarta en vez de procesarlo
+        age = time.time() - captured_at
+        self.latency.observe('capture_to_start', age)
+        max_age = float(settings.LPR_MAX_FRAME_AGE)
+        if max_age > 0 and age > max_age:
+            self.latency.drop_stale()
+            logging.debug('Frame descartado por antigüedad (%.2fs > %.2fs)', age, max_age)
+            return
+        t0 = time.time()
         plates = self.detector(frame, self.cfg.min_det_conf)
+        self.latency.observe('detect', time.time() - t0)
         logging.debug('Frame procesado - Detecciones: %d', len(plates) if plates else 0)
         if not plates:
             return
+        if not isinstance(plates, Detections):
+            # detector externo que devuelve una lista de Detection
+            plates = Detections([(d.x1, d.y1, d.x2, d.y2) for d in plates], [d.confidence for d in plates])
+        # recorte al frame y descarte de cajas vacías, vectorizado para todas las cajas
+        h, w = frame.shape[:2]
+        plates = plates.clipped(w, h)
+        if self.calibration is not None:
+            self.calibration.maybe_sample(self.cfg.camera_id, frame, plates)
+        if self.hires is not None:
+            for item_frame, det in self._to_main_stream(frame, captured_at, plates):
+                emit((item_frame, captured_at, det))
+            return
         for det in plates:
-            x1, y1, x2, y2 = det.x1, det.y1, det.x2, det.y2
-            conf = det.confidence
-            h, w = frame.shape[:2]
-            x1c, y1c = max(0, x1), max(0, y1)
-            x2c, y2c = min(w - 1, x2), min(h - 1, y2)
-            if x2c <= x1c or y2c <= y1c:
+            emit((frame, captured_at, det))
+
+    def _to_main_stream(self, frame: np.ndarray, captured_at: float, plates: Detections):
+        """Pasa las detecciones del sub-stream al frame del stream principal alineado en tiempo.
+
+        Devuelve (frame, detección) por patente. Si no hay frame del principal a
+        tiempo, o la re-detección no encuentra la patente en él (el auto ya no
+        está ahí: relojes desalineados), esa patente sigue con el sub-stream.
+        """
+        refine = bool(settings.LPR_MAIN_REFINE)
+        if refine and self.dual is not None and self.dual.calibrating:
+            self._calibrate_offset(frame, captured_at, plates)
+        t0 = time.time()
+        main = self.hires(captured_at)
+        self.latency.observe('main_frame', time.time() - t0)
+        if main is None:
+            return [(frame, det) for det in plates]
+        mh, mw = main.shape[:2]
+        h, w = frame.shape[:2]
+        sx, sy = mw / w, mh / h
+        scaled = plates.scaled(sx, sy)
+        if not refine or (sx <= 1.0 and sy <= 1.0):
+            return [(main, det) for det in scaled.clipped(mw, mh)]
+        refined, found = self._refine_boxes(main, scaled, sx, sy)
+        if not found.all():
+            logging.debug('%d patente(s) sin re-detección en el stream principal: se usa el sub-stream',
+                          int((~found).sum()))
+        return [(main, det) for det in refined[found].clipped(mw, mh)] + [(frame, det) for det in plates[~found]]
+
+    def _redetect(self, main: np.ndarray, box, sx: float, sy: float) -> Optional[Detections]:
+        """Patentes del stream principal en una región alrededor de `box` (coordenadas del principal)."""
+        mh, mw = main.shape[:2]
+        x1, y1, x2, y2 = (int(v) for v in box)
+        pad_x, pad_y = max(int(2 * sx), (x2 - x1) // 2), max(int(2 * sy), (y2 - y1) // 2)
+        rx1, ry1 = max(0, x1 - pad_x), max(0, y1 - pad_y)
+        rx2, ry2 = min(mw, x2 + pad_x), min(mh, y2 + pad_y)
+        if rx2 <= rx1 or ry2 <= ry1:
+            return None
+        try:
+            found = self.detector(main[ry1:ry2, rx1:rx2], self.cfg.min_det_conf)
+        except Exception:
+            logging.exception('Error re-detectando la patente en el stream principal')
+            return None
+        if found is None or not len(found):
+            return None
+        if not isinstance(found, Detections):
+            found = Detections([(d.x1, d.y1, d.x2, d.y2) for d in found], [d.confidence for d in found])
+        return Detections(found.xyxy + np.array([rx1, ry1, rx1, ry1], dtype=np.float32), found.confidence)
+
+    def _refine_boxes(self, main: np.ndarray, plates: Detections, sx: float, sy: float):
+        """Re-detecta cada patente en una región del stream principal alrededor de la caja escalada.
+
+        La caja escalada arrastra el error de la baja resolución (±1 px del
+        sub-stream son ±sx px del principal); la región es chica, así que la
+        segunda pasada cuesta poco. Devuelve las cajas y la máscara de las que
+        se encontraron (las demás quedan escaladas).
+        """
+        xyxy = plates.xyxy.copy()
+        found_mask = np.zeros(len(plates), dtype=bool)
+        for i, box in enumerate(plates.xyxy.tolist()):
+            found = self._redetect(main, box, sx, sy)
+            if found is None:
+                continue
+            xyxy[i] = found.xyxy[int(np.argmax(found.confidence))]
+            found_mask[i] = True
+        return Detections(xyxy, plates.confidence, plates.class_id, plates.track_id), found_mask
+
+    def _calibrate_offset(self, frame: np.ndarray, captured_at: float, plates: Detections):
+        """Mide el desfase entre los relojes del sub-stream y del principal con la patente más confiable.
+
+        Re-detecta la patente en los frames del principal cercanos y se queda
+        con el que mejor calza (IoU) con la caja escalada del sub-stream: en
+        ese frame el auto estaba donde lo vio el sub-stream.
+        """
+        t0 = time.time()
+        candidates = self.dual.frames_near(captured_at)
+        # a lo sumo ~16 re-detecciones por muestra
+        candidates = candidates[::max(1, len(candidates) // 16)]
+        i = int(np.argmax(plates.confidence))
+        h, w = frame.shape[:2]
+        best = None  # (iou, t)
+        for t, main in candidates:
+            mh, mw = main.shape[:2]
+            sx, sy = mw / w, mh / h
+            box = plates.xyxy[i] * np.array([sx, sy, sx, sy], dtype=np.float32)
+            found = self._redetect(main, box, sx, sy)
+            if found is None:
                 continue
-            crop = frame[y1c:y2c, x1c:x2c]
-            pil_crop = frame_to_pil(crop)
+            iou = float(iou_matrix(box[None, :], found.xyxy).max())
+            if best is None or iou > best[0]:
+                best = (iou, t)
+        self.latency.observe('main_calibration', time.time() - t0)
+        if best is not None and best[0] >= 0.3:
+            self.dual.observe_offset(best[1] - captured_at)
+
+    def _ocr_stage(self, item, emit):
+        frame, captured_at, det = item
+        crop = frame[det.y1:det.y2, det.x1:det.x2]
+        # JPEG del crop: se codifica una vez y se reutiliza para disco y snapshot
+        crop_img = EncodedImage(crop, settings.LPR_JPEG_QUALITY)
+        bbox = (det.x1, det.y1, det.x2, det.y2)
+        t0 = time.time()
+        # auto detenido: la misma región sin cambios no vuelve a pasar por el OCR
+        ocr_res = self.ocr_cache.lookup(frame, bbox) if self.ocr_cache is not None else None
+        if ocr_res is None and self.fast_ocr:
+            ocr_res = self.fast_ocr.recognize(np.array(frame_to_pil(crop)))
+            if self.ocr_cache is not None:
+                self.ocr_cache.store(frame, bbox, ocr_res)
+        self.latency.observe('ocr', time.time() - t0)
+        emit((frame, captured_at, det, crop_img, ocr_res))
+
+    def _rules_stage(self, item, emit):
+        # único hilo: confirmación, dedupe y emitted_cache son estado de la cámara
+        frame, captured_at, det, crop_img, ocr_res = item
+        x1c, y1c, x2c, y2c = det.x1, det.y1, det.x2, det.y2
+        conf = det.confidence
+        plate_text = ocr_res.text if ocr_res else ''
+        ocr_conf = ocr_res.confidence if ocr_res else 0.0
+        char_conf = ocr_res.char_confidences if ocr_res else []
+        logging.info('Detección: conf=%.2f | OCR: "%s" conf=%.2f', conf, plate_text, ocr_conf)
+        bbox = (x1c, y1c, x2c, y2c)
+
+        save_only_on_plate = bool(settings.LPR_SAVE_ONLY_ON_PLATE)
+        if save_only_on_plate and (not plate_text or plate_text.strip() == ''):
+            logging.info('OCR vacío — saltando detección')
+            self._record_sighting('empty', None, plate_text, conf, ocr_conf, bbox, ts=captured_at)
+            return
+
+        plate_clean = normalize_plate(plate_text)
+        if not plausible_plate(plate_clean):
+            logging.info('Placa "%s" no plausible, descartando', plate_text)
+            self._record_sighting('bad', plate_clean, plate_text, conf, ocr_conf, bbox, ts=captured_at)
+            if self.cfg.save_crops_dir:
+                self.persistence.save_image(os.path.join(self.cfg.save_crops_dir, f'{self.cfg.camera_id}_crop_bad_{int(time.time())}.jpg'), crop_img, PRIORITY_LOW)
+            return
 
-            # OCR
-            ocr_res = self.fast_ocr.recognize(np.array(pil_crop)) if self.fast_ocr else None
+        char_stats = analyze_char_confidences(char_conf)
+        min_char_ratio_required = float(settings.LPR_MIN_CHAR_CONF_RATIO)
+        if char_stats['num_chars'] > 0 and char_stats['ratio_above'] < min_char_ratio_required:
+            logging.info('Placa "%s" rechazada - calidad insuficiente (ratio: %.2f < %.2f)', 
+                       plate_clean, char_stats['ratio_above'], min_char_ratio_required)
+            self._record_sighting('lowq', plate_clean, plate_text, conf, ocr_conf, bbox, ts=captured_at)
+            if self.cfg.save_crops_dir:
+                self.persistence.save_image(os.path.join(self.cfg.save_crops_dir, f'{self.cfg.camera_id}_crop_lowq_{int(time.time())}.jpg'), crop_img, PRIORITY_LOW)
+            return
+        # dedupe
+        dedup_seconds = float(settings.LPR_DEDUP_SECONDS)
+        now_ts = time.time()
+        last_emitted = self.emitted_cache.get(plate_clean)
+        if plate_clean and last_emitted and (now_ts - last_emitted) < dedup_seconds:
+            logging.info('Placa "%s" duplicada - emitida hace %.1fs', plate_clean, now_ts - last_emitted)
+            self._record_sighting('duplicate', plate_clean, plate_text, conf, ocr_conf, bbox, ts=captured_at)
+            logging.debug('Placa %s recientemente emitida', plate_clean)
+            return
+
+        # sightings
+        entry = self.plate_sightings.get(plate_clean)
+        if entry is None:
+            entry = {'first_seen': now_ts, 'count': 0, 'last_seen': now_ts}
+        entry['count'] = entry.get('count', 0) + 1
+        entry['last_seen'] = now_ts
+        self.plate_sightings[plate_clean] = entry
+        if self.best_shots is not None:
+            self.best_shots.expire(now_ts)
+            score = shot_score(conf, frame[y1c:y2c, x1c:x2c], ocr_conf)
+            self.best_shots.offer(plate_clean, score, (frame, captured_at, det, crop_img, ocr_res), now_ts)
+        confirmed, info = should_confirm(self.plate_sightings, plate_clean)
+        if not confirmed:
+            logging.info('Esperando confirmación %s (visto %d veces)', plate_clean, entry.get('count', 0))
+            logging.debug('Esperando confirmacion %s', plate_clean)
+            self._record_sighting('pending', plate_clean, plate_text, conf, ocr_conf, bbox, ts=captured_at)
+            if self.cfg.save_crops_dir:
+                self.persistence.save_image(os.path.join(self.cfg.save_crops_dir, f'{self.cfg.camera_id}_crop_pending_{int(time.time())}.jpg'), crop_img, PRIORITY_LOW)
+            return
+
+        # otra cámara del mismo grupo ya emitió esta patente: no duplicar el evento
+        claimed = False
+        if self.dedup is not None:
+            t0 = time.time()
+            claim = self.dedup.claim(self.cfg.camera_id, plate_clean)
+            self.latency.observe('dedup', time.time() - t0)
+            if not claim.get('emit', True):
+                logging.info('Placa "%s" ya emitida por %s hace %.1fs (grupo %s)', plate_clean, claim.get('camera'),
+                             claim.get('age', 0.0), claim.get('group'))
+                self._record_sighting('duplicate', plate_clean, plate_text, conf, ocr_conf, bbox, ts=captured_at)
+                self.emitted_cache[plate_clean] = now_ts
+                if self.best_shots is not None:
+                    self.best_shots.pop(plate_clean)
+                return
+            # la patente quedó reclamada por esta cámara en su grupo
+            claimed = 'group' in claim
+
+        # el evento lleva la mejor lectura de la patente (puede ser una pendiente anterior)
+        shot_at = captured_at
+        shot = self.best_shots.pop(plate_clean) if self.best_shots is not None else None
+        if shot is not None:
+            frame, shot_at, det, crop_img, ocr_res = shot
+            x1c, y1c, x2c, y2c = det.x1, det.y1, det.x2, det.y2
+            conf, bbox = det.confidence, (x1c, y1c, x2c, y2c)
             plate_text = ocr_res.text if ocr_res else ''
             ocr_conf = ocr_res.confidence if ocr_res else 0.0
             char_conf = ocr_res.char_confidences if ocr_res else []
-            logging.info('Detección: conf=%.2f | OCR: "%s" conf=%.2f', conf, plate_text, ocr_conf)
+            char_stats = analyze_char_confidences(char_conf)
 
-            save_only_on_plate = bool(settings.LPR_SAVE_ONLY_ON_PLATE)
-            if save_only_on_plate and (not plate_text or plate_text.strip() == ''):
-                logging.info('OCR vacío — saltando detección')
-                continue
+        # construir payload en forma del DTO: campos principales + meta
+        meta: dict = {}
+        meta['bbox'] = [int(x1c), int(y1c), int(x2c), int(y2c)]
+        # incluir snapshot en base64 solo si está habilitado por env
+        include_snapshot = bool(settings.LPR_INCLUDE_SNAPSHOT)
+        if include_snapshot:
+            meta['snapshot_jpeg_b64'] = crop_img.base64()
+        meta['char_confidences'] = char_conf
+        meta['char_conf_min'] = char_stats['min']
+        meta['char_conf_mean'] = char_stats['mean']
+        meta['char_conf_ratio'] = char_stats['ratio_above']
+        meta['best_shot_ts'] = int(shot_at * 1000)
+        if self.access is not None:
+            # decisión local en memoria: disponible ya, sin esperar el ida y vuelta al backend
+            t0 = time.time()
+            local = self.access.decide(self.cfg.camera_id, plate_clean)
+            elapsed = time.time() - t0
+            self.latency.observe('local_decision', elapsed)
+            if local is not None:
+                meta['local_decision'] = local.as_meta(elapsed * 1000.0)
+                logging.info('Decisión local %s: %s (%s)', plate_clean, local.decision, local.reason)
 
-            plate_clean = normalize_plate(plate_text)
-            if not plausible_plate(plate_clean):
-                logging.info('Placa "%s" no plausible, descartando', plate_text)
-                if self.cfg.save_crops_dir:
-                    try:
-                        save_image_pil(self.cfg.save_crops_dir, f'{self.cfg.camera_id}_crop_bad_{int(time.time())}.jpg', pil_crop)
-                    except Exception:
-                        logging.exception('No se pudo guardar crop malo')
-                continue
+        payload = {
+            'cameraId': self.cfg.camera_id,
+            'plate': plate_clean,
+            'plate_raw': plate_text,
+            'det_confidence': conf,
+            'ocr_confidence': ocr_conf,
+            'meta': meta,
+            'mountPath': self.cfg.rtsp_url,
+            # captura del frame que confirmó la patente (ms desde epoch): el mismo instante
+            # en que se centra el clip; la mejor imagen puede ser anterior (meta.best_shot_ts)
+            'detectionTimestamp': int(captured_at * 1000),
+        }
 
-            char_stats = analyze_char_confidences(char_conf)
-            min_char_ratio_required = float(settings.LPR_MIN_CHAR_CONF_RATIO)
-            if char_stats['num_chars'] > 0 and char_stats['ratio_above'] < min_char_ratio_required:
-                logging.info('Placa "%s" rechazada - calidad insuficiente (ratio: %.2f < %.2f)', 
-                           plate_clean, char_stats['ratio_above'], min_char_ratio_required)
-                if self.cfg.save_crops_dir:
-                    try:
-                        save_image_pil(self.cfg.save_crops_dir, f'{self.cfg.camera_id}_crop_lowq_{int(time.time())}.jpg', pil_crop)
-                    except Exception:
-                        logging.exception('No se pudo guardar crop lowq')
-                continue
-            # dedupe
-            dedup_seconds = float(settings.LPR_DEDUP_SECONDS)
-            now_ts = time.time()
-            last_emitted = self.emitted_cache.get(plate_clean)
-            if plate_clean and last_emitted and (now_ts - last_emitted) < dedup_seconds:
-                logging.info('Placa "%s" duplicada - emitida hace %.1fs', plate_clean, now_ts - last_emitted)
-                continuedebug('Placa %s recientemente emitida', plate_clean)
-                continue
+        # NOTE: saving full frames for debug was removed by request.
+        # Only crops and detections are saved. Frames saving/uploading were deprecated.
 
-            # sightings
-            entry = self.plate_sightings.get(plate_clean)
-            if entry is None:
-                entry = {'first_seen': now_ts, 'count': 0, 'last_seen': now_ts}
-            entry['count'] = entry.get('count', 0) + 1
-            entry['last_seen'] = now_ts
-            self.plate_sightings[plate_clean] = entry
-            confirmed, info = should_confirm(self.plate_sightings, plate_clean)
-            if not confirmed:
-                logging.info('Esperando confirmación %s (visto %d veces)', plate_clean, entry.get('count', 0))
-                logging.debug('Esperando confirmacion %s', plate_clean)
-                if self.cfg.save_crops_dir:
-                    try:
-                        save_image_pil(self.cfg.save_crops_dir, f'{self.cfg.camera_id}_crop_pending_{int(time.time())}.jpg', pil_crop)
-                    except Exception:
-                        logging.exception('No se pudo guardar crop pending')
-                continue
+        upload_job = None
+        save_high = False
+        clip_path = self.clips.trigger(f'plate_{plate_clean}', captured_at) if self.clips is not None else None
+        try:
+            det_thresh = float(settings.LPR_DET_CONF_THRESHOLD or self.cfg.det_high_conf)
+            ocr_thresh = float(settings.LPR_OCR_CONF_THRESHOLD or self.cfg.ocr_high_conf)
+            save_high = should_save_or_emit(conf, ocr_conf, self.cfg.combined_threshold, det_thresh, ocr_thresh)
+            if save_high:
+                det_fname = f'{self.cfg.camera_id}_det_{int(time.time())}.jpg'
+                det_path = os.path.join(self.detections_dir, det_fname)
+                label = f'{plate_clean} det:{conf:.2f} ocr:{ocr_conf:.2f}'
 
-            # construir payload en forma del DTO: campos principales + meta
-            meta: dict = {}
-            meta['bbox'] = [int(x1c), int(y1c), int(x2c), int(y2c)]
-            # incluir snapshot en base64 solo si está habilitado por env
-            include_snapshot = bool(settings.LPR_INCLUDE_SNAPSHOT)
-            if include_snapshot:
-                meta['snapshot_jpeg_b64'] = pil_to_base64(pil_crop)
-            meta['char_confidences'] = char_conf
-            meta['char_conf_min'] = char_stats['min']
-            meta['char_conf_mean'] = char_stats['mean']
-            meta['char_conf_ratio'] = char_stats['ratio_above']
-
-            payload = {
-                'cameraId': self.cfg.camera_id,
-                'plate': plate_clean,
-                'plate_raw': plate_text,
-                'det_confidence': conf,
-                'ocr_confidence': ocr_conf,
-                'meta': meta,
-                'mountPath': self.cfg.rtsp_url,
-                'detectionTimestamp': int(now_ts * 1000),  # Timestamp en milisegundos desde epoch
-            }
-
-            # NOTE: saving full frames for debug was removed by request.
-            # Only crops and detections are saved. Frames saving/uploading were deprecated.
+                def annotate(img, box=(int(x1c), int(y1c), int(x2c), int(y2c)), label=label):
+                    cv2.rectangle(img, box[:2], box[2:], (0, 255, 255), 3)
+                    cv2.putText(img, label, (box[0], max(20, box[1] - 10)), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 255, 255), 2)
 
-            try:
-                det_thresh = float(settings.LPR_DET_CONF_THRESHOLD or self.cfg.det_high_conf)
-                ocr_thresh = float(settings.LPR_OCR_CONF_THRESHOLD or self.cfg.ocr_high_conf)
-                save_high = should_save_or_emit(conf, ocr_conf, self.cfg.combined_threshold, det_thresh, ocr_thresh)
-                if save_high:
-                    det_fname = f'{self.cfg.camera_id}_det_{int(time.time())}.jpg'
-                    det_path = os.path.join(self.detections_dir, det_fname)
-                    frame_det = frame.copy()
+                # `frame` no se vuelve a modificar: la anotación se hace sobre una copia
+                # al codificar, y los mismos bytes sirven para disco y Cloudinary
+                det_img = EncodedImage(frame, settings.LPR_JPEG_QUALITY, annotate=annotate)
+                # publicar la ruta de la detección (esta es la imagen que debe enviarse al backend)
+                payload['detection_path'] = det_path
+                payload['full_frame_path'] = det_path
+                det_written = self.persistence.save_image(det_path, det_img, PRIORITY_HIGH)
+                logging.info('Detección de alta confianza encolada para %s', det_path)
+                # subir la detección a Cloudinary si está configurado: en segundo plano;
+                # el evento sale ya con la ruta local y la URL remota se parcha después
+                if bool(settings.CLOUDINARY_UPLOAD):
                     try:
-                        cv2.rectangle(frame_det, (int(x1c), int(y1c)), (int(x2c), int(y2c)), (0, 255, 255), 3)
-                        label = f'{plate_clean} det:{conf:.2f} ocr:{ocr_conf:.2f}'
-                        cv2.putText(frame_det, label, (int(x1c), max(20, int(y1c) - 10)), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 255, 255), 2)
+                        public_id = f"{self.cfg.camera_id}_det_{int(time.time())}"
+                        upload_job = get_uploader().submit(det_img, public_id, local_path=det_path, written=det_written)
                     except Exception:
-                        logging.exception('Error anotando frame de detección')
-                    cv2.imwrite(det_path, frame_det)
-                    logging.info('Guardada detección de alta confianza en %s', det_path)
-                    # publicar la ruta de la detección (esta es la imagen que debe enviarse al backend)
-                    payload['detection_path'] = det_path
-                    payload['full_frame_path'] = det_path
-                    # subir la detección a Cloudinary si está configurado
-                    if bool(settings.CLOUDINARY_UPLOAD):
-                        try:
-                            from lpr.storage.fs_storage import upload_to_cloudinary
-                            public_id = f"{self.cfg.camera_id}_det_{int(time.time())}"
-                            try:
-                                remote_url = upload_to_cloudinary(det_path, public_id=public_id)
-                                # update payload to point to remote detection image
-                                payload['detection_path'] = remote_url
-                                payload['full_frame_path'] = remote_url
-                                logging.info('Uploaded det image to Cloudinary: %s', remote_url)
-                                if bool(settings.CLOUDINARY_DELETE_LOCAL):
-                                    try:
-                                        os.remove(det_path)
-                                    except Exception:
-                                        logging.exception('No se pudo eliminar archivo local %s', det_path)
-                            except Exception:
-                                logging.exception('Error subiendo det image a Cloudinary, manteniendo local path')
-                        except Exception:
-                            logging.exception('Error manejando Cloudinary upload')
-                    try:
-                        if int(settings.LPR_CONFIRM_FRAMES) <= int(entry.get('count', 0)):
-                            confirmed_by = 'frames'
-                        else:
-                            confirmed_by = 'seconds'
-                        # guardar confirmed_by dentro de meta
-                        payload['meta']['confirmed_by'] = confirmed_by
-                        meta_to_save = payload.copy()
-                        meta_path = det_path + '.json'
-                        with open(meta_path, 'w', encoding='utf-8') as mf:
-                            json.dump(meta_to_save, mf, ensure_ascii=False, indent=2)
-                    except Exception:
-                        logging.exception('No se pudo guardar metadata JSON')
-                    if self.cfg.save_crops_dir:
-                        try:
-                            save_image_pil(self.cfg.save_crops_dir, f'{self.cfg.camera_id}_crop_high_{int(time.time())}.jpg', pil_crop)
-                        except Exception:
-                            logging.exception('No se pudo guardar crop high')
-                    try:
-                        self.emitted_cache[plate_clean] = time.time()
-                    except Exception:
-                        logging.exception('No se pudo marcar emitted_cache')
-                    time.sleep(self.cfg.min_event_interval)
-            except Exception:
-                logging.exception('Error guardando detección de alta confianza')
+                        logging.exception('Error manejando Cloudinary upload')
+                try:
+                    if int(settings.LPR_CONFIRM_FRAMES) <= int(entry.get('count', 0)):
+                        confirmed_by = 'frames'
+                    else:
+                        confirmed_by = 'seconds'
+                    # guardar confirmed_by dentro de meta
+                    payload['meta']['confirmed_by'] = confirmed_by
+                    record = dict(payload, meta=dict(payload['meta']), kind='plate', ts=now_ts, clip_path=clip_path)
+                    self.persistence.submit(lambda record=record: self.event_log.append(record), PRIORITY_HIGH)
+                except Exception:
+                    logging.exception('No se pudo registrar la detección en el log de eventos')
+                if self.cfg.save_crops_dir:
+                    self.persistence.save_image(os.path.join(self.cfg.save_crops_dir, f'{self.cfg.camera_id}_crop_high_{int(time.time())}.jpg'), crop_img, PRIORITY_LOW)
+                try:
+                    self.emitted_cache[plate_clean] = time.time()
+                except Exception:
+                    logging.exception('No se pudo marcar emitted_cache')
+        except Exception:
+            logging.exception('Error guardando detección de alta confianza')
+
+        emit({'payload': payload, 'captured_at': captured_at, 'upload_job': upload_job, 'save_high': save_high,
+              'plate': plate_clean, 'plate_raw': plate_text, 'det_conf': conf, 'ocr_conf': ocr_conf, 'bbox': bbox,
+              'claimed': claimed})
 
-            logging.info('Evento: %s ...', json.dumps(payload, ensure_ascii=False)[:200])
-            post_event(self.cfg.backend_url, payload, dry_run=self.cfg.dry_run)
+    def _sink_stage(self, event, emit):
+        # envío al backend (I/O bloqueante) en su propia etapa: no frena la detección
+        payload, captured_at, upload_job = event['payload'], event['captured_at'], event['upload_job']
+        logging.info('Evento: %s ...', json.dumps(payload, ensure_ascii=False)[:200])
+        t0 = time.time()
+        status, body = post_event(self.cfg.backend_url, payload, dry_run=self.cfg.dry_run, return_body=True)
+        self.latency.observe('post', time.time() - t0)
+        # la emisión se registra con el resultado del envío: 'emit_failed' si el backend no la aceptó
+        self._record_sighting('emitted' if 200 <= status < 300 else 'emit_failed', event['plate'], event['plate_raw'],
+                              event['det_conf'], event['ocr_conf'], event['bbox'], payload.get('full_frame_path'),
+                              ts=captured_at)
+        if event['claimed'] and not 200 <= status < 300:
+            # el backend no la aceptó: otra cámara del grupo puede volver a emitirla
+            self.dedup.release(self.cfg.camera_id, event['plate'])
+        self.latency.observe('capture_to_ack', time.time() - captured_at)
+        if upload_job is not None:
+            detection_id = ((body or {}).get('detection') or {}).get('id')
+            if detection_id:
+                get_uploader().attach_detection(upload_job, self.cfg.backend_url, detection_id, dry_run=self.cfg.dry_run)
+            elif not self.cfg.dry_run:
+                logging.warning('Respuesta sin id de detección (status %s): la URL de Cloudinary no se parchará', status)
+        if event['save_high']:
+            # espaciar eventos después del envío: se dejan de tomar frames nuevos
+            # durante el intervalo en vez de dormir un hilo del executor
+            self.pipeline.pause(self.cfg.min_event_interval)
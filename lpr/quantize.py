@@ -0,0 +1,327 @@
+"""Cuantización INT8 estática (ONNX Runtime) del detector de patentes, el modelo
+de personas y el OCR, calibrada con imágenes de nuestras propias cámaras.
+
+Flujo:
+  1. Juntar imágenes de calibración: los workers las guardan solos con
+     `LPR_CALIBRATION_DIR` (frames en `frames/`, crops de patente en `crops/`),
+     o se extraen de un video grabado:
+       python -m lpr.quantize collect --video grabacion.mp4 --out calib [--crops]
+  2. Cuantizar (exporta a ONNX FP32 si hace falta y genera el INT8 QDQ):
+       python -m lpr.quantize detector --calib calib/frames --out models/plates_int8.onnx
+       python -m lpr.quantize person --calib calib/frames --out models/person_int8.onnx
+       python -m lpr.quantize ocr --onnx <ocr_fp32.onnx> --calib calib/crops --out models/ocr_int8.onnx
+  3. Validar contra FP32 en el conjunto reservado (1 de cada 5 imágenes, nunca
+     usado para calibrar); sale con código 1 si la concordancia es baja:
+       python -m lpr.quantize validate --kind detector --fp32 a.onnx --int8 b.onnx --images calib/frames
+  4. Cargar los modelos INT8 vía settings: LPR_DETECTOR_MODEL, LPR_PERSON_MODEL
+     (rutas .onnx) y LPR_OCR_ONNX_PATH (+ LPR_OCR_CONFIG_PATH).
+
+Requiere `onnxruntime` (ya lo trae fast-plate-ocr[onnx]) y, para exportar los
+YOLO, `ultralytics`.
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from lpr.detector.yolo_detector import iou_matrix
+
+# 1 de cada HOLDOUT_EVERY imágenes queda reservada para validar
+HOLDOUT_EVERY = 5
+
+
+def list_images(directory: str) -> List[str]:
+    paths = []
+    for ext in ('*.jpg', '*.jpeg', '*.png'):
+        paths.extend(glob.glob(os.path.join(directory, ext)))
+    return sorted(paths)
+
+
+def split(paths: List[str], holdout: bool) -> List[str]:
+    """Partición determinística calibración / validación."""
+    return [p for i, p in enumerate(paths) if (i % HOLDOUT_EVERY == 0) == holdout]
+
+
+# --- preprocesamiento (igual al de inferencia) --------------------------------
+
+def letterbox(img: np.ndarray, size: int) -> Tuple[np.ndarray, float, Tuple[int, int]]:
+    """Preproceso de ultralytics: letterbox a `size` con relleno 114, RGB, NCHW float32 [0, 1].
+
+    Devuelve también la escala y el desplazamiento para llevar cajas al frame original.
+    """
+    h, w = img.shape[:2]
+    scale = min(size / h, size / w)
+    nh, nw = int(round(h * scale)), int(round(w * scale))
+    top, left = (size - nh) // 2, (size - nw) // 2
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    canvas[top:top + nh, left:left + nw] = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    blob = canvas[:, :, ::-1].transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+    return np.ascontiguousarray(blob), scale, (left, top)
+
+
+def ocr_input(img: np.ndarray, shape, dtype=np.uint8) -> np.ndarray:
+    """Crop -> tensor del OCR según la entrada del modelo (NHWC, 1 o 3 canales)."""
+    _, height, width, channels = shape
+    resized = cv2.resize(img, (int(width), int(height)), interpolation=cv2.INTER_LINEAR)
+    if int(channels) == 1:
+        resized = cv2.cvtColor(resized, cv2.COLOR_BGR2GRAY)[:, :, None]
+    else:
+        resized = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
+    return resized[None].astype(dtype)
+
+
+# --- postprocesamiento y comparación ------------------------------------------
+
+def decode_yolo(output: np.ndarray, conf: float = 0.25, iou: float = 0.45) -> Tuple[np.ndarray, np.ndarray]:
+    """Salida cruda YOLO (1, 4 + clases, N) -> cajas xyxy (M×4) y scores tras NMS."""
+    pred = output[0].T
+    scores = pred[:, 4:].max(axis=1)
+    keep = scores >= conf
+    pred, scores = pred[keep], scores[keep]
+    if not len(pred):
+        return np.empty((0, 4), dtype=np.float32), np.empty(0, dtype=np.float32)
+    cx, cy, w, h = pred[:, 0], pred[:, 1], pred[:, 2], pred[:, 3]
+    boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+    idx = cv2.dnn.NMSBoxes(np.stack([boxes[:, 0], boxes[:, 1], w, h], axis=1).tolist(), scores.tolist(), conf, iou)
+    idx = np.array(idx, dtype=np.int64).reshape(-1)
+    return boxes[idx].astype(np.float32), scores[idx].astype(np.float32)
+
+
+def match_detections(ref: Tuple[np.ndarray, np.ndarray], test: Tuple[np.ndarray, np.ndarray],
+                     iou: float = 0.5) -> Dict:
+    """Empareja (greedy por IoU) las cajas INT8 con las FP32 de referencia."""
+    ref_boxes, ref_scores = ref
+    test_boxes, test_scores = test
+    matched, conf_delta = 0, []
+    if len(ref_boxes) and len(test_boxes):
+        ious = iou_matrix(ref_boxes, test_boxes)
+        for i in np.argsort(-ref_scores):
+            j = int(np.argmax(ious[i]))
+            if ious[i, j] >= iou:
+                ious[:, j] = -1.0  # cada caja INT8 se empareja una sola vez
+                matched += 1
+                conf_delta.append(abs(float(ref_scores[i]) - float(test_scores[j])))
+    return {'ref': len(ref_boxes), 'test': len(test_boxes), 'matched': matched, 'conf_delta': conf_delta}
+
+
+# --- ONNX Runtime -----------------------------------------------------------------
+
+def _session(path: str):
+    import onnxruntime as ort
+    return ort.InferenceSession(path, providers=['CPUExecutionProvider'])
+
+
+class _ImageReader:
+    """CalibrationDataReader de ONNX Runtime sobre una lista de imágenes."""
+
+    def __init__(self, paths: List[str], input_name: str, preprocess: Callable[[np.ndarray], np.ndarray]):
+        self._paths = iter(paths)
+        self._input_name = input_name
+        self._preprocess = preprocess
+
+    def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+        for path in self._paths:
+            img = cv2.imread(path)
+            if img is not None:
+                return {self._input_name: self._preprocess(img)}
+        return None
+
+
+def quantize_onnx(fp32_path: str, out_path: str, calib_paths: List[str], preprocess: Callable) -> str:
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    if not calib_paths:
+        raise SystemExit('No hay imágenes de calibración')
+    input_name = _session(fp32_path).get_inputs()[0].name
+    reader = type('Reader', (_ImageReader, CalibrationDataReader), {})(calib_paths, input_name, preprocess)
+    os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+    source = fp32_path
+    try:
+        # inferencia de shapes + fusiones: mejora la cobertura de la cuantización
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+        source = out_path + '.prep.onnx'
+        # los modelos exportados son de tamaño fijo: alcanza la inferencia de shapes de ONNX
+        quant_pre_process(fp32_path, source, skip_symbolic_shape=True)
+    except Exception as e:
+        logging.warning('quant_pre_process no disponible/falló (%s); se cuantiza el modelo tal cual', e)
+        if source != fp32_path and os.path.exists(source):
+            os.remove(source)
+        source = fp32_path
+    quantize_static(source, out_path, reader, quant_format=QuantFormat.QDQ, per_channel=True,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    if source != fp32_path:
+        os.remove(source)
+    logging.info('Modelo INT8 escrito en %s (%d imágenes de calibración)', out_path, len(calib_paths))
+    return out_path
+
+
+def export_yolo(model_ref: str, imgsz: int) -> str:
+    """Exporta un YOLO (.pt o repo de HF del detector) a ONNX FP32 de tamaño fijo."""
+    if model_ref.endswith('.onnx'):
+        return model_ref
+    from lpr.detector.yolo_detector import load_detector
+    model = load_detector(model_ref)
+    return model.export(format='onnx', imgsz=imgsz, dynamic=False, simplify=True)
+
+
+# --- validación -------------------------------------------------------------------
+
+def _timed(session, feed) -> Tuple[list, float]:
+    t0 = time.perf_counter()
+    out = session.run(None, feed)
+    return out, (time.perf_counter() - t0) * 1000.0
+
+
+def validate(kind: str, fp32_path: str, int8_path: str, paths: List[str]) -> Dict:
+    ref, test = _session(fp32_path), _session(int8_path)
+    inp = ref.get_inputs()[0]
+    ms_ref, ms_test = [], []
+    if kind == 'ocr':
+        dtype = np.float32 if 'float' in inp.type else np.uint8
+        exact, prob_delta = 0, []
+        for path in paths:
+            img = cv2.imread(path)
+            if img is None:
+                continue
+            feed = {inp.name: ocr_input(img, inp.shape, dtype)}
+            (a, *_), t_a = _timed(ref, feed)
+            (b, *_), t_b = _timed(test, feed)
+            ms_ref.append(t_a)
+            ms_test.append(t_b)
+            exact += int(np.array_equal(a.argmax(axis=-1), b.argmax(axis=-1)))
+            prob_delta.append(float(np.abs(a - b).max()))
+        n = len(ms_ref)
+        report = {'images': n, 'agreement': exact / n if n else 0.0,
+                  'max_prob_delta_mean': float(np.mean(prob_delta)) if prob_delta else None}
+    else:
+        size = int(inp.shape[2])
+        totals = {'ref': 0, 'test': 0, 'matched': 0}
+        conf_delta = []
+        for path in paths:
+            img = cv2.imread(path)
+            if img is None:
+                continue
+            feed = {inp.name: letterbox(img, size)[0]}
+            (a, *_), t_a = _timed(ref, feed)
+            (b, *_), t_b = _timed(test, feed)
+            ms_ref.append(t_a)
+            ms_test.append(t_b)
+            m = match_detections(decode_yolo(a), decode_yolo(b))
+            for k in totals:
+                totals[k] += m[k]
+            conf_delta.extend(m['conf_delta'])
+        recall = totals['matched'] / totals['ref'] if totals['ref'] else 1.0
+        precision = totals['matched'] / totals['test'] if totals['test'] else 1.0
+        report = dict(totals, images=len(ms_ref), recall=recall, precision=precision,
+                      agreement=min(recall, precision),
+                      conf_delta_mean=float(np.mean(conf_delta)) if conf_delta else None)
+    report['fp32_ms'] = float(np.mean(ms_ref)) if ms_ref else None
+    report['int8_ms'] = float(np.mean(ms_test)) if ms_test else None
+    if ms_ref and ms_test:
+        report['speedup'] = report['fp32_ms'] / max(report['int8_ms'], 1e-9)
+    return report
+
+
+# --- recolección desde video ---------------------------------------------------
+
+def collect(video: str, out_dir: str, every: float, crops: bool, max_frames: int) -> int:
+    frames_dir = os.path.join(out_dir, 'frames')
+    crops_dir = os.path.join(out_dir, 'crops')
+    os.makedirs(frames_dir, exist_ok=True)
+    detector = None
+    if crops:
+        from lpr.detector.yolo_detector import detect, load_detector
+        from lpr.settings import settings
+        model = load_detector(settings.LPR_DETECTOR_MODEL)
+        detector = lambda frame: detect(model, frame, settings.LPR_MIN_DET_CONF)
+        os.makedirs(crops_dir, exist_ok=True)
+    cap = cv2.VideoCapture(video)
+    stem = os.path.splitext(os.path.basename(video))[0]
+    saved, next_t = 0, 0.0
+    while saved < max_frames:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        t = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        if t < next_t:
+            continue
+        next_t = t + every
+        name = f'{stem}_{int(t * 1000):09d}'
+        cv2.imwrite(os.path.join(frames_dir, name + '.jpg'), frame, [int(cv2.IMWRITE_JPEG_QUALITY), 95])
+        if detector is not None:
+            h, w = frame.shape[:2]
+            for i, det in enumerate(detector(frame).clipped(w, h)):
+                cv2.imwrite(os.path.join(crops_dir, f'{name}_{i}.jpg'), frame[det.y1:det.y2, det.x1:det.x2])
+        saved += 1
+    cap.release()
+    return saved
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(prog='lpr.quantize', description='Cuantización INT8 de los modelos LPR')
+    sub = parser.add_subparsers(dest='cmd', required=True)
+
+    p = sub.add_parser('collect', help='extraer frames (y crops) de calibración de un video')
+    p.add_argument('--video', required=True)
+    p.add_argument('--out', required=True)
+    p.add_argument('--every', type=float, default=1.0, help='segundos entre frames')
+    p.add_argument('--crops', action='store_true', help='recortar patentes con el detector FP32')
+    p.add_argument('--max-frames', type=int, default=2000)
+
+    for name, imgsz, default_model in (('detector', 640, None), ('person', 960, 'yolo11n.pt')):
+        p = sub.add_parser(name, help=f'cuantizar el modelo {name}')
+        p.add_argument('--model', default=default_model, help='.pt, repo de HF o .onnx FP32')
+        p.add_argument('--imgsz', type=int, default=imgsz)
+        p.add_argument('--calib', required=True, help='directorio de frames')
+        p.add_argument('--out', required=True)
+
+    p = sub.add_parser('ocr', help='cuantizar el modelo ONNX del OCR')
+    p.add_argument('--onnx', required=True, help='modelo ONNX FP32 de fast-plate-ocr')
+    p.add_argument('--calib', required=True, help='directorio de crops de patente')
+    p.add_argument('--out', required=True)
+
+    p = sub.add_parser('validate', help='comparar INT8 contra FP32 en el conjunto reservado')
+    p.add_argument('--kind', choices=('detector', 'ocr'), required=True, help="'detector' también sirve para personas")
+    p.add_argument('--fp32', required=True)
+    p.add_argument('--int8', required=True)
+    p.add_argument('--images', required=True)
+    p.add_argument('--min-agreement', type=float, default=0.97)
+    p.add_argument('--report', help='guardar el reporte JSON')
+
+    args = parser.parse_args(argv)
+    if args.cmd == 'collect':
+        print(f'{collect(args.video, args.out, args.every, args.crops, args.max_frames)} frames guardados')
+    elif args.cmd in ('detector', 'person'):
+        model = args.model
+        if model is None:
+            from lpr.settings import settings
+            model = settings.LPR_DETECTOR_MODEL
+        fp32 = export_yolo(model, args.imgsz)
+        calib = split(list_images(args.calib), holdout=False)
+        quantize_onnx(fp32, args.out, calib, lambda img: letterbox(img, args.imgsz)[0])
+    elif args.cmd == 'ocr':
+        inp = _session(args.onnx).get_inputs()[0]
+        dtype = np.float32 if 'float' in inp.type else np.uint8
+        calib = split(list_images(args.calib), holdout=False)
+        quantize_onnx(args.onnx, args.out, calib, lambda img: ocr_input(img, inp.shape, dtype))
+    elif args.cmd == 'validate':
+        report = validate(args.kind, args.fp32, args.int8, split(list_images(args.images), holdout=True))
+        text = json.dumps(report, indent=2)
+        print(text)
+        if args.report:
+            with open(args.report, 'w', encoding='utf-8') as f:
+                f.write(text)
+        if report['agreement'] < args.min_agreement:
+            print(f"Concordancia {report['agreement']:.3f} < {args.min_agreement}: no usar el modelo INT8", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -22,6 +22,39 @@ class Settings(BaseSettings):
     WORKER_MANAGER_HOST: str = '0.0.0.0'
     WORKER_MANAGER_RELOAD: bool = False
     WORKER_MANAGER_WORKERS: int = 1
+    # Modo multi-cámara: número de procesos host (≈ uno por grupo de cores) entre
+    # los que el manager reparte las cámaras. 0 = un proceso por cámara (legacy).
+    WORKER_HOST_PROCESSES: int = Field(0, ge=0)
+    # Cada cuántos segundos el manager revisa los procesos host y re-lanza los muertos
+    WORKER_HOST_CHECK_INTERVAL: float = Field(5.0, gt=0)
+    # Segundos que se espera a un worker tras SIGTERM antes de mandarle SIGKILL
+    WORKER_STOP_TIMEOUT: float = Field(10.0, gt=0)
+    # Reserva de procesos pre-calentados (modelos ya cargados) que se entregan a
+    # una cámara al registrarla en modo proceso-por-cámara; y qué modelos
+    # precargan ('patente', 'guardia' o ambos separados por coma). 0 = apagado;
+    # con 1 o más cada proceso en reserva ocupa la RAM de sus modelos sin cámara.
+    WORKER_PREWARM_POOL: int = Field(0, ge=0)
+    WORKER_PREWARM_MODES: str = 'patente'
+    # Reconciliación con el backend: corre en segundo plano al iniciar y se repite
+    # cada WORKER_RECONCILE_INTERVAL segundos (0 = solo al inicio); las fuentes
+    # se piden con esa concurrencia y los workers se arrancan espaciados.
+    WORKER_RECONCILE_INTERVAL: float = Field(300.0, ge=0)
+    WORKER_RECONCILE_CONCURRENCY: int = Field(8, ge=1)
+    WORKER_RECONCILE_STAGGER: float = Field(1.0, ge=0)
+    # Presupuesto de CPU: CPUs que el manager reparte entre sus procesos (ej. '0-7';
+    # vacío = las del propio manager), hilos de inferencia por proceso (0 = auto:
+    # CPUs / hosts en modo multi-cámara, 1 en modo proceso-por-cámara) y si se fija
+    # la afinidad (sched_setaffinity) de cada proceso a sus CPUs.
+    WORKER_CPU_SET: Optional[str] = None
+    WORKER_THREADS_PER_PROCESS: int = Field(0, ge=0)
+    WORKER_PIN_CPUS: bool = True
+    # Dedupe de patentes entre cámaras (en el manager): grupos de cámaras que ven
+    # el mismo auto, 'porton=cam1,cam2@30; salida=cam3,cam4' (@segundos opcional,
+    # si no WORKER_DEDUP_WINDOW). Una patente emitida por una cámara del grupo no
+    # se vuelve a emitir desde otra dentro de la ventana. Vacío = apagado. El estado
+    # vive en memoria del proceso manager: incompatible con WORKER_MANAGER_WORKERS > 1.
+    WORKER_DEDUP_GROUPS: str = ''
+    WORKER_DEDUP_WINDOW: float = Field(30.0, gt=0)
 
     # LPR worker
     LPR_RTSP_URL: Optional[str] = None
@@ -31,6 +64,12 @@ class Settings(BaseSettings):
     LPR_DRY_RUN: bool = False
     LPR_DETECTOR_MODEL: str = 'morsetechlab/yolov11-license-plate-detection'
     LPR_OCR_MODEL: str = 'cct-s-v1-global-model'
+    # Modelo de personas del guardia (.pt, o el .onnx INT8 de `python -m lpr.quantize person`)
+    LPR_PERSON_MODEL: str = 'yolo11n.pt'
+    # OCR desde un ONNX propio (p. ej. el INT8 de `python -m lpr.quantize ocr`) en vez
+    # del modelo de LPR_OCR_MODEL; el config YAML es el del modelo FP32 original.
+    LPR_OCR_ONNX_PATH: Optional[str] = None
+    LPR_OCR_CONFIG_PATH: Optional[str] = None
     LPR_MIN_DET_CONF: float = 0.3
     LPR_DETECTIONS_DIR: str = './lpr/detecciones'
     LPR_SAVE_CROPS_DIR: str = './lpr/detecciones/crops'
@@ -48,10 +87,144 @@ class Settings(BaseSettings):
     LPR_CONFIRM_SECONDS: float = 5.0
     LPR_COMBINED_ALPHA: float = 0.75
     LPR_COMBINED_THRESHOLD: float = 0.3
+    # Mejor imagen por patente/persona: el evento lleva la lectura de mayor puntaje
+    # (confianzas, nitidez, tamaño) entre las vistas antes de confirmar. Un
+    # candidato de más de LPR_BEST_SHOT_MAX_AGE s cede ante uno nuevo; una
+    # patente/track sin lecturas durante LPR_BEST_SHOT_TTL s se descarta.
+    LPR_BEST_SHOT_ENABLED: bool = True
+    LPR_BEST_SHOT_MAX_AGE: float = Field(3.0, gt=0)
+    LPR_BEST_SHOT_TTL: float = Field(10.0, gt=0)
+    # Formatos de patente para decodificar el OCR ('B' = letra chilena
+    # BCDFGHJKLPRSTVWXYZ, 'A' = letra A-Z, '9' = dígito); vacío = top-1 del modelo.
+    LPR_PLATE_FORMATS: str = 'BBBB99,AA9999,BBB99,AA999'
     # plate regex may be empty in .env; treat empty as unset/None
     LPR_PLATE_REGEX: Optional[str] = None
     LPR_MIN_CHAR_CONF: float = Field(0.30, ge=0, le=1)
     LPR_INCLUDE_SNAPSHOT: bool = True
+    # Calidad JPEG única para frames de detección, crops y snapshots: cada imagen
+    # se codifica una vez y los mismos bytes van a disco, Cloudinary y base64.
+    LPR_JPEG_QUALITY: int = Field(85, ge=1, le=100)
+    # Persistencia en segundo plano (frames de detección, metadata y crops):
+    # tamaño máximo de la cola (bajo presión se descartan primero los crops de
+    # debug), hilos escritores y cada cuántos segundos se loguean sus métricas.
+    LPR_PERSIST_QUEUE_SIZE: int = Field(64, ge=1)
+    LPR_PERSIST_THREADS: int = Field(2, ge=1)
+    LPR_PERSIST_STATS_INTERVAL: float = Field(60.0, ge=0)
+    # Retención en disco por categoría (crops bad/lowq/pending/high, detections,
+    # anomalies, clips): cuota en MB y antigüedad máxima en horas; al superarlas se
+    # borran los archivos más viejos. Categorías sin límite no se tocan.
+    LPR_RETENTION_ENABLED: bool = True
+    LPR_RETENTION_QUOTAS_MB: str = 'bad=100,lowq=100,pending=200,high=500,detections=2000,anomalies=1000,clips=2000'
+    LPR_RETENTION_MAX_AGE_HOURS: str = 'bad=24,lowq=24,pending=24,high=168,detections=720,anomalies=720,clips=168'
+    # Cada cuánto se re-escanean los directorios (otros procesos escriben en ellos)
+    LPR_RETENTION_RESCAN_INTERVAL: float = Field(3600.0, ge=0)
+    # Log append-only de detecciones/anomalías (JSON Lines, imágenes por
+    # referencia): directorio, tamaño de cada segmento en MB y cuántos
+    # segmentos se conservan antes de borrar los más viejos.
+    LPR_EVENT_LOG_DIR: str = './lpr/detecciones/events'
+    LPR_EVENT_LOG_SEGMENT_MB: float = Field(16.0, gt=0)
+    LPR_EVENT_LOG_MAX_SEGMENTS: int = Field(64, ge=1)
+    # Índice local SQLite (WAL) de todas las lecturas OCR y emisiones: archivo,
+    # filas por lote, segundos máximos antes de escribir un lote incompleto y
+    # antigüedad máxima de las filas en horas (0 = no se borran).
+    LPR_SIGHTINGS_ENABLED: bool = True
+    LPR_SIGHTINGS_DB: str = './lpr/detecciones/sightings.db'
+    LPR_SIGHTINGS_BATCH_SIZE: int = Field(500, ge=1)
+    LPR_SIGHTINGS_FLUSH_INTERVAL: float = Field(1.0, gt=0)
+    LPR_SIGHTINGS_MAX_AGE_HOURS: float = Field(720.0, ge=0)
+    # Caché local de acceso: patentes autorizadas y visitas del condominio de
+    # cada cámara, sincronizadas (delta) cada LPR_ACCESS_SYNC_INTERVAL segundos y
+    # completas cada LPR_ACCESS_FULL_SYNC_INTERVAL; el worker decide localmente
+    # al confirmar y manda la decisión en meta.local_decision.
+    LPR_ACCESS_CACHE_ENABLED: bool = True
+    LPR_ACCESS_SYNC_INTERVAL: float = Field(15.0, gt=0)
+    LPR_ACCESS_FULL_SYNC_INTERVAL: float = Field(600.0, gt=0)
+    # Dedupe entre cámaras: URL del manager (`/dedup/claim`; el manager la completa
+    # al lanzar workers si tiene WORKER_DEDUP_GROUPS) y tiempo máximo de espera;
+    # si el manager no responde a tiempo el evento se emite igual.
+    LPR_DEDUP_URL: str = ''
+    LPR_DEDUP_TIMEOUT: float = Field(0.25, gt=0)
+    # Backend de captura: 'opencv' (decodifica todo) o 'pyav' (requiere `av`;
+    # solo convierte los frames muestreados, opcionalmente decodifica solo
+    # keyframes y reduce a LPR_CAPTURE_MAX_WIDTH px de ancho, 0 = sin cambio).
+    LPR_CAPTURE_BACKEND: str = 'opencv'
+    LPR_CAPTURE_KEYFRAMES_ONLY: bool = False
+    LPR_CAPTURE_MAX_WIDTH: int = Field(0, ge=0)
+    # Reconexión del stream: segundos sin frames para darlo por caído, backoff
+    # inicial/máximo (exponencial con jitter) y cada cuánto se loguean sus métricas.
+    LPR_CAPTURE_STALL_TIMEOUT: float = Field(10.0, gt=0)
+    LPR_CAPTURE_BACKOFF: float = Field(1.0, gt=0)
+    LPR_CAPTURE_MAX_BACKOFF: float = Field(60.0, gt=0)
+    LPR_CAPTURE_STATS_INTERVAL: float = Field(60.0, ge=0)
+    # Doble stream (vacío = apagado): plantilla del sub-stream ('{url}' = URL de la
+    # cámara, p. ej. '{url}_sub'). Se detecta sobre el sub-stream y el OCR/las
+    # imágenes usan el frame del stream principal más cercano (a lo sumo
+    # LPR_MAIN_MAX_SKEW s), de una ventana de LPR_MAIN_WINDOW_SECONDS segundos.
+    # Con LPR_MAIN_REFINE las cajas escaladas se re-detectan en el stream principal
+    # y las primeras LPR_MAIN_CALIBRATION_HITS patentes miden el desfase entre los
+    # relojes de ambos streams (0 = no medir, se asume desfase 0).
+    LPR_SUBSTREAM_URL: str = ''
+    LPR_MAIN_WINDOW_SECONDS: float = Field(3.0, gt=0)
+    LPR_MAIN_MAX_SKEW: float = Field(0.5, gt=0)
+    LPR_MAIN_REFINE: bool = True
+    LPR_MAIN_CALIBRATION_HITS: int = Field(5, ge=0)
+    # Presupuesto de latencia: frames con más de LPR_MAX_FRAME_AGE segundos
+    # desde su captura se descartan sin procesar (0 = no descartar); cada
+    # LPR_LATENCY_REPORT_INTERVAL segundos se loguean los histogramas por cámara.
+    LPR_MAX_FRAME_AGE: float = Field(2.0, ge=0)
+    LPR_LATENCY_REPORT_INTERVAL: float = Field(60.0, ge=0)
+    # Métricas por cámara (captura, latencia, etapas, caché de OCR): cada proceso
+    # worker las escribe en LPR_STATS_DIR cada LPR_STATS_INTERVAL segundos (0 =
+    # solo cuando el manager las pide) y el manager las sirve en GET /stats; las
+    # de etapas (cola, descartes) y los aciertos de la caché de OCR se loguean
+    # además cada LPR_LATENCY_REPORT_INTERVAL.
+    LPR_STATS_DIR: str = './lpr/logs/stats'
+    LPR_STATS_INTERVAL: float = Field(10.0, ge=0)
+    # Clips pre/post evento (apagado por defecto): cada cámara guarda en memoria
+    # los últimos segundos como JPEG (muestreados a LPR_CLIP_FPS, reducidos a
+    # LPR_CLIP_MAX_WIDTH, como mucho LPR_CLIP_BUFFER_MB) y ante una emisión o
+    # anomalía escribe un MP4 con LPR_CLIP_PRE_SECONDS antes y _POST_ después.
+    LPR_CLIPS_ENABLED: bool = False
+    LPR_CLIPS_DIR: str = './lpr/detecciones/clips'
+    LPR_CLIP_PRE_SECONDS: float = Field(5.0, ge=0)
+    LPR_CLIP_POST_SECONDS: float = Field(5.0, ge=0)
+    LPR_CLIP_FPS: float = Field(5.0, gt=0)
+    LPR_CLIP_MAX_WIDTH: int = Field(1280, ge=0)
+    LPR_CLIP_JPEG_QUALITY: int = Field(70, ge=1, le=100)
+    LPR_CLIP_BUFFER_MB: float = Field(32.0, gt=0)
+    # Muestreo de imágenes de calibración para la cuantización INT8 (vacío =
+    # apagado): cada LPR_CALIBRATION_EVERY segundos por cámara se guarda el frame
+    # y los crops de patente, hasta LPR_CALIBRATION_MAX_SAMPLES por carpeta.
+    LPR_CALIBRATION_DIR: Optional[str] = None
+    LPR_CALIBRATION_EVERY: float = Field(30.0, gt=0)
+    LPR_CALIBRATION_MAX_SAMPLES: int = Field(1000, ge=1)
+    # Límite de hilos intra-op (torch/ORT/OpenCV) y CPUs del proceso worker;
+    # normalmente los fija el manager vía entorno al lanzar el proceso.
+    LPR_NUM_THREADS: Optional[int] = Field(None, ge=1)
+    LPR_CPU_SET: Optional[str] = None
+    # Pipeline por etapas del worker de patentes: tareas simultáneas de detección
+    # y de OCR por cámara (reglas y envío siempre 1) y tamaño de cada cola
+    # entre etapas; si la de entrada se llena se descarta el frame más viejo.
+    # El YOLO de ultralytics no es thread-safe: más de 1 en detección solo con
+    # el pool de procesos (el OCR sobre ONNX Runtime sí lo es).
+    LPR_PIPELINE_DETECT_WORKERS: int = Field(1, ge=1)
+    LPR_PIPELINE_OCR_WORKERS: int = Field(2, ge=1)
+    LPR_PIPELINE_QUEUE_SIZE: int = Field(4, ge=1)
+    # Caché de OCR para autos detenidos: entradas por cámara (0 = apagado),
+    # segundos de vida de cada lectura, bits de diferencia tolerados del dHash
+    # (256 bits) y superposición mínima de la caja con la lectura cacheada.
+    LPR_OCR_CACHE_SIZE: int = Field(32, ge=0)
+    LPR_OCR_CACHE_TTL: float = Field(10.0, gt=0)
+    LPR_OCR_CACHE_MAX_DISTANCE: int = Field(3, ge=0)
+    LPR_OCR_CACHE_MIN_IOU: float = Field(0.8, ge=0, le=1)
+    # Pool de procesos para detección y OCR (0 = en el mismo proceso): cada hijo
+    # carga los modelos y recibe los frames por memoria compartida, en slots de
+    # LPR_PROC_POOL_SLOT_MB (frames más grandes se serializan). Con el pool
+    # conviene LPR_PIPELINE_DETECT_WORKERS = LPR_PROC_POOL_WORKERS.
+    LPR_PROC_POOL_WORKERS: int = Field(0, ge=0)
+    LPR_PROC_POOL_SLOT_MB: float = Field(8.0, gt=0)
+    # Hilos del executor compartido por todas las cámaras de un host multi-cámara
+    LPR_HOST_EXECUTOR_THREADS: int = Field(4, ge=1)
     LPR_WORKER_TOKEN: Optional[str] = None
     # Tarea #21 (backend/docs/modulos/auth-multitenant.md §11+, hardening de
     # ingesta LPR): API key de servicio (plugin `apiKey` de better-auth) que
@@ -75,6 +248,11 @@ class Settings(BaseSettings):
     CLOUDINARY_DELETE_LOCAL: bool = False
     CLOUDINARY_UPLOAD_RETRIES: int = 3
     CLOUDINARY_RETRY_BACKOFF: float = 1.0
+    # Subidas en segundo plano: subidas simultáneas, spool en disco de las que
+    # fallaron (sobrevive reinicios) e intentos totales antes de abandonarlas.
+    CLOUDINARY_UPLOAD_CONCURRENCY: int = Field(2, ge=1)
+    CLOUDINARY_SPOOL_DIR: str = './lpr/detecciones/upload_spool'
+    CLOUDINARY_SPOOL_MAX_ATTEMPTS: int = Field(20, ge=1)
 
     class Config:
         env_file = str(Path(__file__).parent / '.env')
@@ -104,6 +282,14 @@ class Settings(BaseSettings):
             self.LPR_DETECTIONS_DIR = _resolve(self.LPR_DETECTIONS_DIR)
             self.LPR_SAVE_CROPS_DIR = _resolve(self.LPR_SAVE_CROPS_DIR)
             self.LPR_SAVE_FRAMES_DIR = _resolve(self.LPR_SAVE_FRAMES_DIR)
+            self.CLOUDINARY_SPOOL_DIR = _resolve(self.CLOUDINARY_SPOOL_DIR)
+            self.LPR_EVENT_LOG_DIR = _resolve(self.LPR_EVENT_LOG_DIR)
+            self.LPR_SIGHTINGS_DB = _resolve(self.LPR_SIGHTINGS_DB)
+            self.LPR_CLIPS_DIR = _resolve(self.LPR_CLIPS_DIR)
+            self.LPR_STATS_DIR = _resolve(self.LPR_STATS_DIR)
+            self.LPR_CALIBRATION_DIR = _resolve(self.LPR_CALIBRATION_DIR)
+            self.LPR_OCR_ONNX_PATH = _resolve(self.LPR_OCR_ONNX_PATH)
+            self.LPR_OCR_CONFIG_PATH = _resolve(self.LPR_OCR_CONFIG_PATH)
         except Exception:
             # non-fatal: leave values as-is
             pass
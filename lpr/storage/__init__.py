@@ -0,0 +1 @@
+"""Módulo de persistencia (sistemas de archivos, S3, etc.)."""
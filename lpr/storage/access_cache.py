@@ -0,0 +1,331 @@
+"""Caché local de patentes autorizadas y visitas vigentes, por condominio.
+
+Después de confirmar una patente el worker decide en memoria (microsegundos,
+también con el backend caído) con la misma lógica que
+`DetectionsService.createDetection` en el backend:
+
+- vehículo activo residente/permanente o de otro tipo no visitante -> Permitido;
+- vehículo activo visitante/temporal -> Permitido solo con visita vigente;
+- sin vehículo: visita vigente -> Permitido, si no -> Pendiente (conserje);
+- vehículo inactivo -> Pendiente.
+
+La decisión local viaja en `meta.local_decision` del evento (el backend la
+compara con la suya y sigue siendo la que vale) y se loguea al instante; el
+envío del evento sigue en su etapa del pipeline.
+
+Un hilo sincroniza cada `LPR_ACCESS_SYNC_INTERVAL` segundos contra
+`GET /detections/access-snapshot`: delta desde el `serverTime` anterior (los
+vehículos desactivados y las visitas terminadas llegan en el delta y salen del
+índice) y snapshot completo cada `LPR_ACCESS_FULL_SYNC_INTERVAL` para
+enterarse de los borrados. Un snapshot por condominio: las cámaras del mismo
+condominio lo comparten.
+
+Además del índice exacto hay uno de "comodines" (la patente con un carácter
+reemplazado por '*'), así una lectura desconocida informa en O(largo) las
+patentes conocidas a un carácter de distancia (posible error de OCR). Eso
+nunca autoriza: solo queda como pista en la razón.
+"""
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Optional, Set
+
+from lpr.processor.rules import normalize_plate
+from lpr.settings import settings
+
+ALLOWED, DENIED, PENDING = 'Permitido', 'Denegado', 'Pendiente'
+# estados de visita que `validateAccess` puede aceptar
+_OPEN_VISIT = ('pending', 'active', 'ready')
+# solapamiento del delta: filas que se confirmaron justo mientras el backend respondía
+_DELTA_OVERLAP = 2.0
+
+
+def _epoch(value) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+class LocalDecision(NamedTuple):
+    decision: str
+    reason: str
+    is_exit: bool = False
+    similar: tuple = ()
+    snapshot_age: Optional[float] = None
+
+    def as_meta(self, latency_ms: float) -> Dict:
+        meta = {'decision': self.decision, 'reason': self.reason, 'is_exit': self.is_exit,
+                'latency_ms': round(latency_ms, 3)}
+        if self.similar:
+            meta['similar'] = list(self.similar)
+        if self.snapshot_age is not None:
+            meta['snapshot_age_s'] = round(self.snapshot_age, 1)
+        return meta
+
+
+class AccessSnapshot:
+    """Vehículos y visitas vehiculares de un condominio, indexados por patente."""
+
+    def __init__(self):
+        self.vehicles: Dict[str, Dict] = {}            # patente -> vehículo
+        self.visits: Dict[str, Dict] = {}              # id -> visita
+        self._visits_by_plate: Dict[str, Set[str]] = {}
+        self._wildcards: Dict[str, Set[str]] = {}      # 'BB*D12' -> {'BBCD12', ...}
+        self.server_time: Optional[str] = None
+        self.synced_at: Optional[float] = None         # epoch local de la última sincronización
+        self.full_synced_at: Optional[float] = None
+
+    # --- índice -----------------------------------------------------------------
+
+    @staticmethod
+    def _wildcard_keys(plate: str) -> List[str]:
+        return [plate[:i] + '*' + plate[i + 1:] for i in range(len(plate))]
+
+    def _index(self, plate: str):
+        for key in self._wildcard_keys(plate):
+            self._wildcards.setdefault(key, set()).add(plate)
+
+    def _unindex(self, plate: str):
+        if plate in self.vehicles or self._visits_by_plate.get(plate):
+            return  # la patente sigue conocida por otro registro
+        for key in self._wildcard_keys(plate):
+            plates = self._wildcards.get(key)
+            if plates is not None:
+                plates.discard(plate)
+                if not plates:
+                    del self._wildcards[key]
+
+    def _put_vehicle(self, row: Dict):
+        plate = normalize_plate(row.get('plate') or '')
+        if not plate:
+            return
+        old = self.vehicles.pop(plate, None)
+        # un desactivado se guarda igual: su decisión no es la de una patente desconocida
+        self.vehicles[plate] = {'vehicleType': row.get('vehicleType'), 'accessLevel': row.get('accessLevel'),
+                                'active': row.get('active') is not False}
+        if old is None:
+            self._index(plate)
+
+    def _put_visit(self, row: Dict):
+        visit_id = row.get('id')
+        if not visit_id:
+            return
+        self._drop_visit(visit_id)
+        plate = normalize_plate(row.get('plate') or '')
+        if not plate or row.get('status') not in _OPEN_VISIT:
+            return  # terminada/cancelada: el delta la saca
+        self.visits[visit_id] = {'plate': plate, 'status': row.get('status'),
+                                 'valid_from': _epoch(row.get('validFrom')), 'valid_until': _epoch(row.get('validUntil')),
+                                 'max_uses': row.get('maxUses'), 'used_count': row.get('usedCount') or 0}
+        ids = self._visits_by_plate.setdefault(plate, set())
+        if not ids:
+            self._index(plate)
+        ids.add(visit_id)
+
+    def _drop_visit(self, visit_id: str):
+        old = self.visits.pop(visit_id, None)
+        if old is None:
+            return
+        ids = self._visits_by_plate.get(old['plate'], set())
+        ids.discard(visit_id)
+        if not ids:
+            self._visits_by_plate.pop(old['plate'], None)
+            self._unindex(old['plate'])
+
+    def apply(self, data: Dict, now: Optional[float] = None):
+        """Aplica una respuesta de `access-snapshot` (completa o delta)."""
+        now = time.time() if now is None else now
+        if data.get('full'):
+            self.vehicles, self.visits = {}, {}
+            self._visits_by_plate, self._wildcards = {}, {}
+            self.full_synced_at = now
+        for row in data.get('vehicles') or []:
+            self._put_vehicle(row)
+        for row in data.get('visits') or []:
+            self._put_visit(row)
+        self.server_time = data.get('serverTime') or self.server_time
+        self.synced_at = now
+
+    # --- consulta ---------------------------------------------------------------
+
+    def _valid_visit(self, plate: str, now: float) -> Optional[Dict]:
+        for visit_id in self._visits_by_plate.get(plate, ()):
+            visit = self.visits[visit_id]
+            if visit['valid_from'] is not None and now < visit['valid_from']:
+                continue
+            if visit['valid_until'] is not None and now > visit['valid_until']:
+                continue
+            if (visit['status'] == 'ready' and visit['max_uses'] is not None
+                    and visit['used_count'] >= visit['max_uses']):
+                continue
+            return visit
+        return None
+
+    def similar(self, plate: str) -> List[str]:
+        """Patentes conocidas a un carácter de distancia (mismo largo)."""
+        found = set()
+        for key in self._wildcard_keys(plate):
+            found.update(self._wildcards.get(key, ()))
+        found.discard(plate)
+        return sorted(found)
+
+    def decide(self, plate: str, now: Optional[float] = None) -> LocalDecision:
+        now = time.time() if now is None else now
+        plate = normalize_plate(plate)
+        age = now - self.synced_at if self.synced_at else None
+        vehicle = self.vehicles.get(plate)
+        if vehicle is not None and not vehicle['active']:
+            return LocalDecision(PENDING, 'Vehículo inactivo', snapshot_age=age)
+        if vehicle is not None:
+            vehicle_type, level = vehicle['vehicleType'], vehicle['accessLevel']
+            if vehicle_type == 'residente' or level == 'permanente':
+                return LocalDecision(ALLOWED, 'Vehículo residente', snapshot_age=age)
+            if not (vehicle_type == 'visitante' or level == 'temporal'):
+                return LocalDecision(ALLOWED, 'Vehículo registrado', snapshot_age=age)
+        visit = self._valid_visit(plate, now)
+        if visit is not None:
+            is_exit = visit['status'] == 'active'
+            return LocalDecision(ALLOWED, 'Salida de visita' if is_exit else 'Entrada de visita', is_exit, snapshot_age=age)
+        if vehicle is not None:
+            return LocalDecision(DENIED, 'Visita no válida o expirada', snapshot_age=age)
+        return LocalDecision(PENDING, 'Vehículo no registrado y sin visita autorizada',
+                             similar=tuple(self.similar(plate)), snapshot_age=age)
+
+
+class AccessCache:
+    """Snapshots por condominio + hilo de sincronización con el backend."""
+
+    def __init__(self, sync_interval: float = 15.0, full_sync_interval: float = 600.0, fetch=None):
+        if fetch is None:
+            from lpr.api.client import fetch_access_snapshot as fetch
+        self.sync_interval = float(sync_interval)
+        self.full_sync_interval = float(full_sync_interval)
+        self._fetch = fetch
+        self._lock = threading.Lock()
+        self._cameras: Dict[str, Dict] = {}             # cámara -> {'backend_url', 'org'}
+        self._snapshots: Dict[str, AccessSnapshot] = {}  # organizationId -> snapshot
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._failing = False
+        self._counters = {'syncs': 0, 'full_syncs': 0, 'errors': 0, 'decisions': 0, 'no_snapshot': 0}
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, camera_id: str, backend_url: str):
+        """Agrega la cámara a la sincronización (la primera vez sincroniza de inmediato)."""
+        with self._lock:
+            if camera_id in self._cameras:
+                return
+            self._cameras[camera_id] = {'backend_url': backend_url, 'org': None}
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='access-cache', daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def unregister(self, camera_id: str):
+        """Saca la cámara de la sincronización; el snapshot de un condominio sin cámaras se descarta."""
+        with self._lock:
+            if self._cameras.pop(camera_id, None) is not None:
+                self._drop_orphans()
+
+    def _drop_orphans(self):
+        # llamar con self._lock tomado
+        orgs = {info['org'] for info in self._cameras.values()}
+        for org in [org for org in self._snapshots if org not in orgs]:
+            del self._snapshots[org]
+
+    def decide(self, camera_id: str, plate: str) -> Optional[LocalDecision]:
+        """Decisión local, o None si el condominio de la cámara todavía no se sincronizó."""
+        with self._lock:
+            org = (self._cameras.get(camera_id) or {}).get('org')
+            snapshot = self._snapshots.get(org) if org else None
+            if snapshot is None:
+                self._counters['no_snapshot'] += 1
+                return None
+            self._counters['decisions'] += 1
+            return snapshot.decide(plate)
+
+    # --- sincronización -----------------------------------------------------------
+
+    def _run(self):
+        while not self._closed.is_set():
+            self.sync_once()
+            self._wake.wait(self.sync_interval)
+            self._wake.clear()
+
+    def sync_once(self):
+        with self._lock:
+            cameras = dict((cam, dict(info)) for cam, info in self._cameras.items())
+        done: Set[str] = set()
+        for camera_id, info in cameras.items():
+            org = info['org']
+            if org is not None and org in done:
+                continue  # otra cámara del mismo condominio ya lo sincronizó
+            with self._lock:
+                snapshot = self._snapshots.get(org) if org else None
+                full = (snapshot is None or snapshot.full_synced_at is None
+                        or time.time() - snapshot.full_synced_at >= self.full_sync_interval)
+                since = None
+                if not full:
+                    server_epoch = _epoch(snapshot.server_time)
+                    since = (datetime.fromtimestamp(server_epoch - _DELTA_OVERLAP, timezone.utc).isoformat(timespec='milliseconds')
+                             if server_epoch else None)
+                    full = since is None
+            try:
+                data = self._fetch(info['backend_url'], camera_id, since)
+            except Exception as e:
+                self._counters['errors'] += 1
+                if not self._failing:
+                    logging.warning('[ACCESS] No se pudo sincronizar la caché de acceso (%s); se usa la última copia', e)
+                self._failing = True
+                continue
+            if self._failing:
+                logging.info('[ACCESS] Sincronización de la caché de acceso restablecida')
+            self._failing = False
+            new_org = data.get('organizationId')
+            with self._lock:
+                if camera_id not in self._cameras:
+                    continue  # se dio de baja mientras se descargaba
+                if self._cameras[camera_id]['org'] != new_org:
+                    self._cameras[camera_id]['org'] = new_org
+                    self._drop_orphans()
+                if not new_org:
+                    continue  # cámara sin condominio: el backend deriva todo al conserje
+                if full:
+                    data = dict(data, full=True)
+                    self._counters['full_syncs'] += 1
+                snapshot = self._snapshots.setdefault(new_org, AccessSnapshot())
+                if not full and snapshot.full_synced_at is None:
+                    continue  # la cámara cambió de condominio: la próxima vuelta pide el completo
+                snapshot.apply(data)
+                self._counters['syncs'] += 1
+            done.add(new_org)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._counters, organizations=len(self._snapshots),
+                        plates=sum(len(s.vehicles) + len(s._visits_by_plate) for s in self._snapshots.values()))
+
+    def close(self):
+        self._closed.set()
+        self._wake.set()
+
+
+_CACHE: Optional[AccessCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_access_cache() -> Optional[AccessCache]:
+    """Caché del proceso (None si `LPR_ACCESS_CACHE_ENABLED` está apagado)."""
+    global _CACHE
+    if not settings.LPR_ACCESS_CACHE_ENABLED:
+        return None
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = AccessCache(settings.LPR_ACCESS_SYNC_INTERVAL, settings.LPR_ACCESS_FULL_SYNC_INTERVAL)
+            atexit.register(_CACHE.close)
+        return _CACHE
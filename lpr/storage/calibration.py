@@ -0,0 +1,83 @@
+"""Muestreo de imágenes de calibración para la cuantización INT8 (`lpr.quantize`).
+
+Con `LPR_CALIBRATION_DIR` configurado, cada worker guarda cada
+`LPR_CALIBRATION_EVERY` segundos (por cámara) el frame completo en
+`<dir>/frames` y, si el detector encontró patentes, sus crops en
+`<dir>/crops`, hasta `LPR_CALIBRATION_MAX_SAMPLES` archivos por carpeta. Así la
+calibración usa la iluminación, ángulos y compresión de nuestras cámaras. Las
+escrituras van a la cola de persistencia con prioridad baja.
+"""
+import glob
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+import cv2
+import numpy as np
+
+from lpr.settings import settings
+from lpr.storage.fs_storage import PRIORITY_LOW, get_persistence_queue
+
+
+class CalibrationSampler:
+    def __init__(self, directory: str, every: float = 30.0, max_samples: int = 1000):
+        self.directory = directory
+        self.every = float(every)
+        self.max_samples = int(max_samples)
+        self._lock = threading.Lock()
+        self._last: Dict[str, float] = {}
+        self._counts: Dict[str, int] = {}
+        for kind in ('frames', 'crops'):
+            os.makedirs(os.path.join(directory, kind), exist_ok=True)
+            self._counts[kind] = len(glob.glob(os.path.join(directory, kind, '*.jpg')))
+
+    def _take(self, kind: str, n: int = 1) -> int:
+        """Reserva hasta `n` lugares en la carpeta `kind`; devuelve cuántos quedan disponibles."""
+        with self._lock:
+            n = max(0, min(n, self.max_samples - self._counts[kind]))
+            self._counts[kind] += n
+            return n
+
+    def maybe_sample(self, camera_id: str, frame: np.ndarray, boxes: Iterable = ()) -> bool:
+        """Guarda el frame (y los crops de `boxes`, objetos con x1/y1/x2/y2) si ya toca para la cámara."""
+        now = time.time()
+        with self._lock:
+            if now - self._last.get(camera_id, 0.0) < self.every:
+                return False
+            self._last[camera_id] = now
+        stem = f'{camera_id}_{int(now * 1000)}'
+        images = []
+        if self._take('frames'):
+            images.append((os.path.join(self.directory, 'frames', stem + '.jpg'), frame.copy()))
+        boxes = list(boxes)
+        for i, b in enumerate(boxes[:self._take('crops', len(boxes))]):
+            crop = frame[b.y1:b.y2, b.x1:b.x2]
+            if crop.size:
+                images.append((os.path.join(self.directory, 'crops', f'{stem}_{i}.jpg'), crop.copy()))
+        if not images:
+            return False
+        get_persistence_queue().submit(lambda images=images: self._write(images), PRIORITY_LOW)
+        return True
+
+    @staticmethod
+    def _write(images):
+        # calidad alta: los artefactos JPEG cambian los rangos de activación
+        for path, img in images:
+            cv2.imwrite(path, img, [int(cv2.IMWRITE_JPEG_QUALITY), 95])
+
+
+_SAMPLER: Optional[CalibrationSampler] = None
+_SAMPLER_LOCK = threading.Lock()
+
+
+def get_calibration_sampler() -> Optional[CalibrationSampler]:
+    """Sampler del proceso (None si `LPR_CALIBRATION_DIR` está vacío)."""
+    global _SAMPLER
+    if not settings.LPR_CALIBRATION_DIR:
+        return None
+    with _SAMPLER_LOCK:
+        if _SAMPLER is None:
+            _SAMPLER = CalibrationSampler(settings.LPR_CALIBRATION_DIR, settings.LPR_CALIBRATION_EVERY,
+                                          settings.LPR_CALIBRATION_MAX_SAMPLES)
+        return _SAMPLER
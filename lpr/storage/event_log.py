@@ -0,0 +1,221 @@
+"""Registro append-only de detecciones y anomalías en segmentos JSON Lines.
+
+Reemplaza el `<det>.jpg.json` por detección: cada evento es una línea compacta
+en el segmento activo (`events-<fecha>-<pid>-<n>.jsonl`) y las imágenes van por
+referencia (ruta/URL, nunca el base64). Al superar `segment_bytes` se abre un
+segmento nuevo y se borran los más viejos por encima de `max_segments`.
+
+El índice en memoria (por patente y por cámara, con timestamp y offset) se
+arma recién con la primera consulta (`find()`): los workers solo escriben y
+nunca pagan la lectura de los segmentos. Desde ahí se mantiene leyendo
+incrementalmente lo nuevo de cada segmento, así que también ve los eventos que
+escriben otros procesos worker en el mismo directorio.
+
+Cada proceso toma un `flock` sobre su segmento activo y la rotación salta los
+segmentos bloqueados: un proceso nunca borra el segmento en uso de otro.
+"""
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # sin flock (Windows): solo se protege el segmento propio
+    fcntl = None
+
+from lpr.settings import settings
+
+# claves que no se guardan en el log (datos de imagen: van por referencia)
+_DROP_KEYS = ('snapshot_jpeg_b64',)
+
+
+def _strip_images(record: Dict) -> Dict:
+    out = {k: v for k, v in record.items() if k not in _DROP_KEYS}
+    if isinstance(out.get('meta'), dict):
+        out['meta'] = {k: v for k, v in out['meta'].items() if k not in _DROP_KEYS}
+    return out
+
+
+class EventLog:
+    def __init__(self, directory: str, segment_bytes: int = 16 * 1024 * 1024, max_segments: int = 64):
+        self.directory = directory
+        self.segment_bytes = max(1024, int(segment_bytes))
+        self.max_segments = max(1, int(max_segments))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = None
+        self._path: Optional[str] = None
+        self._seq = 0
+        # segmento -> bytes ya indexados; entradas (ts, kind, camera, plate, segmento, offset)
+        self._scanned: Dict[str, int] = {}
+        self._entries: List[tuple] = []
+        self._by_plate: Dict[str, List[int]] = {}
+        self._by_camera: Dict[str, List[int]] = {}
+        self._indexed = False  # el índice se arma con el primer find()
+
+    # --- escritura -----------------------------------------------------------
+
+    def _open_segment(self):
+        if self._file is not None:
+            self._file.close()
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        self._seq += 1
+        self._path = os.path.join(self.directory, f'events-{stamp}-{os.getpid()}-{self._seq:04d}.jsonl')
+        self._file = open(self._path, 'ab')
+        if fcntl is not None:
+            # se libera al cerrar el archivo (rotación, close o fin del proceso)
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._prune()
+
+    @staticmethod
+    def _in_use(path: str) -> bool:
+        """True si otro proceso tiene el segmento abierto como activo."""
+        if fcntl is None:
+            return False
+        try:
+            with open(path, 'rb') as f:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            return False
+        except BlockingIOError:
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _prune(self):
+        segments = sorted(glob.glob(os.path.join(self.directory, 'events-*.jsonl')))
+        excess = segments[:max(0, len(segments) - self.max_segments)]
+        removed = set()
+        for path in excess:
+            if path == self._path or self._in_use(path):
+                continue
+            try:
+                os.remove(path)
+                removed.add(path)
+            except FileNotFoundError:
+                removed.add(path)
+            except Exception:
+                logging.exception('No se pudo borrar segmento de eventos %s', path)
+        if removed and self._indexed:
+            self._rebuild(exclude=removed)
+
+    def append(self, record: Dict) -> str:
+        """Agrega un evento (dict) al segmento activo; devuelve la ruta del segmento."""
+        line = json.dumps(_strip_images(record), ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+        with self._lock:
+            if self._file is None or self._file.tell() + len(line) > self.segment_bytes:
+                self._open_segment()
+            self._file.write(line)
+            # flush por línea: otros procesos (y un crash) ven el evento completo
+            self._file.flush()
+            return self._path
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    # --- índice ----------------------------------------------------------------
+
+    def _index_entry(self, record: Dict, segment: str, offset: int):
+        idx = len(self._entries)
+        camera = record.get('cameraId')
+        plate = record.get('plate')
+        self._entries.append((record.get('ts') or 0, record.get('kind'), camera, plate, segment, offset))
+        if plate:
+            self._by_plate.setdefault(plate, []).append(idx)
+        if camera:
+            self._by_camera.setdefault(camera, []).append(idx)
+
+    def _rebuild(self, exclude=()):
+        entries = [e for e in self._entries if e[4] not in exclude and os.path.exists(e[4])]
+        self._entries, self._by_plate, self._by_camera = [], {}, {}
+        self._scanned = {k: v for k, v in self._scanned.items() if k not in exclude}
+        for ts, kind, camera, plate, segment, offset in entries:
+            self._index_entry({'ts': ts, 'kind': kind, 'cameraId': camera, 'plate': plate}, segment, offset)
+
+    def refresh(self):
+        """Indexa lo escrito desde la última vez en todos los segmentos del directorio."""
+        with self._lock:
+            self._indexed = True
+            if self._file is not None:
+                self._file.flush()
+            present = set(glob.glob(os.path.join(self.directory, 'events-*.jsonl')))
+            gone = set(self._scanned) - present
+            if gone:
+                self._rebuild(exclude=gone)
+            for segment in sorted(present):
+                start = self._scanned.get(segment, 0)
+                try:
+                    with open(segment, 'rb') as f:
+                        f.seek(start)
+                        offset = start
+                        for line in f:
+                            if not line.endswith(b'\n'):
+                                break  # línea a medio escribir por otro proceso
+                            try:
+                                self._index_entry(json.loads(line), segment, offset)
+                            except ValueError:
+                                logging.warning('Línea inválida en %s @%d', segment, offset)
+                            offset += len(line)
+                except FileNotFoundError:
+                    continue
+                self._scanned[segment] = offset
+
+    def find(self, plate: Optional[str] = None, camera: Optional[str] = None, since: Optional[float] = None,
+             until: Optional[float] = None, kind: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """Eventos que cumplen los filtros, del más reciente al más antiguo."""
+        self.refresh()
+        with self._lock:
+            if plate:
+                candidates = self._by_plate.get(plate, [])
+            elif camera:
+                candidates = self._by_camera.get(camera, [])
+            else:
+                candidates = range(len(self._entries))
+            hits = []
+            for i in candidates:
+                ts, k, cam, _, segment, offset = self._entries[i]
+                if camera and cam != camera:
+                    continue
+                if kind and k != kind:
+                    continue
+                if since is not None and ts < since:
+                    continue
+                if until is not None and ts > until:
+                    continue
+                hits.append((ts, segment, offset))
+        hits.sort(reverse=True)
+        out = []
+        for _, segment, offset in hits[:limit]:
+            try:
+                with open(segment, 'rb') as f:
+                    f.seek(offset)
+                    out.append(json.loads(f.readline()))
+            except Exception:
+                logging.exception('No se pudo leer evento %s @%d', segment, offset)
+        return out
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'events': len(self._entries), 'segments': len(self._scanned),
+                    'plates': len(self._by_plate), 'active_segment': self._path}
+
+
+_EVENT_LOG: Optional[EventLog] = None
+_EVENT_LOG_LOCK = threading.Lock()
+
+
+def get_event_log() -> EventLog:
+    """Log de eventos del proceso (compartido por todas las cámaras de un host)."""
+    global _EVENT_LOG
+    with _EVENT_LOG_LOCK:
+        if _EVENT_LOG is None:
+            _EVENT_LOG = EventLog(settings.LPR_EVENT_LOG_DIR, int(settings.LPR_EVENT_LOG_SEGMENT_MB * 1024 * 1024),
+                                  settings.LPR_EVENT_LOG_MAX_SEGMENTS)
+        return _EVENT_LOG
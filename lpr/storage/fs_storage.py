@@ -0,0 +1,295 @@
+import os
+import json
+from PIL import Image
+import logging
+import requests
+import hashlib
+import time
+import atexit
+import threading
+import concurrent.futures
+from collections import deque
+from typing import Callable, Dict, Optional, Union
+from lpr.settings import settings
+from lpr.utils.images import EncodedImage
+
+
+def save_image_pil(dirpath: str, filename: str, pil_img: Image.Image, quality: int = 85) -> str:
+    os.makedirs(dirpath, exist_ok=True)
+    path = os.path.join(dirpath, filename)
+    try:
+        pil_img.save(path, format='JPEG', quality=quality)
+        return path
+    except Exception:
+        logging.exception('Error guardando imagen %s', path)
+        raise
+
+
+def save_ndarray_image(dirpath: str, filename: str, ndarr, quality: int = 90) -> str:
+    from PIL import Image
+    img = Image.fromarray(ndarr)
+    return save_image_pil(dirpath, filename, img, quality=quality)
+
+
+def save_json(dirpath: str, filename: str, data: dict) -> str:
+    os.makedirs(dirpath, exist_ok=True)
+    path = os.path.join(dirpath, filename)
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        return path
+    except Exception:
+        logging.exception('Error guardando json %s', path)
+        raise
+
+
+def _write_bytes(path: str, data: bytes):
+    """Escritura atómica: el archivo aparece completo o no aparece (nunca a medias)."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    # temporal único por proceso e hilo: dos escrituras al mismo destino no se pisan
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+# Prioridades de la cola de persistencia (menor = más importante)
+PRIORITY_HIGH = 0  # detecciones/anomalías confirmadas y su metadata
+PRIORITY_LOW = 1   # crops de debug (bad, lowq, pending, high)
+
+
+class PersistenceQueue:
+    """Etapa de persistencia en segundo plano para imágenes y metadata.
+
+    El hilo de inferencia solo encola el trabajo (la referencia al frame, sin
+    copiarlo ni codificarlo); `threads` hilos escritores anotan, codifican a
+    JPEG y escriben a disco. La cola está acotada a `max_size` trabajos: bajo
+    presión se descartan primero los crops de debug (`PRIORITY_LOW`), y un
+    trabajo `PRIORITY_HIGH` desplaza al crop más antiguo en vez de esperar.
+    Los `PRIORITY_HIGH` nunca se descartan ni bloquean al que encola.
+
+    Cada `submit_*` devuelve un Future (cancelado si el trabajo se descartó)
+    por si el llamador necesita el archivo escrito, p. ej. para subirlo.
+
+    Con `retention` (ver `lpr.storage.retention`) cada archivo escrito se
+    registra para aplicar cuotas y antigüedad máxima por categoría.
+    """
+
+    def __init__(self, max_size: int = 64, threads: int = 2, stats_interval: float = 60.0, retention=None):
+        self.max_size = max(1, int(max_size))
+        self.retention = retention
+        self.stats_interval = float(stats_interval)
+        self._jobs = deque()  # (priority, fn, future)
+        self._cond = threading.Condition()
+        self._closed = False
+        self._counters = {'submitted': 0, 'written': 0, 'dropped': 0, 'errors': 0, 'max_depth': 0}
+        self._last_report = time.time()
+        self._threads = [threading.Thread(target=self._run, name=f'lpr-persist-{i}', daemon=True)
+                         for i in range(max(1, int(threads)))]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, fn: Callable, priority: int = PRIORITY_LOW) -> concurrent.futures.Future:
+        future = concurrent.futures.Future()
+        with self._cond:
+            if self._closed:
+                future.cancel()
+                return future
+            if len(self._jobs) >= self.max_size:
+                if priority >= PRIORITY_LOW:
+                    self._counters['dropped'] += 1
+                    future.cancel()
+                    return future
+                # desplazar el crop de debug más antiguo
+                victim = next((j for j in self._jobs if j[0] >= PRIORITY_LOW), None)
+                if victim is not None:
+                    self._jobs.remove(victim)
+                    victim[2].cancel()
+                    self._counters['dropped'] += 1
+            self._jobs.append((priority, fn, future))
+            self._counters['submitted'] += 1
+            self._counters['max_depth'] = max(self._counters['max_depth'], len(self._jobs))
+            self._cond.notify()
+        return future
+
+    def _next_job(self):
+        # los trabajos importantes salen primero; dentro de cada prioridad, FIFO
+        job = next((j for j in self._jobs if j[0] < PRIORITY_LOW), None) or self._jobs[0]
+        self._jobs.remove(job)
+        return job
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._jobs and not self._closed:
+                    self._cond.wait()
+                if not self._jobs:
+                    return
+                _, fn, future = self._next_job()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn())
+                with self._cond:
+                    self._counters['written'] += 1
+            except Exception as e:
+                logging.exception('Error en persistencia en segundo plano')
+                with self._cond:
+                    self._counters['errors'] += 1
+                future.set_exception(e)
+            self._maybe_report()
+
+    def _maybe_report(self):
+        if self.stats_interval <= 0:
+            return
+        now = time.time()
+        with self._cond:
+            if now - self._last_report < self.stats_interval:
+                return
+            self._last_report = now
+        logging.info('Persistencia: %s', self.stats())
+
+    def save_image(self, path: str, image: EncodedImage, priority: int = PRIORITY_HIGH) -> concurrent.futures.Future:
+        """Encola la escritura de una imagen ya codificada (o por codificar).
+
+        Si nadie pidió los bytes todavía, la codificación JPEG (y la anotación)
+        ocurre en el hilo escritor; si ya se codificó se reutilizan los bytes.
+        """
+        return self.submit(lambda: self._store(path, image.data), priority)
+
+    def save_json(self, path: str, data: dict, priority: int = PRIORITY_HIGH) -> concurrent.futures.Future:
+        return self.submit(lambda: self._store(path, json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')), priority)
+
+    def _store(self, path: str, data: bytes) -> str:
+        _write_bytes(path, data)
+        if self.retention is not None:
+            try:
+                self.retention.record(path, len(data))
+            except Exception:
+                logging.exception('Error aplicando retención tras escribir %s', path)
+        return path
+
+    def depth(self) -> int:
+        with self._cond:
+            return len(self._jobs)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            out = dict(self._counters, depth=len(self._jobs), max_size=self.max_size)
+        if self.retention is not None:
+            out['retention'] = self.retention.stats()
+        return out
+
+    def close(self, timeout: float = 5.0):
+        """Deja de aceptar trabajos y espera (hasta `timeout`) a que se vacíe la cola."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        deadline = time.time() + timeout
+        for t in self._threads:
+            t.join(timeout=max(0.0, deadline - time.time()))
+
+
+_PERSISTENCE: Optional[PersistenceQueue] = None
+_PERSISTENCE_LOCK = threading.Lock()
+
+
+def get_persistence_queue() -> PersistenceQueue:
+    """Cola de persistencia del proceso (compartida por todas las cámaras de un host)."""
+    global _PERSISTENCE
+    with _PERSISTENCE_LOCK:
+        if _PERSISTENCE is None:
+            from lpr.storage.retention import get_retention_manager
+            _PERSISTENCE = PersistenceQueue(settings.LPR_PERSIST_QUEUE_SIZE, settings.LPR_PERSIST_THREADS,
+                                            settings.LPR_PERSIST_STATS_INTERVAL, retention=get_retention_manager())
+            # al salir, dar unos segundos para escribir lo pendiente
+            atexit.register(_PERSISTENCE.close)
+        return _PERSISTENCE
+
+
+def _cloudinary_credentials():
+    cloud = settings.CLOUDINARY_CLOUD_NAME
+    key = settings.CLOUDINARY_API_KEY
+    secret = settings.CLOUDINARY_API_SECRET
+    if not cloud or not key or not secret:
+        raise RuntimeError('Cloudinary no configurado (CLOUDINARY_CLOUD_NAME/API_KEY/API_SECRET)')
+    return cloud, key, secret
+
+
+def cloudinary_upload_once(content: bytes, public_id: str = None, session=None, timeout: float = 10) -> str:
+    """Un solo intento de subida de bytes JPEG a Cloudinary; devuelve la URL.
+
+    `session` (requests.Session) permite reutilizar conexiones entre subidas.
+    """
+    cloud, key, secret = _cloudinary_credentials()
+    url = f'https://api.cloudinary.com/v1_1/{cloud}/image/upload'
+    timestamp = int(time.time())
+    params = {'timestamp': timestamp}
+    if public_id:
+        params['public_id'] = public_id
+
+    # signature: sorted params joined by '&' + secret
+    to_sign = '&'.join(f"{k}={params[k]}" for k in sorted(params))
+    signature = hashlib.sha1((to_sign + secret).encode('utf-8')).hexdigest()
+
+    files = {'file': (f'{public_id or "upload"}.jpg', content, 'image/jpeg')}
+    data = {'api_key': key, 'timestamp': timestamp, 'signature': signature}
+    if public_id:
+        data['public_id'] = public_id
+    resp = (session or requests).post(url, data=data, files=files, timeout=timeout)
+    resp.raise_for_status()
+    j = resp.json()
+    return j.get('secure_url') or j.get('url')
+
+
+def upload_to_cloudinary(image: Union[str, bytes, EncodedImage], public_id: str = None) -> str:
+    """Sube una imagen a Cloudinary usando la API REST y devuelve la URL.
+
+    `image` puede ser una ruta local, bytes JPEG o un `EncodedImage`; en los dos
+    últimos casos se sube desde memoria sin releer el archivo.
+
+    Requiere las env vars CLOUDINARY_CLOUD_NAME, CLOUDINARY_API_KEY, CLOUDINARY_API_SECRET.
+    Si no están definidas lanza excepción. Es bloqueante (reintenta con `time.sleep`);
+    el worker usa `lpr.storage.uploader.CloudinaryUploader` en segundo plano.
+    """
+    _cloudinary_credentials()
+
+    # retries/backoff configurables vía env
+    try:
+        retries = int(settings.CLOUDINARY_UPLOAD_RETRIES)
+    except Exception:
+        retries = 3
+    try:
+        base_backoff = float(settings.CLOUDINARY_RETRY_BACKOFF)
+    except Exception:
+        base_backoff = 1.0
+
+    if isinstance(image, EncodedImage):
+        content, label = image.data, public_id
+    elif isinstance(image, (bytes, bytearray)):
+        content, label = bytes(image), public_id
+    else:
+        with open(image, 'rb') as f:
+            content, label = f.read(), image
+
+    last_exc = None
+    for attempt in range(1, retries + 1):
+        try:
+            return cloudinary_upload_once(content, public_id)
+        except Exception as e:
+            last_exc = e
+            logging.warning('Cloudinary upload attempt %d/%d failed for %s: %s', attempt, retries, label, e)
+            if attempt < retries:
+                backoff = base_backoff * (2 ** (attempt - 1))
+                time.sleep(backoff)
+            else:
+                logging.exception('All Cloudinary upload attempts failed for %s', label)
+    # Si llegamos aquí, todos los intentos fallaron
+    raise last_exc
@@ -0,0 +1,236 @@
+"""Retención y cuotas de disco para las detecciones y crops guardados.
+
+`RetentionManager` lleva un índice en memoria de los archivos escritos por
+categoría (crops bad/lowq/pending/high, detecciones, anomalías, clips): al arrancar
+hace un solo escaneo de los directorios y después lo mantiene con lo que le
+informa la `PersistenceQueue` tras cada escritura. Cuando una categoría supera
+su cuota (o un archivo su antigüedad máxima) se borran los más viejos, de a
+poco y en el hilo escritor, sin volver a listar directorios.
+
+Como varios procesos worker pueden escribir en los mismos directorios, el
+índice se re-sincroniza con un escaneo completo cada `rescan_interval`
+segundos (por defecto una hora).
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, Optional
+
+from lpr.settings import settings
+
+# marcador en el nombre de archivo -> categoría (el primero que coincide gana)
+_CATEGORY_MARKERS = (
+    ('_clip_', 'clips'),
+    ('_crop_bad_', 'bad'),
+    ('_crop_lowq_', 'lowq'),
+    ('_crop_pending_', 'pending'),
+    ('_crop_high_', 'high'),
+    ('_anomaly_', 'anomalies'),
+    ('_det_', 'detections'),
+)
+
+
+def category_of(path: str) -> Optional[str]:
+    name = os.path.basename(path)
+    # temporales de escritura atómica (`<ruta>.<pid>.<hilo>.tmp`, clips `.partial.mp4`)
+    if name.endswith('.tmp') or '.partial.' in name:
+        return None
+    for marker, category in _CATEGORY_MARKERS:
+        if marker in name:
+            return category
+    return None
+
+
+def parse_limits(spec: Optional[str], scale: float = 1.0) -> Dict[str, float]:
+    """'bad=50,high=200' -> {'bad': 50 * scale, 'high': 200 * scale}."""
+    limits = {}
+    for part in (spec or '').split(','):
+        if '=' not in part:
+            continue
+        key, value = part.split('=', 1)
+        try:
+            limits[key.strip()] = float(value) * scale
+        except ValueError:
+            logging.warning('Límite de retención inválido: %s', part)
+    return limits
+
+
+class RetentionManager:
+    def __init__(self, dirs: Iterable[str], quotas: Dict[str, float], max_age: Dict[str, float],
+                 sweep_interval: float = 60.0, rescan_interval: float = 3600.0, rate_window: float = 60.0):
+        self.dirs = [d for d in dirs if d]
+        self.quotas = quotas          # categoría -> bytes
+        self.max_age = max_age        # categoría -> segundos
+        self.sweep_interval = float(sweep_interval)
+        self.rescan_interval = float(rescan_interval)
+        self.rate_window = float(rate_window)
+        self._lock = threading.Lock()
+        # categoría -> deque[(mtime, path)] en orden de escritura; path -> (categoría, bytes, mtime)
+        self._order: Dict[str, deque] = {}
+        self._files: Dict[str, tuple] = {}
+        self._bytes: Dict[str, int] = {}
+        self._count: Dict[str, int] = {}
+        self._evicted = {'files': 0, 'bytes': 0}
+        # (timestamp, bytes) de las escrituras recientes para la tasa de escritura
+        self._writes = deque()
+        self._written_total = 0
+        self._last_sweep = time.time()
+        self._last_scan = 0.0
+        self.rescan()
+
+    # --- índice ----------------------------------------------------------
+
+    def rescan(self):
+        """Reconstruye el índice con un escaneo de los directorios (arranque y re-sincronización)."""
+        found = []
+        for d in self.dirs:
+            try:
+                with os.scandir(d) as it:
+                    for entry in it:
+                        if not entry.is_file():
+                            continue
+                        category = category_of(entry.name)
+                        if category is None:
+                            continue
+                        st = entry.stat()
+                        found.append((st.st_mtime, entry.path, category, st.st_size))
+            except FileNotFoundError:
+                continue
+            except Exception:
+                logging.exception('Retención: no se pudo escanear %s', d)
+        found.sort()
+        with self._lock:
+            self._order, self._files, self._bytes, self._count = {}, {}, {}, {}
+            for mtime, path, category, size in found:
+                self._add(path, category, size, mtime)
+            self._last_scan = time.time()
+        self._enforce()
+
+    def _add(self, path: str, category: str, size: int, mtime: float):
+        old = self._files.get(path)
+        if old is not None:
+            self._bytes[old[0]] -= old[1]
+            self._count[old[0]] -= 1
+        self._files[path] = (category, size, mtime)
+        self._order.setdefault(category, deque()).append((mtime, path))
+        self._bytes[category] = self._bytes.get(category, 0) + size
+        self._count[category] = self._count.get(category, 0) + 1
+
+    def record(self, path: str, size: int):
+        """Registra un archivo recién escrito (lo llama la PersistenceQueue)."""
+        now = time.time()
+        with self._lock:
+            self._written_total += size
+            self._writes.append((now, size))
+            category = category_of(path)
+            if category is not None:
+                self._add(path, category, size, now)
+        if self.rescan_interval > 0 and now - self._last_scan > self.rescan_interval:
+            self.rescan()
+            return
+        self._enforce(category)
+
+    def forget(self, path: str):
+        """Quita un archivo borrado por otro componente (p. ej. tras subirlo)."""
+        with self._lock:
+            old = self._files.pop(path, None)
+            if old is not None:
+                self._bytes[old[0]] -= old[1]
+                self._count[old[0]] -= 1
+
+    # --- desalojo ----------------------------------------------------------
+
+    def _pop_oldest(self, category: str):
+        """Saca del índice el archivo más viejo (todavía presente) de la categoría."""
+        order = self._order.get(category)
+        while order:
+            mtime, path = order.popleft()
+            entry = self._files.get(path)
+            if entry is None or entry[0] != category or entry[2] != mtime:
+                continue  # olvidado o re-escrito: entrada obsoleta
+            del self._files[path]
+            self._bytes[category] -= entry[1]
+            self._count[category] -= 1
+            return mtime, path, entry[1]
+        return None
+
+    def _enforce(self, category: Optional[str] = None):
+        now = time.time()
+        sweep = now - self._last_sweep >= self.sweep_interval
+        if sweep:
+            self._last_sweep = now
+        categories = list(self._order) if (sweep or category is None) else [category]
+        victims = []
+        with self._lock:
+            for cat in categories:
+                quota = self.quotas.get(cat)
+                while quota is not None and self._bytes.get(cat, 0) > quota:
+                    item = self._pop_oldest(cat)
+                    if item is None:
+                        break
+                    victims.append(item)
+                max_age = self.max_age.get(cat)
+                if max_age is None or not (sweep or category is None):
+                    continue
+                order = self._order.get(cat)
+                while order and now - order[0][0] > max_age:
+                    item = self._pop_oldest(cat)
+                    if item is None:
+                        break
+                    victims.append(item)
+        for _, path, size in victims:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            except Exception:
+                logging.exception('Retención: no se pudo borrar %s', path)
+                continue
+            with self._lock:
+                self._evicted['files'] += 1
+                self._evicted['bytes'] += size
+        if victims:
+            logging.debug('Retención: %d archivos desalojados', len(victims))
+
+    # --- métricas ----------------------------------------------------------
+
+    def write_rate(self) -> float:
+        """Bytes escritos por segundo en la última ventana (`rate_window`)."""
+        now = time.time()
+        with self._lock:
+            while self._writes and now - self._writes[0][0] > self.rate_window:
+                self._writes.popleft()
+            return sum(size for _, size in self._writes) / self.rate_window
+
+    def stats(self) -> Dict:
+        rate = self.write_rate()
+        with self._lock:
+            categories = {}
+            for cat, order in self._order.items():
+                categories[cat] = {'bytes': self._bytes.get(cat, 0),
+                                   'files': self._count.get(cat, 0),
+                                   'quota': self.quotas.get(cat)}
+            return {'categories': categories, 'evicted': dict(self._evicted),
+                    'written_bytes': self._written_total, 'write_bytes_per_sec': round(rate, 1)}
+
+
+_RETENTION: Optional[RetentionManager] = None
+_RETENTION_LOCK = threading.Lock()
+
+
+def get_retention_manager() -> Optional[RetentionManager]:
+    """Retención del proceso (None si `LPR_RETENTION_ENABLED` está apagado)."""
+    global _RETENTION
+    if not settings.LPR_RETENTION_ENABLED:
+        return None
+    with _RETENTION_LOCK:
+        if _RETENTION is None:
+            _RETENTION = RetentionManager(
+                [settings.LPR_DETECTIONS_DIR, settings.LPR_SAVE_CROPS_DIR, settings.LPR_CLIPS_DIR],
+                quotas=parse_limits(settings.LPR_RETENTION_QUOTAS_MB, 1024 * 1024),
+                max_age=parse_limits(settings.LPR_RETENTION_MAX_AGE_HOURS, 3600),
+                rescan_interval=settings.LPR_RETENTION_RESCAN_INTERVAL,
+            )
+        return _RETENTION
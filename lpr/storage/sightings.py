@@ -0,0 +1,245 @@
+"""Índice local (SQLite) de lecturas OCR y emisiones, por patente, cámara y tiempo.
+
+Cada lectura del OCR (también las descartadas: no plausibles, baja calidad,
+duplicadas, pendientes de confirmación) y cada emisión se registra con patente,
+texto crudo, confianzas, bbox, cámara, timestamp y la referencia a la imagen.
+
+El hilo de inferencia solo agrega la fila a una cola en memoria (acotada: si
+se llena se descartan filas y se cuentan); un hilo escritor las inserta en
+lotes dentro de una transacción. La base está en modo WAL, así que varios
+procesos worker pueden escribir en el mismo archivo y el manager o la CLI
+pueden consultar sin bloquear a los escritores.
+
+Consulta por línea de comandos:
+  python -m lpr.storage.sightings BBBB99 --hours 24 [--camera cam1] [--status emitted] [--json]
+"""
+import argparse
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from lpr.settings import settings
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS sightings (
+        id INTEGER PRIMARY KEY,
+        ts REAL NOT NULL,
+        camera TEXT,
+        plate TEXT,
+        plate_raw TEXT,
+        status TEXT,
+        det_conf REAL,
+        ocr_conf REAL,
+        bbox TEXT,
+        image TEXT
+    )""",
+    'CREATE INDEX IF NOT EXISTS ix_sightings_plate_ts ON sightings (plate, ts)',
+    'CREATE INDEX IF NOT EXISTS ix_sightings_camera_ts ON sightings (camera, ts)',
+    'CREATE INDEX IF NOT EXISTS ix_sightings_ts ON sightings (ts)',
+)
+_COLUMNS = ('ts', 'camera', 'plate', 'plate_raw', 'status', 'det_conf', 'ocr_conf', 'bbox', 'image')
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+class SightingIndex:
+    def __init__(self, path: str, batch_size: int = 500, flush_interval: float = 1.0,
+                 max_pending: int = 20000, max_age_hours: float = 0.0):
+        self.path = path
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = float(flush_interval)
+        self.max_pending = max(1, int(max_pending))
+        self.max_age = float(max_age_hours) * 3600
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        conn = _connect(path)
+        try:
+            with conn:
+                for stmt in _SCHEMA:
+                    conn.execute(stmt)
+        finally:
+            conn.close()
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._counters = {'recorded': 0, 'written': 0, 'dropped': 0, 'errors': 0}
+        self._last_prune = 0.0
+        self._thread = threading.Thread(target=self._run, name='lpr-sightings', daemon=True)
+        self._thread.start()
+
+    def record(self, camera: str, plate: Optional[str], status: str, plate_raw: Optional[str] = None,
+               det_conf: Optional[float] = None, ocr_conf: Optional[float] = None, bbox=None,
+               image: Optional[str] = None, ts: Optional[float] = None):
+        """Encola una lectura; nunca bloquea (si la cola está llena se descarta)."""
+        row = (ts or time.time(), camera, plate, plate_raw, status,
+               None if det_conf is None else float(det_conf), None if ocr_conf is None else float(ocr_conf),
+               json.dumps([int(v) for v in bbox]) if bbox is not None else None, image)
+        with self._cond:
+            if self._closed or len(self._pending) >= self.max_pending:
+                self._counters['dropped'] += 1
+                return
+            self._pending.append(row)
+            self._counters['recorded'] += 1
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+
+    def _run(self):
+        conn = _connect(self.path)
+        try:
+            while True:
+                with self._cond:
+                    if not self._pending and not self._closed:
+                        self._cond.wait(timeout=self.flush_interval)
+                    batch = [self._pending.popleft() for _ in range(min(len(self._pending), self.batch_size))]
+                    closed = self._closed
+                if batch:
+                    self._write(conn, batch)
+                if self.max_age > 0 and time.time() - self._last_prune > 3600:
+                    self._prune(conn)
+                if closed and not batch:
+                    return
+        finally:
+            conn.close()
+
+    def _write(self, conn: sqlite3.Connection, batch: List[tuple]):
+        try:
+            with conn:
+                conn.executemany(f'INSERT INTO sightings ({", ".join(_COLUMNS)}) VALUES ({", ".join("?" * len(_COLUMNS))})', batch)
+            with self._cond:
+                self._counters['written'] += len(batch)
+        except Exception:
+            logging.exception('No se pudo escribir %d lecturas en el índice de patentes', len(batch))
+            with self._cond:
+                self._counters['errors'] += 1
+                self._counters['dropped'] += len(batch)
+
+    def _prune(self, conn: sqlite3.Connection):
+        self._last_prune = time.time()
+        try:
+            with conn:
+                cur = conn.execute('DELETE FROM sightings WHERE ts < ?', (time.time() - self.max_age,))
+            if cur.rowcount:
+                logging.info('Índice de patentes: %d lecturas antiguas eliminadas', cur.rowcount)
+        except Exception:
+            logging.exception('No se pudo podar el índice de patentes')
+
+    def flush(self, timeout: float = 5.0):
+        """Espera (hasta `timeout`) a que se escriba lo encolado."""
+        deadline = time.time() + timeout
+        with self._cond:
+            self._cond.notify()
+        while time.time() < deadline:
+            with self._cond:
+                if not self._pending and self._counters['written'] + self._counters['dropped'] >= self._counters['recorded']:
+                    return True
+            time.sleep(0.01)
+        return False
+
+    def query(self, plate: Optional[str] = None, camera: Optional[str] = None, since: Optional[float] = None,
+              until: Optional[float] = None, status: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        return query_sightings(self.path, plate, camera, since, until, status, limit)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return dict(self._counters, pending=len(self._pending))
+
+    def close(self, timeout: float = 5.0):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=timeout)
+
+
+def query_sightings(path: str, plate: Optional[str] = None, camera: Optional[str] = None,
+                    since: Optional[float] = None, until: Optional[float] = None,
+                    status: Optional[str] = None, limit: int = 100) -> List[Dict]:
+    """Lecturas que cumplen los filtros, de la más reciente a la más antigua.
+
+    Abre su propia conexión: sirve desde el manager o la CLI sin un
+    `SightingIndex` (ni su hilo escritor) en el proceso.
+    """
+    if not os.path.exists(path):
+        return []
+    clauses, params = [], []
+    for column, value in (('plate', plate), ('camera', camera), ('status', status)):
+        if value:
+            clauses.append(f'{column} = ?')
+            params.append(value)
+    if since is not None:
+        clauses.append('ts >= ?')
+        params.append(since)
+    if until is not None:
+        clauses.append('ts <= ?')
+        params.append(until)
+    where = f'WHERE {" AND ".join(clauses)}' if clauses else ''
+    conn = _connect(path)
+    try:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(f'SELECT {", ".join(_COLUMNS)} FROM sightings {where} ORDER BY ts DESC LIMIT ?',
+                            (*params, int(limit))).fetchall()
+    finally:
+        conn.close()
+    out = []
+    for row in rows:
+        item = dict(row)
+        item['bbox'] = json.loads(item['bbox']) if item['bbox'] else None
+        out.append(item)
+    return out
+
+
+_INDEX: Optional[SightingIndex] = None
+_INDEX_LOCK = threading.Lock()
+
+
+def get_sighting_index() -> Optional[SightingIndex]:
+    """Índice del proceso (None si `LPR_SIGHTINGS_ENABLED` está apagado)."""
+    global _INDEX
+    if not settings.LPR_SIGHTINGS_ENABLED:
+        return None
+    with _INDEX_LOCK:
+        if _INDEX is None:
+            _INDEX = SightingIndex(settings.LPR_SIGHTINGS_DB, settings.LPR_SIGHTINGS_BATCH_SIZE,
+                                   settings.LPR_SIGHTINGS_FLUSH_INTERVAL, max_age_hours=settings.LPR_SIGHTINGS_MAX_AGE_HOURS)
+            # al salir, escribir lo que quede en la cola
+            atexit.register(_INDEX.close)
+        return _INDEX
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='lpr.storage.sightings', description='Consulta el índice local de patentes')
+    parser.add_argument('plate', nargs='?', help='patente normalizada (p. ej. BBBB99)')
+    parser.add_argument('--camera')
+    parser.add_argument('--status', help='emitted, emit_failed, pending, duplicate, lowq, bad, empty')
+    parser.add_argument('--hours', type=float, default=24.0, help='ventana hacia atrás (0 = sin límite)')
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--db', default=settings.LPR_SIGHTINGS_DB)
+    parser.add_argument('--json', action='store_true', help='una lectura JSON por línea')
+    args = parser.parse_args(argv)
+
+    since = time.time() - args.hours * 3600 if args.hours > 0 else None
+    plate = args.plate.upper().replace('-', '').replace(' ', '') if args.plate else None
+    rows = query_sightings(args.db, plate, args.camera, since, None, args.status, args.limit)
+    for row in rows:
+        if args.json:
+            print(json.dumps(row, ensure_ascii=False))
+            continue
+        when = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(row['ts']))
+        ocr = f"{row['ocr_conf']:.2f}" if row['ocr_conf'] is not None else '-'
+        print(f"{when}  {row['camera'] or '-':<16} {row['plate'] or '-':<8} {row['status'] or '-':<10} "
+              f"ocr={ocr}  {row['image'] or ''}")
+    if not args.json:
+        print(f'{len(rows)} lecturas')
+
+
+if __name__ == '__main__':
+    main()
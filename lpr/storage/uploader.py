@@ -0,0 +1,310 @@
+"""Subida de imágenes a Cloudinary en segundo plano.
+
+El worker ya no espera a Cloudinary: envía el evento al backend de inmediato
+con la ruta local de la imagen (`full_frame_path`) y `CloudinaryUploader` sube
+los bytes (ya codificados, ver `EncodedImage`) en sus propios hilos. Cuando la
+subida termina y se conoce el id de la detección, se parcha la URL remota en el
+backend (`PATCH /detections/plates/{id}/image`).
+
+Las subidas fallidas se guardan en un spool en disco (`CLOUDINARY_SPOOL_DIR`:
+`<public_id>.jpg` + `<public_id>.json`) y se reintentan con backoff
+exponencial, también después de reiniciar el proceso. Un PATCH fallido sigue el
+mismo camino (el spool guarda la URL ya subida y solo se reintenta el PATCH): el
+job sale del spool, y la copia local se borra, recién con el PATCH confirmado.
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+import concurrent.futures
+from typing import Dict, List, Optional
+
+import requests
+
+from lpr.settings import settings
+from lpr.storage.fs_storage import _write_bytes, cloudinary_upload_once
+from lpr.storage.retention import get_retention_manager
+
+
+class UploadJob:
+    """Una imagen pendiente de subir (y, opcionalmente, la detección a parchar)."""
+
+    def __init__(self, public_id: str, image=None, local_path: Optional[str] = None, written=None):
+        self.public_id = public_id
+        self.image = image            # EncodedImage o bytes; None si se recuperó del spool
+        self.local_path = local_path
+        self.written = written        # Future de la escritura local (PersistenceQueue)
+        self.url: Optional[str] = None
+        self.patch: Optional[Dict] = None  # {'backendUrl', 'detectionId', 'dryRun'}
+        self.patched = False
+        self.patching = False
+        self.restored = False         # recuperado del spool: nadie más va a llamar attach_detection
+        self.attempts = 0
+        self.next_attempt = 0.0
+        self.spooled = False
+        self.lock = threading.Lock()
+
+    def content(self) -> bytes:
+        image = self.image
+        return image.data if hasattr(image, 'data') else bytes(image)
+
+    def to_dict(self) -> Dict:
+        return {'publicId': self.public_id, 'localPath': self.local_path, 'patch': self.patch,
+                'attempts': self.attempts, 'url': self.url}
+
+
+class CloudinaryUploader:
+    def __init__(self, concurrency: int = 2, spool_dir: Optional[str] = None, max_attempts: int = 20,
+                 base_backoff: float = 1.0, max_backoff: float = 300.0):
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_backoff = float(base_backoff)
+        self.max_backoff = float(max_backoff)
+        self.spool_dir = spool_dir
+        concurrency = max(1, int(concurrency))
+        # una sola sesión con keep-alive; el pool alcanza para todas las subidas concurrentes
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='lpr-upload')
+        self._retry: List[UploadJob] = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._counters = {'uploaded': 0, 'failed_attempts': 0, 'given_up': 0, 'patched': 0}
+        if spool_dir:
+            os.makedirs(spool_dir, exist_ok=True)
+            self._load_spool()
+        self._retry_thread = threading.Thread(target=self._retry_loop, name='lpr-upload-retry', daemon=True)
+        self._retry_thread.start()
+
+    # --- API usada por el worker -------------------------------------------
+
+    def submit(self, image, public_id: str, local_path: Optional[str] = None, written=None) -> UploadJob:
+        """Encola la subida y devuelve el job (para `attach_detection`)."""
+        job = UploadJob(public_id, image, local_path, written)
+        self.executor.submit(self._attempt, job)
+        return job
+
+    def attach_detection(self, job: UploadJob, backend_url: str, detection_id: str, dry_run: bool = False):
+        """Asocia la detección creada en el backend; se parcha cuando haya URL."""
+        with job.lock:
+            job.patch = {'backendUrl': backend_url, 'detectionId': detection_id, 'dryRun': bool(dry_run)}
+            ready = job.url is not None
+            if job.spooled:
+                self._write_spool_meta(job)
+        if ready:
+            self.executor.submit(self._patch, job)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return dict(self._counters, pending_retries=len(self._retry))
+
+    def close(self, timeout: float = 5.0):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._retry_thread.join(timeout=timeout)
+        self.executor.shutdown(wait=False)
+
+    # --- subida y reintentos -------------------------------------------------
+
+    def _attempt(self, job: UploadJob):
+        if job.url is None:
+            try:
+                url = cloudinary_upload_once(job.content(), job.public_id, session=self.session)
+            except Exception as e:
+                self._on_failure(job, e)
+                return
+            with job.lock:
+                job.url = url
+                if job.spooled:
+                    self._write_spool_meta(job)  # un reinicio solo reintenta el PATCH
+            with self._cond:
+                self._counters['uploaded'] += 1
+            logging.info('Uploaded det image to Cloudinary: %s', url)
+        self._patch(job)
+
+    def _finish(self, job: UploadJob):
+        self._remove_spool(job)
+        # sin PATCH confirmado la copia local es la única referencia a la imagen
+        if job.patched and job.local_path and bool(settings.CLOUDINARY_DELETE_LOCAL):
+            self._delete_local(job)
+
+    def _on_failure(self, job: UploadJob, exc: Exception):
+        job.attempts += 1
+        with self._cond:
+            self._counters['failed_attempts'] += 1
+        if job.attempts >= self.max_attempts:
+            logging.error('Cloudinary: se abandona %s tras %d intentos (%s); queda la copia local %s',
+                          job.public_id, job.attempts, exc, job.local_path)
+            with self._cond:
+                self._counters['given_up'] += 1
+            self._remove_spool(job)
+            return
+        # backoff exponencial con jitter para no reintentar todas a la vez
+        delay = min(self.max_backoff, self.base_backoff * (2 ** (job.attempts - 1)))
+        delay *= random.uniform(0.5, 1.0)
+        logging.warning('%s attempt %d/%d failed for %s: %s (reintento en %.1fs)',
+                        'Cloudinary upload' if job.url is None else 'Image PATCH',
+                        job.attempts, self.max_attempts, job.public_id, exc, delay)
+        job.next_attempt = time.time() + delay
+        self._spool(job)
+        with self._cond:
+            self._retry.append(job)
+            self._cond.notify()
+
+    def _retry_loop(self):
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                now = time.time()
+                due = [j for j in self._retry if j.next_attempt <= now]
+                for job in due:
+                    self._retry.remove(job)
+                if not due:
+                    wait = min((j.next_attempt for j in self._retry), default=now + 60) - now
+                    self._cond.wait(timeout=max(0.05, wait))
+                    continue
+            for job in due:
+                self.executor.submit(self._attempt, job)
+
+    def _patch(self, job: UploadJob):
+        with job.lock:
+            if job.patched or job.patching or job.url is None:
+                return
+            if job.patch is None:
+                if job.restored:
+                    # de otra ejecución y sin id de detección: no hay nada que parchar
+                    finish = True
+                else:
+                    return  # attach_detection lo parcha cuando llegue el id
+            else:
+                finish = False
+                job.patching = True
+                patch, url = job.patch, job.url
+        if finish:
+            self._finish(job)
+            return
+        from lpr.api.client import patch_detection_image
+        try:
+            status = patch_detection_image(patch['backendUrl'], patch['detectionId'], url, dry_run=patch['dryRun'])
+        except Exception as e:
+            status, error = -1, e
+        else:
+            error = None
+        with job.lock:
+            job.patching = False
+            job.patched = 200 <= status < 300
+        if job.patched:
+            with self._cond:
+                self._counters['patched'] += 1
+            self._finish(job)
+            return
+        logging.warning('No se pudo parchar la imagen de la detección %s (status %s)', patch['detectionId'], status)
+        self._on_failure(job, error or RuntimeError(f'PATCH status {status}'))
+
+    def _delete_local(self, job: UploadJob):
+        def remove(_=None):
+            try:
+                os.remove(job.local_path)
+            except FileNotFoundError:
+                pass
+            except Exception:
+                logging.exception('No se pudo eliminar archivo local %s', job.local_path)
+                return
+            retention = get_retention_manager()
+            if retention is not None:
+                retention.forget(job.local_path)
+        # la escritura local puede seguir en la cola de persistencia
+        if job.written is not None and not job.written.done():
+            job.written.add_done_callback(remove)
+        else:
+            remove()
+
+    # --- spool en disco ------------------------------------------------------
+
+    def _spool_paths(self, job: UploadJob):
+        base = os.path.join(self.spool_dir, job.public_id)
+        return base + '.jpg', base + '.json'
+
+    def _write_spool_meta(self, job: UploadJob):
+        _, meta_path = self._spool_paths(job)
+        try:
+            _write_bytes(meta_path, json.dumps(job.to_dict(), ensure_ascii=False).encode('utf-8'))
+        except Exception:
+            logging.exception('No se pudo actualizar spool de %s', job.public_id)
+
+    def _spool(self, job: UploadJob):
+        if not self.spool_dir:
+            return
+        with job.lock:
+            try:
+                if not job.spooled:
+                    img_path, _ = self._spool_paths(job)
+                    _write_bytes(img_path, job.content())
+                    job.spooled = True
+                self._write_spool_meta(job)
+            except Exception:
+                logging.exception('No se pudo guardar %s en el spool de subidas', job.public_id)
+
+    def _remove_spool(self, job: UploadJob):
+        with job.lock:
+            if not self.spool_dir or not job.spooled:
+                return
+            job.spooled = False
+        for path in self._spool_paths(job):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except Exception:
+                logging.exception('No se pudo limpiar spool %s', path)
+
+    def _load_spool(self):
+        """Re-encola las subidas que quedaron pendientes de una ejecución anterior."""
+        loaded = 0
+        for name in sorted(os.listdir(self.spool_dir)):
+            if not name.endswith('.json'):
+                continue
+            meta_path = os.path.join(self.spool_dir, name)
+            img_path = meta_path[:-len('.json')] + '.jpg'
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                with open(img_path, 'rb') as f:
+                    content = f.read()
+            except Exception:
+                logging.exception('Entrada de spool inválida %s, descartando', meta_path)
+                for path in (meta_path, img_path):
+                    try:
+                        os.remove(path)
+                    except Exception:
+                        pass
+                continue
+            job = UploadJob(meta['publicId'], content, meta.get('localPath'))
+            job.url = meta.get('url')
+            job.patch = meta.get('patch')
+            job.restored = True
+            job.attempts = int(meta.get('attempts') or 0)
+            job.spooled = True
+            self._retry.append(job)
+            loaded += 1
+        if loaded:
+            logging.info('Cloudinary: %d subidas pendientes recuperadas del spool', loaded)
+
+
+_UPLOADER: Optional[CloudinaryUploader] = None
+_UPLOADER_LOCK = threading.Lock()
+
+
+def get_uploader() -> CloudinaryUploader:
+    """Uploader del proceso (compartido por todas las cámaras de un host)."""
+    global _UPLOADER
+    with _UPLOADER_LOCK:
+        if _UPLOADER is None:
+            _UPLOADER = CloudinaryUploader(settings.CLOUDINARY_UPLOAD_CONCURRENCY, settings.CLOUDINARY_SPOOL_DIR,
+                                           settings.CLOUDINARY_SPOOL_MAX_ATTEMPTS, settings.CLOUDINARY_RETRY_BACKOFF)
+        return _UPLOADER
@@ -0,0 +1,71 @@
+import time
+
+from lpr.storage.access_cache import ALLOWED, DENIED, PENDING, AccessCache, AccessSnapshot
+
+
+def _iso(offset):
+    return time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime(time.time() + offset))
+
+
+FULL = {
+    'serverTime': _iso(0), 'organizationId': 'org1', 'full': True,
+    'vehicles': [
+        {'plate': 'BBCD12', 'vehicleType': 'residente', 'accessLevel': 'permanente', 'active': True},
+        {'plate': 'GHJK34', 'vehicleType': 'visitante', 'accessLevel': 'temporal', 'active': True},
+        {'plate': 'LPRS56', 'vehicleType': 'residente', 'accessLevel': 'permanente', 'active': False},
+    ],
+    'visits': [
+        {'id': 'v1', 'plate': 'GHJK34', 'status': 'pending', 'validFrom': _iso(-3600), 'validUntil': _iso(3600),
+         'maxUses': None, 'usedCount': 0},
+        {'id': 'v2', 'plate': 'TVWX78', 'status': 'active', 'validFrom': _iso(-3600), 'validUntil': _iso(3600),
+         'maxUses': 1, 'usedCount': 1},
+    ],
+}
+
+
+def test_snapshot_decisions_follow_backend_rules():
+    snap = AccessSnapshot()
+    snap.apply(FULL)
+    assert snap.decide('BBCD12').decision == ALLOWED
+    assert snap.decide('GHJK34').decision == ALLOWED and not snap.decide('GHJK34').is_exit
+    # visita adentro: la patente marca la salida
+    assert snap.decide('TVWX78').is_exit
+    assert snap.decide('LPRS56').decision == PENDING
+    unknown = snap.decide('BBCD13')
+    assert unknown.decision == PENDING and unknown.similar == ('BBCD12',)
+
+
+def test_delta_removes_finished_visits():
+    snap = AccessSnapshot()
+    snap.apply(FULL)
+    snap.apply({'serverTime': _iso(1), 'vehicles': [],
+                'visits': [{'id': 'v1', 'plate': 'GHJK34', 'status': 'cancelled'}]})
+    # vehículo visitante sin visita vigente
+    assert snap.decide('GHJK34').decision == DENIED
+    snap.apply({'serverTime': _iso(2), 'visits': [{'id': 'v2', 'plate': 'TVWX78', 'status': 'completed'}]})
+    assert snap.decide('TVWX78').decision == PENDING
+    assert snap.similar('TVWX79') == []
+
+
+def test_cache_syncs_full_then_delta_per_organization():
+    calls = []
+
+    def fetch(backend_url, camera_id, since=None):
+        calls.append((camera_id, since))
+        return FULL if since is None else {'serverTime': _iso(1), 'organizationId': 'org1', 'full': False,
+                                           'vehicles': [{'plate': 'BBCD12', 'active': False}], 'visits': []}
+
+    cache = AccessCache(sync_interval=60, full_sync_interval=600, fetch=fetch)
+    cache._cameras = {'cam1': {'backend_url': 'http://x', 'org': None}}
+    assert cache.decide('cam1', 'BBCD12') is None
+    cache.sync_once()
+    assert cache.decide('cam1', 'BBCD12').decision == ALLOWED
+    cache._cameras['cam2'] = {'backend_url': 'http://x', 'org': 'org1'}
+    cache.sync_once()
+    # un delta por condominio, aunque lo compartan dos cámaras
+    assert len(calls) == 2 and calls[1][1] is not None
+    assert cache.decide('cam2', 'BBCD12').decision == PENDING
+    cache.unregister('cam1')
+    assert cache.stats()['organizations'] == 1  # cam2 sigue usando org1
+    cache.unregister('cam2')
+    assert cache.stats()['organizations'] == 0
@@ -0,0 +1,30 @@
+import cv2
+import numpy as np
+
+from lpr.processor.best_shot import BestShotBuffer, sharpness, shot_score
+
+
+def _plate(blur=0):
+    img = np.full((40, 120, 3), 255, dtype=np.uint8)
+    cv2.putText(img, 'BBCD12', (5, 30), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 0), 2)
+    return cv2.GaussianBlur(img, (0, 0), blur) if blur else img
+
+
+def test_sharp_crop_scores_higher_than_blurred():
+    assert sharpness(_plate()) > sharpness(_plate(blur=3))
+    assert shot_score(0.8, _plate(), 0.9) > shot_score(0.8, _plate(blur=3), 0.9)
+    # mismo crop: manda la confianza del OCR
+    assert shot_score(0.8, _plate(), 0.95) > shot_score(0.8, _plate(), 0.6)
+
+
+def test_buffer_keeps_best_until_stale_and_expires_keys():
+    buf = BestShotBuffer(ttl=10, max_age=3)
+    assert buf.offer('BBCD12', 0.5, 'a', now=0)
+    assert buf.offer('BBCD12', 0.8, 'b', now=1)
+    assert not buf.offer('BBCD12', 0.6, 'c', now=2)
+    # el mejor ya tiene más de max_age: cede ante uno nuevo aunque puntúe menos
+    assert buf.offer('BBCD12', 0.4, 'd', now=5)
+    assert buf.pop('BBCD12') == 'd'
+    assert buf.pop('BBCD12') is None
+    buf.offer('XY1234', 0.5, 'e', now=0)
+    assert buf.expire(now=11) == 1 and len(buf) == 0
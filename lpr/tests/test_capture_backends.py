@@ -0,0 +1,30 @@
+import cv2
+import numpy as np
+import pytest
+
+from lpr.capture.backends import PyAVCapture
+
+
+def _video(path, frames=60, fps=30, size=(320, 240)):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    for i in range(frames):
+        writer.write(np.full((size[1], size[0], 3), i * 4 % 256, dtype=np.uint8))
+    writer.release()
+    return str(path)
+
+
+def test_pyav_capture_returns_only_sampled_frames(tmp_path):
+    pytest.importorskip('av')
+    cap = PyAVCapture(_video(tmp_path / 'in.mp4'), sample_interval=0.5, max_width=160)
+    assert cap.isOpened()
+    shapes = []
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        shapes.append(frame.shape)
+    # 2 s de video muestreados cada 0.5 s, reducidos a 160 px de ancho
+    assert len(shapes) == 4
+    assert shapes[0] == (120, 160, 3)
+    assert cap.stats()['decoded'] >= 50
+    assert not cap.isOpened()
@@ -0,0 +1,49 @@
+import numpy as np
+
+from lpr.capture.session import CaptureSession
+
+
+class _FakeCap:
+    def __init__(self, frames):
+        self.frames = frames
+        self.released = False
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        if self.frames > 0:
+            self.frames -= 1
+            return True, np.zeros((2, 2, 3), dtype=np.uint8)
+        return False, None
+
+    def release(self):
+        self.released = True
+
+
+def test_session_reopens_stalled_stream_with_backoff():
+    opened = []
+
+    def opener(url, sample_interval, timeout=None):
+        if len(opened) == 1:
+            opened.append(None)
+            return None  # la cámara todavía no vuelve
+        cap = _FakeCap(3)
+        opened.append(cap)
+        return cap
+
+    session = CaptureSession('rtsp://cam', stall_timeout=0.05, base_backoff=0.01, max_backoff=0.02,
+                             stats_interval=0, opener=opener)
+    frames = 0
+    for _ in range(200):
+        ok, _ = session.read()
+        frames += ok
+        if frames == 6:
+            break
+    stats = session.stats()
+    assert frames == 6
+    assert opened[0].released and len(opened) == 3
+    assert stats['reconnects'] == 1 and stats['open_failures'] == 1
+    assert stats['read_errors'] >= 1 and stats['frame_age'] is not None
+    session.release()
+    assert session.read() == (False, None)
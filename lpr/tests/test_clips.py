@@ -0,0 +1,29 @@
+import time
+
+import cv2
+import numpy as np
+
+from lpr.capture.clips import ClipRecorder
+
+
+def test_ring_is_bounded_and_clip_covers_event_window(tmp_path):
+    rec = ClipRecorder('cam1', str(tmp_path), pre_seconds=1.0, post_seconds=1.0, fps=10, max_width=64, quality=60)
+    frame = np.zeros((96, 128, 3), dtype=np.uint8)
+    t0 = 1000.0
+    path = None
+    for i in range(60):  # 6 s a 30 fps -> muestreado a 10 fps
+        ts = t0 + i / 30.0
+        if i == 45:
+            path = rec.trigger('plate_BBBB99', ts)
+        rec.push(frame, ts)
+    # el buffer no guarda más de pre + post segundos
+    assert rec.stats()['buffered_frames'] <= 21
+    rec.close()
+    deadline = time.time() + 10
+    while rec.stats()['clips'] == 0 and time.time() < deadline:
+        time.sleep(0.05)
+    cap = cv2.VideoCapture(path)
+    assert cap.isOpened()
+    assert int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) == 64
+    assert 8 <= int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) <= 16
+    cap.release()
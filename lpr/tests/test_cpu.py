@@ -0,0 +1,32 @@
+from lpr.utils.cpu import CpuAllocator, format_cpu_list, parse_cpu_list
+
+
+def test_parse_cpu_list():
+    assert parse_cpu_list('0-3,6') == [0, 1, 2, 3, 6]
+    assert parse_cpu_list('') == []
+    assert format_cpu_list([3, 1, 2]) == '1,2,3'
+
+
+def test_allocator_spreads_processes_over_least_loaded_cpus():
+    alloc = CpuAllocator(list(range(8)), threads_per_process=2)
+    a = alloc.allocate('cam-a')
+    b = alloc.allocate('cam-b')
+    assert len(a) == 2 and len(b) == 2
+    assert not set(a) & set(b)
+    env = alloc.env_for('cam-a')
+    assert env['LPR_NUM_THREADS'] == '2'
+    assert env['OMP_NUM_THREADS'] == '2'
+    assert env['LPR_CPU_SET'] == format_cpu_list(a)
+
+
+def test_allocator_reports_oversubscription():
+    alloc = CpuAllocator([0, 1], threads_per_process=1)
+    alloc.allocate('a')
+    alloc.allocate('b')
+    assert not alloc.report()['oversubscribed']
+    alloc.allocate('c')
+    report = alloc.report()
+    assert report['oversubscribed']
+    assert report['threads_total'] == 3
+    alloc.release('c')
+    assert not alloc.oversubscribed()
@@ -0,0 +1,29 @@
+from lpr.api.dedup import PlateDedup, parse_groups
+
+
+def test_parse_groups_with_windows():
+    cameras, windows = parse_groups('porton=cam1, cam2@10; salida=cam3;malo', 30)
+    assert cameras == {'cam1': 'porton', 'cam2': 'porton', 'cam3': 'salida'}
+    assert windows == {'porton': 10.0, 'salida': 30.0}
+
+
+def test_first_camera_in_group_wins_within_window():
+    dedup = PlateDedup(*parse_groups('porton=cam1,cam2@10', 30))
+    assert dedup.claim('cam1', 'BBCD12', now=0)['emit']
+    dup = dedup.claim('cam2', 'BBCD12', now=3)
+    assert not dup['emit'] and dup['camera'] == 'cam1'
+    # otra patente, cámara sin grupo, o pasada la ventana: se emite
+    assert dedup.claim('cam2', 'GHJK34', now=3)['emit']
+    assert dedup.claim('cam9', 'BBCD12', now=3)['emit']
+    assert dedup.claim('cam2', 'BBCD12', now=11)['emit']
+    assert dedup.stats()['duplicates'] == 1
+
+
+def test_release_lets_the_group_emit_again():
+    dedup = PlateDedup(*parse_groups('porton=cam1,cam2@10', 30))
+    assert dedup.claim('cam1', 'BBCD12', now=0)['emit']
+    # solo la cámara que la reclamó puede liberarla
+    assert not dedup.release('cam2', 'BBCD12')['released']
+    assert dedup.release('cam1', 'BBCD12')['released']
+    assert dedup.claim('cam2', 'BBCD12', now=3)['emit']
+    assert not dedup.release('cam9', 'BBCD12')['released']
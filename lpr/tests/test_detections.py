@@ -0,0 +1,41 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from lpr.detector.yolo_detector import Detections, detect
+
+
+class _Boxes:
+    """Imita `Results.boxes` de ultralytics (arrays en vez de tensores)."""
+
+    def __init__(self, xyxy, conf, ids=None):
+        self.xyxy = np.array(xyxy, dtype=np.float32)
+        self.conf = np.array(conf, dtype=np.float32)
+        self.cls = np.zeros(len(conf))
+        self.id = None if ids is None else np.array(ids)
+
+    def __len__(self):
+        return len(self.xyxy)
+
+
+def _result(xyxy, conf, ids=None):
+    return SimpleNamespace(boxes=_Boxes(xyxy, conf, ids))
+
+
+def test_detect_filters_by_confidence_vectorized():
+    model = lambda frame: [_result([[10, 10, 50, 30], [0, 0, 5, 5], [-4.5, 2, 700, 90]], [0.9, 0.1, 0.5])]
+    dets = detect(model, None, min_conf=0.3)
+    assert len(dets) == 2
+    clipped = list(dets.clipped(640, 80))
+    assert [(d.x1, d.y1, d.x2, d.y2) for d in clipped] == [(10, 10, 50, 30), (0, 2, 639, 79)]
+    assert abs(clipped[0].confidence - 0.9) < 1e-6
+
+
+def test_tracked_keeps_only_boxes_with_ids_and_merges_results():
+    dets = Detections.from_results([_result([[0, 0, 10, 10]], [0.8], ids=[7]), _result([[5, 5, 9, 9]], [0.7])])
+    assert len(dets) == 2
+    tracked = dets.tracked()
+    assert len(tracked) == 1 and tracked[0].track_id == 7
+    assert len(Detections.from_results([])) == 0
+    # cajas que quedan vacías al recortar se descartan
+    assert len(Detections([[100, 100, 120, 120]], [0.9]).clipped(50, 50)) == 0
@@ -0,0 +1,63 @@
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from lpr.capture.dual import DualStreamCapture, PacketWindow
+
+
+def _video(path, frames=20, fps=25, size=(320, 240)):
+    # menos de 1 s de video: el demux del archivo no se adelanta al reloj lo suficiente para re-anclar los pts
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    for i in range(frames):
+        writer.write(np.full((size[1], size[0], 3), i * 12, dtype=np.uint8))
+    writer.release()
+    return str(path)
+
+
+def test_packet_window_decodes_frame_nearest_to_timestamp(tmp_path):
+    pytest.importorskip('av')
+    window = PacketWindow(_video(tmp_path / 'main.mp4'), window_seconds=10, base_backoff=30)
+    try:
+        deadline = time.time() + 5
+        while window.stats()['packets'] < 20 and time.time() < deadline:
+            time.sleep(0.05)
+        start = window._gops[0][0]
+        for i in (0, 7, 19):
+            frame = window.frame_at(start + i / 25, max_skew=0.02)
+            assert frame is not None and frame.shape == (240, 320, 3)
+            assert round(frame.mean() / 12) == i
+        # fuera de la ventana: no hay frame a menos de max_skew
+        assert window.frame_at(start + 5, max_skew=0.1) is None
+        assert window.stats()['decodes'] == 3
+        near = window.frames_near(start + 10 / 25, span=0.05)
+        assert [round(f.mean() / 12) for _, f in near] == [9, 10, 11]
+    finally:
+        window.close()
+
+
+class _FakeStream:
+    def __init__(self):
+        self.generation = 0
+        self.asked = []
+
+    def stats(self):
+        return {'reconnects': self.generation}
+
+    def frame_at(self, ts, max_skew):
+        self.asked.append(ts)
+        return None
+
+
+def test_dual_capture_applies_measured_offset_until_reconnect():
+    sub, main = _FakeStream(), _FakeStream()
+    cap = DualStreamCapture(sub, main, max_skew=0.5, calibration_hits=3)
+    assert cap.calibrating
+    for offset in (0.2, 0.9, 0.25):
+        cap.observe_offset(offset)
+    assert not cap.calibrating and cap.offset == 0.25  # mediana: una muestra mala no mueve el desfase
+    cap.frame_at(100.0)
+    assert main.asked == [100.25]
+    main.generation += 1  # el principal reconectó: reloj nuevo
+    assert cap.calibrating and cap.offset == 0.0
@@ -0,0 +1,43 @@
+import pytest
+
+from lpr.storage.event_log import EventLog
+
+
+def test_append_index_and_find(tmp_path):
+    log = EventLog(str(tmp_path), segment_bytes=1024, max_segments=100)
+    for i in range(20):
+        log.append({'kind': 'plate', 'ts': 1000 + i, 'cameraId': f'cam{i % 2}', 'plate': 'BBBB99' if i % 4 == 0 else 'AA1234',
+                    'full_frame_path': f'/d/cam_det_{i}.jpg', 'meta': {'snapshot_jpeg_b64': 'x' * 50}})
+    log.close()
+
+    hits = log.find(plate='BBBB99')
+    assert [h['ts'] for h in hits] == [1016, 1012, 1008, 1004, 1000]
+    assert 'snapshot_jpeg_b64' not in hits[0]['meta']
+    assert hits[0]['full_frame_path'] == '/d/cam_det_16.jpg'
+    assert len(log.find(camera='cam1', since=1010)) == 5
+    assert log.stats()['segments'] > 1
+
+    # otro proceso (u otro arranque) ve lo mismo leyendo los segmentos
+    assert len(EventLog(str(tmp_path)).find(plate='AA1234', limit=3)) == 3
+
+
+def test_rotation_prunes_old_segments(tmp_path):
+    log = EventLog(str(tmp_path), segment_bytes=1024, max_segments=2)
+    for i in range(50):
+        log.append({'kind': 'anomaly', 'ts': i, 'cameraId': 'cam', 'pad': 'x' * 300})
+    assert len(list(tmp_path.glob('events-*.jsonl'))) <= 2
+    assert log.find(since=0, limit=1)[0]['ts'] == 49
+
+
+def test_prune_skips_segments_locked_by_other_process(tmp_path):
+    fcntl = pytest.importorskip('fcntl')
+    other = tmp_path / 'events-20000101-000000-99999-0001.jsonl'
+    with open(other, 'ab') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        log = EventLog(str(tmp_path), segment_bytes=1024, max_segments=1)
+        assert log.stats()['events'] == 0  # sin find() no se lee nada
+        for i in range(20):
+            log.append({'kind': 'anomaly', 'ts': i, 'cameraId': 'cam', 'pad': 'x' * 300})
+        assert other.exists()
+    log.append({'kind': 'anomaly', 'ts': 99, 'cameraId': 'cam', 'pad': 'x' * 1000})
+    assert not other.exists()
@@ -0,0 +1,20 @@
+from lpr.utils.latency import LatencyHistogram, LatencyTracker
+
+
+def test_histogram_quantiles_use_bucket_bounds():
+    h = LatencyHistogram()
+    for ms in [3] * 50 + [80] * 45 + [900] * 4 + [12000]:
+        h.observe(ms)
+    s = h.summary()
+    assert s['count'] == 100 and s['max_ms'] == 12000
+    assert s['p50_ms'] == 5 and s['p95_ms'] == 100 and s['p99_ms'] == 1000
+    assert h.quantile(1.0) == 12000
+
+
+def test_tracker_counts_stages_and_stale_drops():
+    t = LatencyTracker('cam1', report_interval=0)
+    t.observe('capture_to_ack', 0.25)
+    t.drop_stale()
+    snap = t.snapshot()
+    assert snap['capture_to_ack']['p50_ms'] == 250
+    assert snap['dropped_stale'] == 1
@@ -0,0 +1,33 @@
+import cv2
+import numpy as np
+
+from lpr.ocr.cache import OcrCache
+
+BOX = (100, 80, 300, 140)
+
+
+def _frame(text='BBCD12', noise=0.0, dx=0, seed=0):
+    frame = np.full((240, 400, 3), 90, dtype=np.uint8)
+    frame[BOX[1]:BOX[3], BOX[0] + dx:BOX[2] + dx] = 230
+    cv2.putText(frame, text, (BOX[0] + 10 + dx, BOX[1] + 45), cv2.FONT_HERSHEY_SIMPLEX, 1.4, (20, 20, 20), 3)
+    if noise:
+        frame = np.clip(frame + np.random.default_rng(seed).normal(0, noise, frame.shape), 0, 255).astype(np.uint8)
+    return frame
+
+
+def test_parked_car_hits_despite_noise_and_box_jitter():
+    cache = OcrCache()
+    cache.store(_frame(noise=3, seed=1), BOX, 'BBCD12')
+    jittered = (BOX[0] + 1, BOX[1] - 1, BOX[2] + 2, BOX[3])
+    assert cache.lookup(_frame(noise=3, seed=2), jittered) == 'BBCD12'
+    assert cache.stats()['hits'] == 1
+
+
+def test_changed_plate_moved_car_or_expired_entry_miss():
+    cache = OcrCache(ttl=10.0)
+    cache.store(_frame(noise=3, seed=1), BOX, 'BBCD12')
+    assert cache.lookup(_frame('BBCD13', noise=3, seed=2), BOX) is None
+    assert cache.lookup(_frame(noise=3, seed=2, dx=3), BOX) is None
+    cache.ttl = 0.0
+    assert cache.lookup(_frame(noise=3, seed=2), BOX) is None
+    assert cache.stats()['hit_rate'] == 0.0 and cache.stats()['entries'] == 0
@@ -0,0 +1,32 @@
+import numpy as np
+
+from lpr.ocr.plate_format import constrained_decode, parse_formats
+
+ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_'
+
+
+def _probs(text, slots=9, conf=0.9, confusions=None):
+    """Distribución por slot: `conf` en el carácter de `text` (relleno '_' al final)."""
+    probs = np.full((slots, len(ALPHABET)), (1 - conf) / (len(ALPHABET) - 1))
+    for pos, ch in enumerate(text.ljust(slots, '_')):
+        probs[pos, ALPHABET.index(ch)] = conf
+    for pos, (ch, p) in (confusions or {}).items():
+        probs[pos, ALPHABET.index(ch)] = p
+    return probs / probs.sum(axis=1, keepdims=True)
+
+
+def test_top1_invalid_is_corrected_to_nearest_valid_format():
+    # el top-1 lee un '0' en la tercera posición; la segunda opción es la 'D' chilena
+    probs = _probs('BB0D12', conf=0.9, confusions={2: ('D', 0.6)})
+    text, conf, chars = constrained_decode(probs, ALPHABET)
+    assert text == 'BBDD12' and len(chars) == 6
+    assert chars[2] < 0.6 and 0 < conf < 0.9
+
+
+def test_valid_reading_and_formats():
+    assert constrained_decode(_probs('AB1234'), ALPHABET)[0] == 'AB1234'
+    assert constrained_decode(_probs('BCD12'), ALPHABET)[0] == 'BCD12'  # moto
+    # una vocal no existe en el formato actual: con solo BBBB99 se corrige
+    assert constrained_decode(_probs('BACD12', confusions={1: ('B', 0.05)}), ALPHABET, formats=('BBBB99',))[0][1] != 'A'
+    assert parse_formats(' bbbb99, AA9999,X12 ,') == ('BBBB99', 'AA9999')
+    assert constrained_decode(_probs('AB12', slots=4), ALPHABET, formats=('BBBB99',)) is None
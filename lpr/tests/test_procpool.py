@@ -0,0 +1,46 @@
+import concurrent.futures
+import multiprocessing
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pytest
+
+from lpr.processor.procpool import InferencePool, SharedFrameSlots, _child_ping, _child_view
+
+
+def _checksum(desc):
+    # corre en el proceso hijo: lee el frame directo de la memoria compartida
+    frame = _child_view(desc)
+    return frame.shape, int(frame.sum(dtype=np.int64))
+
+
+def test_frames_cross_the_process_boundary_by_descriptor():
+    slots = SharedFrameSlots(2, 1024 * 1024)
+    frame = np.random.default_rng(0).integers(0, 255, (240, 320, 3), dtype=np.uint8)
+    try:
+        with concurrent.futures.ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as ex:
+            shm, desc = slots.put(frame)
+            assert desc == (shm.name, (240, 320, 3), '|u1')
+            assert ex.submit(_checksum, desc).result(timeout=60) == ((240, 320, 3), int(frame.sum(dtype=np.int64)))
+            slots.release(shm)
+            # el slot se reutiliza para el frame siguiente
+            shm2, _ = slots.put(frame[:10])
+            slots.release(shm2)
+    finally:
+        slots.close()
+
+
+def test_pool_is_rebuilt_after_a_child_dies():
+    class Pool(InferencePool):
+        def _new_executor(self):
+            return concurrent.futures.ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn'))
+
+    pool = Pool(1, 1024, 'unused', 'unused', num_threads=1)
+    try:
+        with pytest.raises(BrokenProcessPool):
+            pool._run(os._exit, 1)
+        assert pool._run(_child_ping) != os.getpid()
+        assert pool.stats()['rebuilds'] == 1
+    finally:
+        pool.close()
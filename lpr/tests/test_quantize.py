@@ -0,0 +1,38 @@
+import numpy as np
+
+from lpr.quantize import decode_yolo, letterbox, match_detections, ocr_input, split
+
+
+def test_split_is_deterministic_and_disjoint():
+    paths = [f'{i:03d}.jpg' for i in range(12)]
+    calib, holdout = split(paths, holdout=False), split(paths, holdout=True)
+    assert holdout == ['000.jpg', '005.jpg', '010.jpg']
+    assert not set(calib) & set(holdout) and len(calib) + len(holdout) == 12
+
+
+def test_letterbox_keeps_aspect_and_pads():
+    img = np.zeros((100, 200, 3), dtype=np.uint8)
+    blob, scale, (left, top) = letterbox(img, 640)
+    assert blob.shape == (1, 3, 640, 640) and blob.dtype == np.float32
+    assert scale == 3.2 and (left, top) == (0, 160)
+    assert np.isclose(blob[0, 0, 0, 0], 114 / 255.0) and blob[0, 0, 320, 320] == 0
+
+
+def test_ocr_input_follows_model_shape():
+    crop = np.zeros((40, 120, 3), dtype=np.uint8)
+    assert ocr_input(crop, (1, 64, 128, 3)).shape == (1, 64, 128, 3)
+    assert ocr_input(crop, (1, 70, 140, 1)).shape == (1, 70, 140, 1)
+
+
+def _raw(boxes_cxcywh, scores):
+    # salida YOLO de una clase: (1, 5, N)
+    return np.array([list(b) + [s] for b, s in zip(boxes_cxcywh, scores)], dtype=np.float32).T[None]
+
+
+def test_decode_and_match_detections():
+    ref = decode_yolo(_raw([(100, 100, 40, 20), (102, 101, 40, 20), (300, 300, 50, 50)], [0.9, 0.8, 0.6]))
+    assert len(ref[0]) == 2  # NMS suprime el duplicado
+    test = decode_yolo(_raw([(101, 100, 40, 20), (500, 500, 10, 10)], [0.85, 0.4]))
+    m = match_detections(ref, test)
+    assert (m['ref'], m['test'], m['matched']) == (2, 2, 1)
+    assert abs(m['conf_delta'][0] - 0.05) < 1e-5
@@ -0,0 +1,43 @@
+import os
+import time
+
+from lpr.storage.retention import RetentionManager, category_of, parse_limits
+
+
+def _write(path, size):
+    path.write_bytes(b'x' * size)
+    return str(path)
+
+
+def test_category_of_and_parse_limits():
+    assert category_of('/d/cam_crop_lowq_1.jpg') == 'lowq'
+    assert category_of('/d/cam_det_1.jpg.json') == 'detections'
+    assert category_of('/d/cam_anomaly_loitering_1.jpg') == 'anomalies'
+    assert category_of('/d/other.jpg') is None
+    assert category_of('/d/cam_clip_1.partial.mp4') is None
+    assert category_of('/d/cam_det_1.jpg.123.456.tmp') is None
+    assert parse_limits('bad=1,high=2.5', 10) == {'bad': 10.0, 'high': 25.0}
+
+
+def test_quota_evicts_oldest_files_of_the_category(tmp_path):
+    old = _write(tmp_path / 'cam_crop_bad_1.jpg', 600)
+    os.utime(old, (time.time() - 10, time.time() - 10))
+    keep = _write(tmp_path / 'cam_det_1.jpg', 600)
+    rm = RetentionManager([str(tmp_path)], quotas={'bad': 1000}, max_age={}, rescan_interval=0)
+    assert rm.stats()['categories']['bad']['bytes'] == 600
+
+    new = _write(tmp_path / 'cam_crop_bad_2.jpg', 600)
+    rm.record(new, 600)
+    assert not os.path.exists(old)
+    assert os.path.exists(new) and os.path.exists(keep)
+    stats = rm.stats()
+    assert stats['evicted'] == {'files': 1, 'bytes': 600}
+    assert stats['categories']['bad'] == {'bytes': 600, 'files': 1, 'quota': 1000}
+    assert stats['write_bytes_per_sec'] > 0
+
+
+def test_max_age_eviction_on_sweep(tmp_path):
+    stale = _write(tmp_path / 'cam_crop_pending_1.jpg', 10)
+    os.utime(stale, (time.time() - 7200, time.time() - 7200))
+    RetentionManager([str(tmp_path)], quotas={}, max_age={'pending': 3600}, rescan_interval=0)
+    assert not os.path.exists(stale)
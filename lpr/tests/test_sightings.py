@@ -0,0 +1,18 @@
+from lpr.storage.sightings import SightingIndex, query_sightings
+
+
+def test_batched_inserts_and_queries(tmp_path):
+    db = str(tmp_path / 'sightings.db')
+    index = SightingIndex(db, batch_size=7, flush_interval=0.05)
+    for i in range(30):
+        index.record(f'cam{i % 3}', 'BBBB99' if i % 2 else 'AA1234', 'emitted' if i % 10 == 0 else 'pending',
+                     plate_raw='bbbb-99', det_conf=0.9, ocr_conf=0.8, bbox=(1, 2, 3, 4), image=f'/d/{i}.jpg', ts=1000 + i)
+    assert index.flush()
+    index.close()
+
+    rows = query_sightings(db, plate='BBBB99', since=1020)
+    assert [r['ts'] for r in rows] == [1029, 1027, 1025, 1023, 1021]
+    assert rows[0]['bbox'] == [1, 2, 3, 4]
+    assert len(query_sightings(db, status='emitted')) == 3
+    assert len(query_sightings(db, camera='cam0', limit=4)) == 4
+    assert query_sightings(str(tmp_path / 'missing.db')) == []
@@ -0,0 +1,31 @@
+import os
+import types
+
+from lpr.utils.stats import StatsReporter, camera_stats, read_stats
+
+
+class _Stats:
+    def __init__(self, value):
+        self.value = value
+
+    def stats(self):
+        return self.value
+
+    snapshot = stats
+
+
+def test_reporter_writes_camera_stats_readable_by_the_manager(tmp_path):
+    worker = types.SimpleNamespace(cfg=types.SimpleNamespace(mode='patente'), latency=_Stats({'detect': {'p50': 10}}),
+                                   pipeline=_Stats({'ocr': {'queued': 2, 'dropped': 1}}),
+                                   ocr_cache=_Stats({'hit_rate': 0.5}))
+    cap = _Stats({'reconnects': 3, 'input_fps': 12.5})
+    reporter = StatsReporter('cam/1', lambda: {'cam1': camera_stats(worker, cap)}, str(tmp_path), interval=0, log_interval=0)
+    reporter.write()
+    reports = read_stats(str(tmp_path), pids=[os.getpid()])
+    stats = reports['cam_1']['cameras']['cam1']
+    assert stats['capture'] == {'reconnects': 3, 'input_fps': 12.5} and stats['mode'] == 'patente'
+    assert stats['ocr_cache']['hit_rate'] == 0.5
+    assert stats['pipeline']['ocr']['dropped'] == 1 and stats['latency']['detect']['p50'] == 10
+    assert read_stats(str(tmp_path), pids=[-1]) == {}  # de procesos que ya no existen
+    reporter.close()
+    assert read_stats(str(tmp_path)) == {}
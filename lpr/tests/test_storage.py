@@ -0,0 +1,42 @@
+import base64
+import json
+import threading
+
+import numpy as np
+
+from lpr.storage.fs_storage import PRIORITY_HIGH, PRIORITY_LOW, PersistenceQueue
+from lpr.utils.images import EncodedImage
+
+
+def test_persistence_queue_writes_frames_and_metadata(tmp_path):
+    q = PersistenceQueue(max_size=4, threads=1, stats_interval=0)
+    frame = np.zeros((32, 32, 3), dtype=np.uint8)
+    encoded = EncodedImage(frame, 80, annotate=lambda im: im.fill(255))
+    img = q.save_image(str(tmp_path / 'det.jpg'), encoded)
+    meta = q.save_json(str(tmp_path / 'det.jpg.json'), {'plate': 'BBBB99'})
+    assert img.result(timeout=5) == str(tmp_path / 'det.jpg')
+    meta.result(timeout=5)
+    # los bytes escritos son los mismos que se embeben en base64
+    assert (tmp_path / 'det.jpg').read_bytes() == encoded.data
+    assert base64.b64decode(encoded.base64()) == encoded.data
+    assert json.loads((tmp_path / 'det.jpg.json').read_text(encoding='utf-8')) == {'plate': 'BBBB99'}
+    assert frame.max() == 0  # el frame original no se anota
+    q.close()
+
+
+def test_persistence_queue_drops_low_priority_first():
+    q = PersistenceQueue(max_size=2, threads=1, stats_interval=0)
+    gate = threading.Event()
+    blocker = q.submit(gate.wait, PRIORITY_HIGH)
+    while q.depth():  # esperar a que el escritor tome el trabajo bloqueante
+        pass
+    low_a = q.submit(lambda: 'a', PRIORITY_LOW)
+    low_b = q.submit(lambda: 'b', PRIORITY_LOW)
+    low_c = q.submit(lambda: 'c', PRIORITY_LOW)  # cola llena: se descarta
+    high = q.submit(lambda: 'h', PRIORITY_HIGH)  # desplaza al crop más antiguo
+    assert low_c.cancelled() and low_a.cancelled()
+    gate.set()
+    assert high.result(timeout=5) == 'h' and low_b.result(timeout=5) == 'b'
+    assert blocker.result(timeout=5) is True
+    assert q.stats()['dropped'] == 2
+    q.close()
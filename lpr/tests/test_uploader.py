@@ -0,0 +1,85 @@
+import threading
+import time
+
+import lpr.api.client as client
+import lpr.storage.uploader as uploader_mod
+from lpr.storage.uploader import CloudinaryUploader
+
+
+def _wait(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_failed_upload_is_spooled_and_resumed_after_restart(tmp_path, monkeypatch):
+    patched = []
+    monkeypatch.setattr(client, 'patch_detection_image',
+                        lambda backend, det_id, url, dry_run=True: patched.append((det_id, url)) or 200)
+
+    def offline(content, public_id=None, session=None, timeout=10):
+        raise ConnectionError('sin red')
+
+    monkeypatch.setattr(uploader_mod, 'cloudinary_upload_once', offline)
+    first = CloudinaryUploader(concurrency=1, spool_dir=str(tmp_path), base_backoff=60)
+    job = first.submit(b'jpeg-bytes', 'cam_det_1')
+    assert _wait(lambda: (tmp_path / 'cam_det_1.jpg').exists())
+    first.attach_detection(job, 'http://backend', 'det-1')
+    first.close()
+
+    monkeypatch.setattr(uploader_mod, 'cloudinary_upload_once',
+                        lambda content, public_id=None, session=None, timeout=10: f'https://cdn/{public_id}.jpg')
+    second = CloudinaryUploader(concurrency=1, spool_dir=str(tmp_path))
+    assert _wait(lambda: patched)
+    assert patched == [('det-1', 'https://cdn/cam_det_1.jpg')]
+    assert _wait(lambda: not list(tmp_path.iterdir()))
+    second.close()
+
+
+def test_patch_waits_for_detection_id(monkeypatch, tmp_path):
+    patched = []
+    monkeypatch.setattr(client, 'patch_detection_image',
+                        lambda backend, det_id, url, dry_run=True: patched.append((det_id, url)) or 200)
+    monkeypatch.setattr(uploader_mod, 'cloudinary_upload_once',
+                        lambda content, public_id=None, session=None, timeout=10: 'https://cdn/x.jpg')
+    up = CloudinaryUploader(concurrency=1, spool_dir=str(tmp_path))
+    job = up.submit(b'jpeg', 'x')
+    assert _wait(lambda: job.url is not None)
+    assert patched == []
+    up.attach_detection(job, 'http://backend', 'det-9')
+    assert _wait(lambda: patched == [('det-9', 'https://cdn/x.jpg')])
+    up.close()
+
+
+def test_failed_patch_is_retried_before_deleting_local(monkeypatch, tmp_path):
+    statuses = [500, -1, 200]
+    patched = []
+    release = threading.Event()
+
+    def patch(backend, det_id, url, dry_run=True):
+        patched.append(det_id)
+        if len(patched) == 3:
+            release.wait(5)
+        return statuses.pop(0)
+
+    monkeypatch.setattr(client, 'patch_detection_image', patch)
+    uploads = []
+    monkeypatch.setattr(uploader_mod, 'cloudinary_upload_once',
+                        lambda content, public_id=None, session=None, timeout=10: uploads.append(public_id) or 'https://cdn/y.jpg')
+    monkeypatch.setattr(uploader_mod.settings, 'CLOUDINARY_DELETE_LOCAL', True)
+    local = tmp_path / 'cam_det_y.jpg'
+    local.write_bytes(b'jpeg')
+    spool = tmp_path / 'spool'
+    up = CloudinaryUploader(concurrency=1, spool_dir=str(spool), base_backoff=0.01)
+    job = up.submit(b'jpeg', 'y', local_path=str(local))
+    up.attach_detection(job, 'http://backend', 'det-y')
+    assert _wait(lambda: len(patched) == 3)
+    assert local.exists() and (spool / 'y.json').exists()
+    release.set()
+    assert _wait(lambda: job.patched and not local.exists())
+    assert uploads == ['y']  # solo se reintenta el PATCH
+    assert _wait(lambda: not list(spool.iterdir()))
+    up.close()
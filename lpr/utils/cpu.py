@@ -0,0 +1,154 @@
+"""Presupuesto de hilos y afinidad de CPU para los procesos worker.
+
+Lado manager: `CpuAllocator` reparte un conjunto de CPUs entre los procesos
+que lanza (worker por cámara u host multi-cámara) y detecta sobre-suscripción.
+Lado worker: `apply_thread_budget` aplica lo asignado (afinidad, hilos de
+torch/OpenCV/BLAS) antes de cargar los modelos; el OCR usa `ort_session_options`.
+"""
+import logging
+import os
+import sys
+from typing import Dict, List, Optional
+
+# Variables que respetan torch (OpenMP) y las librerías BLAS al importarse
+_THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'NUMEXPR_NUM_THREADS')
+
+
+def parse_cpu_list(spec: Optional[str]) -> List[int]:
+    """'0-3,6' -> [0, 1, 2, 3, 6]."""
+    cpus = set()
+    for part in (spec or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            lo, hi = part.split('-', 1)
+            cpus.update(range(int(lo), int(hi) + 1))
+        else:
+            cpus.add(int(part))
+    return sorted(cpus)
+
+
+def format_cpu_list(cpus: List[int]) -> str:
+    return ','.join(str(c) for c in sorted(cpus))
+
+
+def available_cpus() -> List[int]:
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return list(range(os.cpu_count() or 1))
+
+
+class CpuAllocator:
+    """Asigna a cada proceso `threads` CPUs, eligiendo las menos cargadas.
+
+    Si hay más procesos que CPUs las asignaciones se solapan; eso queda
+    reportado como sobre-suscripción en `report()` (y en el log).
+    """
+
+    def __init__(self, cpus: Optional[List[int]] = None, threads_per_process: int = 1, pin: bool = True):
+        self.cpus = list(cpus) if cpus else available_cpus()
+        self.threads = max(1, min(int(threads_per_process), len(self.cpus)))
+        self.pin = pin
+        self.allocations: Dict[str, List[int]] = {}
+
+    def _load(self) -> Dict[int, int]:
+        load = {c: 0 for c in self.cpus}
+        for cpus in self.allocations.values():
+            for c in cpus:
+                load[c] = load.get(c, 0) + 1
+        return load
+
+    def allocate(self, key: str) -> List[int]:
+        if key in self.allocations:
+            return self.allocations[key]
+        load = self._load()
+        chosen = sorted(self.cpus, key=lambda c: (load[c], c))[:self.threads]
+        self.allocations[key] = sorted(chosen)
+        if self.oversubscribed():
+            logging.getLogger(__name__).warning(
+                'Sobre-suscripción de CPU: %d hilos de inferencia en %d CPUs (%d procesos)',
+                self.threads_total(), len(self.cpus), len(self.allocations))
+        return self.allocations[key]
+
+    def release(self, key: str):
+        self.allocations.pop(key, None)
+
+    def rename(self, old: str, new: str):
+        """Transfiere una asignación (p. ej. host pre-calentado -> cámara)."""
+        if old in self.allocations:
+            self.allocations[new] = self.allocations.pop(old)
+
+    def threads_total(self) -> int:
+        return self.threads * len(self.allocations)
+
+    def oversubscribed(self) -> bool:
+        return self.threads_total() > len(self.cpus)
+
+    def env_for(self, key: str) -> Dict[str, str]:
+        """Variables de entorno para el subproceso asignado a `key`."""
+        cpus = self.allocations.get(key) or self.allocate(key)
+        env = {'LPR_NUM_THREADS': str(self.threads)}
+        if self.pin:
+            env['LPR_CPU_SET'] = format_cpu_list(cpus)
+        for var in _THREAD_ENV_VARS:
+            env[var] = str(self.threads)
+        return env
+
+    def report(self) -> Dict:
+        return {
+            'cpus': len(self.cpus),
+            'threads_per_process': self.threads,
+            'threads_total': self.threads_total(),
+            'processes': len(self.allocations),
+            'oversubscribed': self.oversubscribed(),
+            'pinned': self.pin,
+            'allocations': {k: format_cpu_list(v) for k, v in self.allocations.items()},
+        }
+
+
+def apply_thread_budget(num_threads: Optional[int] = None, cpu_set: Optional[str] = None):
+    """Aplica afinidad y límite de hilos al proceso actual.
+
+    Debe llamarse al inicio del worker, antes de cargar modelos: torch lee
+    `OMP_NUM_THREADS` al importarse; si ya estaba importado se ajusta en caliente.
+    """
+    if cpu_set:
+        cpus = parse_cpu_list(cpu_set)
+        try:
+            os.sched_setaffinity(0, cpus)
+            logging.info('Afinidad de CPU fijada a %s', format_cpu_list(cpus))
+        except (AttributeError, OSError) as e:
+            logging.warning('No se pudo fijar afinidad de CPU (%s): %s', cpu_set, e)
+    if not num_threads:
+        return
+    n = str(int(num_threads))
+    for var in _THREAD_ENV_VARS:
+        os.environ.setdefault(var, n)
+    try:
+        import cv2
+        cv2.setNumThreads(int(num_threads))
+    except Exception:
+        pass
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        try:
+            torch.set_num_threads(int(num_threads))
+        except Exception:
+            logging.exception('No se pudo ajustar torch.set_num_threads')
+    logging.info('Presupuesto de hilos por proceso: %s', n)
+
+
+def ort_session_options(num_threads: Optional[int]):
+    """SessionOptions de ONNX Runtime con hilos intra-op acotados (o None)."""
+    if not num_threads:
+        return None
+    try:
+        import onnxruntime as ort
+    except Exception:
+        return None
+    opts = ort.SessionOptions()
+    opts.intra_op_num_threads = int(num_threads)
+    opts.inter_op_num_threads = 1
+    return opts
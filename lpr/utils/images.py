@@ -3,6 +3,8 @@ import cv2
 import numpy as np
 import io
 import base64
+import logging
+import threading
 
 
 def frame_to_pil(img: np.ndarray) -> Image.Image:
@@ -18,3 +20,53 @@ def pil_to_base64(img: Image.Image, quality: int = 80) -> str:
 
 def pil_from_array(arr: np.ndarray) -> Image.Image:
     return Image.fromarray(arr)
+
+
+class EncodedImage:
+    """Imagen BGR codificada a JPEG una sola vez (`cv2.imencode`, sin pasar por PIL).
+
+    Los bytes se generan la primera vez que alguien los pide (el hilo escritor,
+    el uploader o el payload en base64) y se reutilizan para todo lo demás.
+    `annotate(img)` opcional dibuja sobre una copia del array antes de codificar;
+    el array original no se modifica y el llamador no debe modificarlo después.
+    """
+
+    def __init__(self, bgr: np.ndarray, quality: int = 85, annotate=None):
+        self._bgr = bgr
+        self.quality = int(quality)
+        self._annotate = annotate
+        self._data = None
+        self._b64 = None
+        self._lock = threading.Lock()
+
+    def _encode(self) -> bytes:
+        img = self._bgr
+        if self._annotate is not None:
+            img = img.copy()
+            try:
+                self._annotate(img)
+            except Exception:
+                logging.exception('Error anotando imagen antes de codificar')
+        ok, buf = cv2.imencode('.jpg', img, [int(cv2.IMWRITE_JPEG_QUALITY), self.quality])
+        if not ok:
+            raise RuntimeError('No se pudo codificar la imagen a JPEG')
+        return buf.tobytes()
+
+    @property
+    def data(self) -> bytes:
+        with self._lock:
+            if self._data is None:
+                self._data = self._encode()
+                # ya no hace falta retener el frame
+                self._bgr = self._annotate = None
+            return self._data
+
+    def base64(self) -> str:
+        data = self.data
+        with self._lock:
+            if self._b64 is None:
+                self._b64 = base64.b64encode(data).decode('ascii')
+            return self._b64
+
+    def __len__(self) -> int:
+        return len(self.data)
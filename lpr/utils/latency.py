@@ -0,0 +1,80 @@
+"""Histogramas de latencia por etapa (captura -> detección -> OCR -> ack del backend).
+
+`LatencyTracker` acumula, por cámara, un histograma de buckets fijos por
+etapa (`observe('capture_to_ack', segundos)`) y lo loguea cada
+`report_interval` segundos con p50/p95/p99 aproximados y máximo.
+"""
+import bisect
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+# límites superiores de los buckets en milisegundos (el último es +inf)
+BUCKETS_MS = (5, 10, 25, 50, 100, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000, 10000)
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.total += 1
+        self.sum_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Límite superior del bucket donde cae el cuantil `q`, acotado al máximo (None sin datos)."""
+        if not self.total:
+            return None
+        rank = q * self.total
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(float(BUCKETS_MS[i]), self.max_ms) if i < len(BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def summary(self) -> Dict:
+        return {'count': self.total, 'mean_ms': round(self.sum_ms / self.total, 1) if self.total else None,
+                'p50_ms': self.quantile(0.5), 'p95_ms': self.quantile(0.95), 'p99_ms': self.quantile(0.99),
+                'max_ms': round(self.max_ms, 1)}
+
+
+class LatencyTracker:
+    def __init__(self, name: str, report_interval: float = 60.0):
+        self.name = name
+        self.report_interval = float(report_interval)
+        self._lock = threading.Lock()
+        self._stages: Dict[str, LatencyHistogram] = {}
+        self._dropped_stale = 0
+        self._last_report = time.time()
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            self._stages.setdefault(stage, LatencyHistogram()).observe(max(0.0, seconds) * 1000.0)
+        self._maybe_report()
+
+    def drop_stale(self):
+        with self._lock:
+            self._dropped_stale += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            out = {stage: h.summary() for stage, h in self._stages.items()}
+            out['dropped_stale'] = self._dropped_stale
+        return out
+
+    def _maybe_report(self):
+        if self.report_interval <= 0:
+            return
+        now = time.time()
+        with self._lock:
+            if now - self._last_report < self.report_interval:
+                return
+            self._last_report = now
+        logging.info('[LATENCIA] %s: %s', self.name, self.snapshot())
@@ -0,0 +1,98 @@
+"""Métricas por cámara (captura, latencia, etapas, caché de OCR) legibles desde el manager.
+
+Cada proceso worker (host multi-cámara o proceso-por-cámara) escribe cada
+`interval` segundos un JSON con las métricas de sus cámaras en
+`<directorio>/<nombre>.json` (escritura atómica) y cada `log_interval`
+segundos loguea las de etapas y caché de OCR, que no tienen log propio. El
+manager junta los archivos en `GET /stats`; a los hosts multi-cámara además
+les pide una foto al momento (`{"op": "stats"}` por stdin) antes de leer.
+"""
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+
+def camera_stats(worker, cap=None) -> Dict:
+    """Métricas de una cámara: captura (reconexiones, FPS, errores, edad del frame), latencia, etapas y caché de OCR."""
+    out = {'mode': getattr(getattr(worker, 'cfg', None), 'mode', None)}
+    if cap is not None:
+        out['capture'] = cap.stats()
+    latency = getattr(worker, 'latency', None)
+    if latency is not None:
+        out['latency'] = latency.snapshot()
+    pipeline = getattr(worker, 'pipeline', None)
+    if pipeline is not None:
+        out['pipeline'] = pipeline.stats()
+    ocr_cache = getattr(worker, 'ocr_cache', None)
+    if ocr_cache is not None:
+        out['ocr_cache'] = ocr_cache.stats()
+    return out
+
+
+class StatsReporter:
+    def __init__(self, name: str, collect: Callable[[], Dict[str, Dict]], directory: str,
+                 interval: float = 10.0, log_interval: float = 60.0):
+        self.name = name
+        self.collect = collect
+        self.path = os.path.join(directory, re.sub(r'[^A-Za-z0-9._-]', '_', name) + '.json')
+        self.interval = float(interval)
+        self.log_interval = float(log_interval)
+        self._last_log = time.time()
+        self._closed = threading.Event()
+        # con ambos intervalos en 0 solo se escribe a pedido (`write()`)
+        self._period = self.interval if self.interval > 0 else self.log_interval
+        if self._period > 0:
+            threading.Thread(target=self._run, name='lpr-stats', daemon=True).start()
+
+    def write(self) -> Dict[str, Dict]:
+        """Escribe las métricas actuales de todas las cámaras del proceso (y las devuelve)."""
+        from lpr.storage.fs_storage import _write_bytes
+        cameras = self.collect()
+        report = {'pid': os.getpid(), 'ts': time.time(), 'cameras': cameras}
+        try:
+            _write_bytes(self.path, json.dumps(report, default=str).encode('utf-8'))
+        except Exception:
+            logging.exception('No se pudieron escribir las métricas en %s', self.path)
+        return cameras
+
+    def _run(self):
+        while not self._closed.wait(self._period):
+            try:
+                cameras = self.write() if self.interval > 0 else self.collect()
+                now = time.time()
+                if self.log_interval > 0 and now - self._last_log >= self.log_interval:
+                    self._last_log = now
+                    for camera_id, stats in cameras.items():
+                        if 'pipeline' in stats or 'ocr_cache' in stats:
+                            logging.info('[STATS] %s: etapas=%s ocr_cache=%s', camera_id,
+                                         stats.get('pipeline'), stats.get('ocr_cache'))
+            except Exception:
+                logging.exception('Error recolectando métricas')
+
+    def close(self):
+        self._closed.set()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def read_stats(directory: str, pids: Optional[Iterable[int]] = None) -> Dict[str, Dict]:
+    """{nombre del proceso: reporte} de los archivos del directorio (solo de `pids` si se indica)."""
+    pids = set(pids) if pids is not None else None
+    out = {}
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                report = json.load(f)
+        except (OSError, ValueError):
+            continue  # proceso que terminó o archivo reemplazado mientras se leía
+        if pids is not None and report.get('pid') not in pids:
+            continue  # de un proceso que ya no existe
+        out[os.path.basename(path)[:-len('.json')]] = report
+    return out